@@ -2,14 +2,15 @@ from fastapi import APIRouter, Depends, File, Form, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.schemas.excel_schemas import ExcelUploadResponse
+from app.schemas.excel_schemas import ExcelUploadResponse, UploadStatusResponse
 from app.services.excel_service import ExcelService
 from app.services.session_service import SessionService
 
 from fastapi import HTTPException
 from sqlalchemy import select
 
-from app.models.file_upload import FileUpload
+from app.core.config import get_settings
+from app.models.file_upload import INGEST_FAILED, INGEST_READY, FileUpload
 from app.services.conversation_service import ConversationService
 from app.schemas.excel_chat_schemas import ExcelChatRequest, ExcelChatResponse
 from app.services.excel_service import excel_cache  # 用于测试/调试可见（可不导出也行）
@@ -37,9 +38,35 @@ async def upload_excel(
         session_id=session_id,
         upload_id=rec.id,
         filename=rec.filename,
+        status=rec.status,
         profile=profile,
     )
 
+
+@router.get("/uploads/{upload_id}", response_model=UploadStatusResponse)
+async def get_upload_status(upload_id: str, db: AsyncSession = Depends(get_db)):
+    # 给 INGEST_MODE=async 的前端轮询：pending / parsing / ready / failed
+    fu = await db.get(FileUpload, upload_id)
+    if fu is None:
+        raise HTTPException(status_code=404, detail="upload not found")
+
+    return UploadStatusResponse(
+        upload_id=fu.id,
+        session_id=fu.session_id,
+        filename=fu.filename,
+        status=fu.status,
+        progress=fu.progress,
+        error=fu.error,
+        profile=fu.profile if fu.status == INGEST_READY else None,
+    )
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload(upload_id: str, db: AsyncSession = Depends(get_db)):
+    # 同内容的文件被多个 upload 共享，只有最后一个引用删掉时才会真正删文件
+    if not await ExcelService.delete_upload(db, upload_id):
+        raise HTTPException(status_code=404, detail="upload not found")
+
+
 @router.post("/chat", response_model=ExcelChatResponse)
 async def excel_chat(payload: ExcelChatRequest, db: AsyncSession = Depends(get_db)):
     # 1) 文本长度保护（需求里建议做输入长度限制，避免“玩死自己”）:contentReference[oaicite:5]{index=5}
@@ -58,13 +85,19 @@ async def excel_chat(payload: ExcelChatRequest, db: AsyncSession = Depends(get_d
     if fu is None:
         raise HTTPException(status_code=404, detail="upload not found for this session")
 
-    # 3) 取 Excel profile（优先缓存；缓存丢了就简单报错，下一模块我们做“磁盘回填缓存”）
-    prof = ConversationService  # 占位避免 linter 抱怨
-    profile = None
-    cached = __import__("app.services.excel_service", fromlist=["excel_cache"]).excel_cache
-    item = cached.get(payload.upload_id)
-    if item:
-        profile = item.get("profile")
+    # 2.5) 异步解析还没跑完：先等一会儿，等不到就让前端稍后重试
+    if fu.status != INGEST_READY:
+        fu = await ExcelService.wait_until_ready(db, fu.id, timeout_s=get_settings().ingest_wait_s)
+        if fu is None:
+            raise HTTPException(status_code=404, detail="upload not found for this session")
+        if fu.status == INGEST_FAILED:
+            raise HTTPException(status_code=422, detail=f"upload failed to parse: {fu.error}")
+        if fu.status != INGEST_READY:
+            raise HTTPException(status_code=409, detail=f"upload not ready yet (status={fu.status})")
+
+    # 3) 取 Excel profile：落在 file_uploads.profile 里，缓存有没有 DataFrame 都不影响；
+    # 老数据没落库才会回填一次（文件也没了才报错）
+    profile = await ExcelService.load_profile(db, fu)
     if not profile:
         raise HTTPException(status_code=409, detail="excel cache miss (please re-upload for now)")
 
@@ -84,6 +117,7 @@ async def excel_chat(payload: ExcelChatRequest, db: AsyncSession = Depends(get_d
     session_id=payload.session_id,
     upload_id=payload.upload_id,
     question=payload.message,
+    profile=profile,
 )
     artifacts = (debug or {}).get("artifacts", [])  # ✅ 永远有值：list
 # 写入 assistant message（extra 里存 debug 简版）
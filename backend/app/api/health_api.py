@@ -1,5 +1,11 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
 from app.core.config import get_settings
+from app.services.answer_cache import answer_cache_stats
+from app.services.cache_warmup import is_ready, warmup_state
+from app.services.excel_service import excel_cache
+from app.services.tools.result_cache import tool_result_cache
 
 router = APIRouter(tags=["health"])
 
@@ -7,4 +13,19 @@ router = APIRouter(tags=["health"])
 @router.get("/health")
 async def health():
     settings = get_settings()
-    return {"status": "ok", "app": settings.app_name, "env": settings.env}
+    return {
+        "status": "ok",
+        "app": settings.app_name,
+        "env": settings.env,
+        "excel_cache": excel_cache.stats(),
+        "answer_cache": answer_cache_stats(),
+        "tool_cache": tool_result_cache.stats(),
+        "warmup": dict(warmup_state),
+    }
+
+
+@router.get("/ready")
+async def ready():
+    # 和 /health（存活）分开：缓存预热期间返回 503，负载均衡先别把流量切过来
+    body = {"ready": is_ready(), "warmup": dict(warmup_state)}
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
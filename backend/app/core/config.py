@@ -35,7 +35,45 @@ class Settings(BaseSettings):
     # 文件相关
     # ----------------------------
     max_upload_mb: int = Field(default=10, alias="MAX_UPLOAD_MB")
+    # 解析上限（MAX_UPLOAD_MB 只管压缩后的大小）：超了就提前中止，0 表示不限制
+    max_ingest_unzipped_mb: int = Field(default=512, alias="MAX_INGEST_UNZIPPED_MB")
+    max_ingest_rows: int = Field(default=1_000_000, alias="MAX_INGEST_ROWS")
+    max_ingest_cells: int = Field(default=50_000_000, alias="MAX_INGEST_CELLS")
     data_dir: str = Field(default="./data", alias="DATA_DIR")
+    # 上传后在 xlsx 旁边写一份 Arrow IPC 旁路缓存（需要 pyarrow），回填缓存时优先读它
+    excel_sidecar: bool = Field(default=True, alias="EXCEL_SIDECAR")
+    # 进程内 DataFrame 缓存的内存预算（按 memory_usage(deep=True) 估算），超了按 LRU 淘汰
+    excel_cache_max_mb: int = Field(default=1024, alias="EXCEL_CACHE_MAX_MB")
+    # xlsx 解析 / profile 计算放在哪跑：process（默认）/ thread / inline
+    parse_executor: str = Field(default="process", alias="PARSE_EXECUTOR")
+    parse_workers: int = Field(default=2, alias="PARSE_WORKERS")
+    # 解析后做 dtype 瘦身（整数 downcast、低基数文本转 category、其余文本转 Arrow 字符串）
+    optimize_dtypes: bool = Field(default=False, alias="OPTIMIZE_DTYPES")
+    # sync：上传接口解析完才返回；async：落盘即返回 upload_id，后台解析，前端轮询状态
+    ingest_mode: str = Field(default="sync", alias="INGEST_MODE")
+    # /excel/chat 遇到还没解析完的 upload 最多等多久（秒），超时返回 409
+    ingest_wait_s: float = Field(default=10.0, alias="INGEST_WAIT_S")
+    # 启动时把最近活跃会话的 upload 预先装进缓存（后台跑，期间 /ready 返回 503）
+    cache_warmup: bool = Field(default=False, alias="CACHE_WARMUP")
+    cache_warmup_max_uploads: int = Field(default=20, alias="CACHE_WARMUP_MAX_UPLOADS")
+    cache_warmup_max_mb: int = Field(default=512, alias="CACHE_WARMUP_MAX_MB")
+    # 同一内容 + 同一问题的规划 / 工具结果 / 回复记忆（每层的条目上限和 TTL）
+    answer_cache: bool = Field(default=True, alias="ANSWER_CACHE")
+    answer_cache_max_entries: int = Field(default=512, alias="ANSWER_CACHE_MAX_ENTRIES")
+    answer_cache_ttl_s: float = Field(default=600.0, alias="ANSWER_CACHE_TTL_S")
+    # 工具结果缓存的内存预算（MB），0 表示关闭
+    tool_cache_max_mb: int = Field(default=256, alias="TOOL_CACHE_MAX_MB")
+    # 工具执行器：thread（默认，线程池限并发）/ inline（直接在事件循环里跑，调试用）
+    tool_executor: str = Field(default="thread", alias="TOOL_EXECUTOR")
+    tool_workers: int = Field(default=4, alias="TOOL_WORKERS")
+    # 单个工具 / 一次请求整条工具链的超时（秒），0 表示不限
+    tool_timeout_s: float = Field(default=20.0, alias="TOOL_TIMEOUT_S")
+    tool_request_timeout_s: float = Field(default=60.0, alias="TOOL_REQUEST_TIMEOUT_S")
+    # 回答里附带的表格 artifact：最多多少行；大表可以改成 base64 的 Arrow 载荷
+    # （按截断后实际带出去的行数判断，所以 MIN_ROWS 要不大于 MAX_ROWS 才会生效）
+    artifact_table_max_rows: int = Field(default=200, alias="ARTIFACT_TABLE_MAX_ROWS")
+    artifact_arrow: bool = Field(default=False, alias="ARTIFACT_ARROW")
+    artifact_arrow_min_rows: int = Field(default=100, alias="ARTIFACT_ARROW_MIN_ROWS")
 
     # ----------------------------
     # 数据库相关（MySQL）
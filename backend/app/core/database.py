@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import logging
 from typing import AsyncGenerator, Optional
 
+from sqlalchemy import Connection, inspect, literal, text
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -9,9 +11,12 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.schema import AddConstraint, Column, CreateIndex
 
 from app.core.config import get_settings
 
+logger = logging.getLogger(__name__)
+
 
 class Base(DeclarativeBase):
     pass
@@ -51,6 +56,44 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+def _column_ddl(conn: Connection, col: Column) -> str:
+    dialect = conn.dialect
+    ddl = f"{dialect.identifier_preparer.format_column(col)} {col.type.compile(dialect=dialect)}"
+    # 老行要有值：NOT NULL 列用模型上的默认值（status=ready / progress=100：老上传都是同步解析完的）
+    default = col.default.arg if col.default is not None and col.default.is_scalar else None
+    if default is not None:
+        ddl += " DEFAULT " + str(literal(default).compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    return ddl + (" NOT NULL" if not col.nullable and default is not None else " NULL")
+
+
+def _add_missing_columns(conn: Connection) -> None:
+    """
+    create_all 只建不存在的表，不改已有的表：老库上模型新加的列（file_uploads 的
+    status / progress / error / content_hash / profile）在这里补上，连同索引和外键。
+    幂等：已经有的列不动，每次启动都可以跑。
+    """
+    insp = inspect(conn)
+    existing_tables = set(insp.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        added = [c for c in table.columns if c.name not in have]
+        tname = conn.dialect.identifier_preparer.format_table(table)
+        for col in added:
+            conn.execute(text(f"ALTER TABLE {tname} ADD COLUMN {_column_ddl(conn, col)}"))
+            logger.info("added column %s.%s", table.name, col.name)
+        names = {c.name for c in added}
+        for ix in table.indexes:
+            if names & {c.name for c in ix.columns}:
+                conn.execute(CreateIndex(ix))
+        # SQLite 不支持 ALTER TABLE 加约束（本地 / 测试库），外键只在 MySQL 上补
+        if conn.dialect.name != "sqlite":
+            for fk in table.foreign_key_constraints:
+                if names & {c.name for c in fk.columns}:
+                    conn.execute(AddConstraint(fk))
+
+
 async def init_db() -> None:
     # 确保模型已 import（注册到 Base.metadata）
     import app.models  # noqa: F401
@@ -58,6 +101,7 @@ async def init_db() -> None:
     engine = get_engine()
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
 
 
 async def shutdown_db() -> None:
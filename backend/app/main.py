@@ -1,15 +1,28 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware # 记得导入这个
 
 from app.core.config import get_settings
 from app.core.database import init_db, shutdown_db
 from app.api import api_router
+from app.services.cache_warmup import warm_cache
+from app.services.parse_executor import shutdown_parse_executor
+from app.services.tool_executor import shutdown_tool_executor
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    # 预热放后台：进程马上能接请求（/health 活着），/ready 等预热完才返回 200
+    warmup = asyncio.create_task(warm_cache()) if get_settings().cache_warmup else None
     yield
+    if warmup is not None:
+        warmup.cancel()
+        with suppress(asyncio.CancelledError):
+            await warmup
+    shutdown_parse_executor()
+    shutdown_tool_executor()
     await shutdown_db()
 
 def create_app() -> FastAPI:
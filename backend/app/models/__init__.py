@@ -1,4 +1,5 @@
 from .session import Session  # noqa: F401
+from .upload_blob import UploadBlob  # noqa: F401
 from .file_upload import FileUpload  # noqa: F401
 from .message import Message  # noqa: F401
 from .summary import Summary  # noqa: F401
\ No newline at end of file
@@ -2,11 +2,19 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, String, func
+from typing import Any, Optional
+
+from sqlalchemy import JSON, DateTime, ForeignKey, Integer, String, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.core.database import Base
 
+# 解析状态：pending（已落盘，待解析）→ parsing → ready / failed
+INGEST_PENDING = "pending"
+INGEST_PARSING = "parsing"
+INGEST_READY = "ready"
+INGEST_FAILED = "failed"
+
 
 class FileUpload(Base):
     __tablename__ = "file_uploads"
@@ -16,6 +24,17 @@ class FileUpload(Base):
 
     filename: Mapped[str] = mapped_column(String(255), nullable=False)
     stored_path: Mapped[str] = mapped_column(String(1024), nullable=False)
+    # 指向 upload_blobs（内容去重）；老数据为空，文件归这条记录独占
+    content_hash: Mapped[Optional[str]] = mapped_column(
+        String(64), ForeignKey("upload_blobs.content_hash"), nullable=True, index=True
+    )
+
+    status: Mapped[str] = mapped_column(String(20), default=INGEST_READY, nullable=False)
+    progress: Mapped[int] = mapped_column(Integer, default=100, nullable=False)  # 0~100
+    error: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    # 解析完就落库的 profile（rows/cols/columns/dtypes/missing_rate/preview/schema）：
+    # 上传响应、系统提示、chat 前置检查都只读这一列，不用为了元数据去解析整个 xlsx
+    profile: Mapped[Optional[dict[str, Any]]] = mapped_column(JSON, nullable=True)
 
     uploaded_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=False),
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class UploadBlob(Base):
+    """内容寻址的上传文件：同样字节的 xlsx 只存一份，file_uploads 通过 content_hash 引用。"""
+
+    __tablename__ = "upload_blobs"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 hex
+    stored_path: Mapped[str] = mapped_column(String(1024), nullable=False)
+    size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    # 引用它的 file_uploads 条数；降到 0 才删文件
+    ref_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=False),
+        server_default=func.now(),
+        nullable=False,
+    )
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -7,4 +7,15 @@ class ExcelUploadResponse(BaseModel):
     session_id: str
     upload_id: str
     filename: str
-    profile: Dict[str, Any]
+    status: str = "ready"
+    profile: Optional[Dict[str, Any]] = None  # INGEST_MODE=async 时解析完之前为空
+
+
+class UploadStatusResponse(BaseModel):
+    upload_id: str
+    session_id: str
+    filename: str
+    status: str  # pending / parsing / ready / failed
+    progress: int
+    error: Optional[str] = None
+    profile: Optional[Dict[str, Any]] = None
@@ -1,13 +1,28 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import get_settings
+from app.models.file_upload import FileUpload
+from app.services.answer_cache import (
+    answer_cache_enabled,
+    context_fingerprint,
+    normalize_question,
+    plan_cache,
+    reply_cache,
+    trace_cache,
+)
+from app.services.artifacts import table_artifact, wants_table_artifact
 from app.services.conversation_service import ConversationService
-from app.services.excel_service import ExcelService
+from app.services.excel_service import ExcelService, excel_cache
 from app.services.llm_service import get_llm_provider
 from app.services.planner import plan_tools, ToolCall
 from app.services.tools.default_registry import build_default_registry
+from app.services.tool_executor import ToolRunner
+from app.services.tools.logical_plan import execute_async as execute_plan, optimize as optimize_plan
+from app.services.tools.pandas_tools import PREVIEW_ROWS
+from app.services.tools.registry import ToolContext
 
 
 class AgentService:
@@ -21,48 +36,109 @@ class AgentService:
         return "\n".join(lines).strip()
 
     @staticmethod
-    async def answer_excel_question(
-        db: AsyncSession,
-        *,
-        session_id: str,
-        upload_id: str,
-        question: str,
-    ) -> tuple[str, dict]:
-        cached = await ExcelService.ensure_cached(db, upload_id)
-        if not cached:
-            return "我找不到对应的上传文件（可能被删除或路径无效）。", {"error": "upload_missing"}
-
+    async def _run_tools(
+        cached: dict[str, Any],
+        plan: list[ToolCall],
+        fingerprint: Optional[str] = None,
+        question: str = "",
+    ) -> dict[str, Any]:
         df = cached["df"]
-        profile = cached["profile"]
-
-        plan: list[ToolCall] = plan_tools(df, question)
-
         reg = build_default_registry()
         trace: list[dict[str, Any]] = []
         artifacts: list[dict[str, Any]] = []   # ✅ 关键：先定义
-        current_df = df
-
-        for call in plan:
-            fn = reg.get(call.name)
-            out = fn(current_df, **call.args)
-
-            trace.append(
-                {
-                    "tool": call.name,
-                    "args": call.args,
-                    "output_kind": out.kind,
-                    "output_preview": out.preview,
-                }
-            )
+        tool_ctx = ToolContext(
+            source_df=df,
+            schema=cached.get("schema"),
+            stats=cached.get("stats"),
+            indexes=cached.get("indexes"),
+            fingerprint=fingerprint,
+        )
 
-            if out.kind == "table":
-                current_df = out.value
+        # 先把工具链变成逻辑计划优化一遍（投影下推、sort+head 融合成 top-k），再执行；
+        # trace 还是每个逻辑步骤一条，exec 里记物理上怎么跑的。
+        # 每一步丢到有界线程池里跑，带单步 / 整条链的超时，不占事件循环
+        steps = optimize_plan(plan, [str(c) for c in df.columns])
+        runner = ToolRunner(reg, tool_ctx)
+        last_table = None
+        for step, out in await execute_plan(reg, df, steps, runner, tool_ctx):
+            entry = {
+                "tool": step.name,
+                "args": step.args,
+                "output_kind": out.kind,
+                "output_preview": out.preview,
+            }
+            if step.notes:
+                entry["exec"] = step.notes
+            trace.append(entry)
 
             if out.kind == "chart":
                 # ✅ 缩进修正
                 artifacts.append({"kind": "chart", "spec": out.value})
+            elif out.kind == "table":
+                last_table = out.value
+
+        # 工具链最后产出的表：要表格或者回复里放不下时才带上（列式编码，大表可选 Arrow）
+        if last_table is not None and wants_table_artifact(question, last_table, PREVIEW_ROWS):
+            artifacts.append(table_artifact(last_table))
+
+        return {
+            "trace": trace,
+            "artifacts": artifacts,
+            "tool_result": AgentService._format_tool_results(trace),
+            "timed_out": runner.timed_out,
+        }
 
-        tool_result = AgentService._format_tool_results(trace)
+    @staticmethod
+    async def answer_excel_question(
+        db: AsyncSession,
+        *,
+        session_id: str,
+        upload_id: str,
+        question: str,
+        profile: Optional[dict[str, Any]] = None,
+    ) -> tuple[str, dict]:
+        fu = await db.get(FileUpload, upload_id)
+        if fu is None:
+            return "我找不到对应的上传文件（可能被删除或路径无效）。", {"error": "upload_missing"}
+
+        # 记忆的 key：内容标识（同内容的多次上传共用）+ 归一化后的问题
+        use_memo = answer_cache_enabled()
+        memo_key = (fu.content_hash or fu.id, normalize_question(question))
+        hits = {"plan": False, "tools": False, "reply": False}
+
+        plan: Optional[list[ToolCall]] = plan_cache.get(memo_key) if use_memo else None
+        tools = trace_cache.get(memo_key) if use_memo else None
+        hits["plan"] = plan is not None
+        hits["tools"] = tools is not None
+
+        # 工具链结果已经有了就不需要 DataFrame，profile 也尽量用库里那份
+        profile = profile or fu.profile
+        if tools is None or plan is None or profile is None:
+            cached = await ExcelService.ensure_cached(db, upload_id)
+            if not cached:
+                return "我找不到对应的上传文件（可能被删除或路径无效）。", {"error": "upload_missing"}
+            # 调用方已经从 file_uploads.profile 拿到了就直接用（和缓存里的是同一份内容）
+            profile = profile or cached["profile"]
+
+            # 规划 + 跑工具期间 pin 住缓存条目，避免工具链跑到一半被别的上传挤出去
+            with excel_cache.pinned(upload_id):
+                if plan is None:
+                    plan = plan_tools(
+                        cached["df"], question, cached.get("schema"), cached.get("matcher"), cached.get("indexes")
+                    )
+                    if use_memo:
+                        plan_cache.put(memo_key, plan)
+                if tools is None:
+                    # 同内容的上传共用工具结果缓存（不同问题之间复用 describe / groupby 之类的中间结果）
+                    indexes = cached.get("indexes")
+                    built = indexes.version if indexes is not None else 0
+                    tools = await AgentService._run_tools(cached, plan, fingerprint=memo_key[0], question=question)
+                    # 这次新建了列索引：让缓存按新的大小重新记账（超预算就挤掉别的条目）
+                    if indexes is not None and indexes.version != built:
+                        excel_cache.account(upload_id)
+                    # 超时的结果不记：下次负载低了可能就跑得完
+                    if use_memo and not tools["timed_out"]:
+                        trace_cache.put(memo_key, tools)
 
         ctx = await ConversationService.build_llm_context(db, session_id)
         ctx_text = "\n".join([f"{m['role']}: {m['content']}" for m in ctx][-20:])
@@ -73,13 +149,25 @@ class AgentService:
             f"最近对话（节选）：\n{ctx_text}"
         )
 
-        llm = get_llm_provider()
-        reply = await llm.generate(system=system, user=question, tool_result=tool_result)
+        # 回复还要看上下文：系统提示（含最近对话）、工具输出、LLM 配置任何一项变了都不复用
+        settings = get_settings()
+        fingerprint = context_fingerprint(
+            system, tools["tool_result"], settings.llm_provider, settings.openai_model
+        )
+        reply_key = memo_key + (fingerprint,)
+        reply: Optional[str] = reply_cache.get(reply_key) if use_memo else None
+        hits["reply"] = reply is not None
+        if reply is None:
+            llm = get_llm_provider()
+            reply = await llm.generate(system=system, user=question, tool_result=tools["tool_result"])
+            if use_memo:
+                reply_cache.put(reply_key, reply)
 
         debug = {
             "plan": [{"tool": p.name, "args": p.args} for p in plan],
-            "tool_trace": trace,
-            "artifacts": artifacts,  # ✅ 现在一定存在
+            "tool_trace": tools["trace"],
+            "artifacts": tools["artifacts"],  # ✅ 现在一定存在
             "profile": {"rows": profile["rows"], "cols": profile["cols"], "columns": profile["columns"][:20]},
+            "cache": hits,
         }
         return reply, debug
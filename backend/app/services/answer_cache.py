@@ -0,0 +1,113 @@
+"""
+问答结果的进程内记忆（AgentService 用）：同一份内容上反复问同一个问题时跳过重算。
+
+分三层，各自独立淘汰：
+- plan：  (内容标识, 归一化问题) -> list[ToolCall]
+- tools： (内容标识, 归一化问题) -> 工具链的 trace / artifacts / 汇总文本
+- reply： (内容标识, 归一化问题, 上下文指纹) -> LLM 回复
+内容标识是 content_hash（文件内容不可变，所以不用做失效）；上下文指纹覆盖
+系统提示（含最近对话）、工具输出和 LLM 配置，对话一变回复就不会复用。
+每层都有条目上限 + TTL；ANSWER_CACHE=false 时整个关掉。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from app.core.config import get_settings
+
+
+def normalize_question(question: str) -> str:
+    # 只做大小写 + 空白归一：planner 的关键词判断是按子串来的，别的改写可能改变规划结果
+    return " ".join((question or "").lower().split())
+
+
+def context_fingerprint(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class TTLCache:
+    """带 TTL 的 LRU：get 过期即删，put 超上限从最久没用的开始淘汰。"""
+
+    def __init__(
+        self,
+        max_entries: Callable[[], int],
+        ttl_s: Callable[[], float],
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_entries = max_entries
+        self._ttl_s = ttl_s
+        self._clock = clock
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None or hit[0] <= self._clock():
+                if hit is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return hit[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        limit = int(self._max_entries())
+        if limit <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + float(self._ttl_s()), value)
+            self._data.move_to_end(key)
+            while len(self._data) > limit:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+def _max_entries() -> int:
+    return int(get_settings().answer_cache_max_entries)
+
+
+def _ttl_s() -> float:
+    return float(get_settings().answer_cache_ttl_s)
+
+
+def answer_cache_enabled() -> bool:
+    return bool(get_settings().answer_cache)
+
+
+plan_cache = TTLCache(_max_entries, _ttl_s)
+trace_cache = TTLCache(_max_entries, _ttl_s)
+reply_cache = TTLCache(_max_entries, _ttl_s)
+
+
+def clear_answer_caches() -> None:
+    for c in (plan_cache, trace_cache, reply_cache):
+        c.clear()
+
+
+def answer_cache_stats() -> dict[str, dict[str, int]]:
+    return {"plan": plan_cache.stats(), "tools": trace_cache.stats(), "reply": reply_cache.stats()}
@@ -0,0 +1,108 @@
+"""
+回答附带的 artifacts（图表 / 表格）的编码。
+
+都是列式的：列名只出现一次，每列一个数组，缺失值是 null。
+- 图表：x.values + series[].values（NumPy 缺失掩码一次性转换，不再逐个 pd.isna）
+- 表格：{"columns": [...], "dtypes": [...], "data": [[第 1 列], [第 2 列], ...]}，
+  比 to_dict(orient="records") 每行重复一遍列名小得多；最多 ARTIFACT_TABLE_MAX_ROWS 行。
+  只在用户要表格 / 明细，或者表比给 LLM 的预览长（回复里放不下）时才带，见 wants_table_artifact
+- 大表可选 Arrow：ARTIFACT_ARROW=true 且带出去的行数 >= ARTIFACT_ARROW_MIN_ROWS 时，
+  data 换成 base64 的 Arrow IPC stream（encoding="arrow"），pyarrow 不可用 / 存不了就退回 JSON
+"""
+
+from __future__ import annotations
+
+import base64
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import get_settings
+from app.services.sidecar import frame_to_arrow_bytes
+
+
+def encode_floats(arr: np.ndarray) -> list[Optional[float]]:
+    """float 数组 -> JSON 列表（NaN -> None）。"""
+    arr = np.asarray(arr, dtype=float)
+    out = arr.astype(object)
+    out[np.isnan(arr)] = None
+    return out.tolist()
+
+
+def encode_labels(s: pd.Series) -> list[Optional[str]]:
+    """x 轴标签：str(v)，缺失 -> None。"""
+    mask = s.isna().to_numpy()
+    if s.dtype == object or isinstance(s.dtype, pd.StringDtype) or s.dtype.kind in "iub":
+        # astype(str) 在 C 里逐个 str()，和 Python 的 str(v) 结果一致
+        out = s.astype(str).to_numpy(dtype=object)
+    else:
+        # 时间 / 浮点这类 astype(str) 的格式和 str(v) 不一样（比如日期会丢掉时分秒）
+        out = np.array([str(v) for v in s.tolist()], dtype=object)
+    out[mask] = None
+    return out.tolist()
+
+
+def _encode_column(s: pd.Series) -> list[Any]:
+    if pd.api.types.is_bool_dtype(s) and s.dtype != object:
+        return s.astype(object).where(s.notna(), None).tolist()
+    if pd.api.types.is_integer_dtype(s) and not s.isna().any():
+        return s.to_numpy(dtype=np.int64).tolist()
+    if pd.api.types.is_numeric_dtype(s):
+        return encode_floats(pd.to_numeric(s, errors="coerce").to_numpy(dtype=float, na_value=np.nan))
+    if pd.api.types.is_datetime64_any_dtype(s):
+        out = s.dt.strftime("%Y-%m-%dT%H:%M:%S").to_numpy(dtype=object)
+        out[s.isna().to_numpy()] = None
+        return out.tolist()
+
+    vals = s.to_numpy(dtype=object)
+    mask = pd.isna(vals)
+    # 混合类型的 object 列：JSON 原生类型原样留着，其它（Timestamp 之类）转成字符串
+    odd = ~mask & np.array([not isinstance(v, (str, int, float, bool)) for v in vals], dtype=bool)
+    if odd.any():
+        vals = vals.copy()
+        vals[odd] = [str(v) for v in vals[odd]]
+    vals[mask] = None
+    return vals.tolist()
+
+
+_TABLE_WORDS = ["表格", "列表", "明细", "列出", "列一下", "清单", "导出", "所有行", "table", "list", "rows"]
+
+
+def wants_table_artifact(question: str, df: pd.DataFrame, preview_rows: int) -> bool:
+    """
+    工具链最后的表要不要作为 artifact 带上（会随消息一起存进库里）：
+    问题里明确要表格 / 明细才带；否则只有行数超过预览（LLM 没看全，回复里不会有）才带。
+    """
+    q = (question or "").lower()
+    if any(w in q for w in _TABLE_WORDS):
+        return True
+    return len(df) > preview_rows
+
+
+def table_artifact(df: pd.DataFrame, max_rows: Optional[int] = None) -> dict[str, Any]:
+    settings = get_settings()
+    max_rows = settings.artifact_table_max_rows if max_rows is None else max_rows
+    shown = df.head(max_rows) if max_rows and max_rows > 0 else df
+    art: dict[str, Any] = {
+        "kind": "table",
+        "columns": [str(c) for c in shown.columns],
+        "dtypes": [str(t) for t in shown.dtypes],
+        "rows": int(len(shown)),
+        "total_rows": int(len(df)),
+    }
+
+    # 门槛比截断上限还高的话，截满了也算大表（不然这个开关永远不生效）
+    arrow_min = settings.artifact_arrow_min_rows
+    if len(shown) < len(df):
+        arrow_min = min(arrow_min, len(shown))
+    if settings.artifact_arrow and len(shown) >= arrow_min:
+        payload = frame_to_arrow_bytes(shown.reset_index(drop=True))
+        if payload is not None:
+            art["encoding"] = "arrow"
+            art["arrow"] = base64.b64encode(payload).decode("ascii")
+            return art
+
+    art["encoding"] = "json"
+    art["data"] = [_encode_column(shown.iloc[:, i]) for i in range(shown.shape[1])]
+    return art
@@ -0,0 +1,82 @@
+"""
+启动预热：部署 / 重启之后，把最近活跃会话正在用的 upload 提前装进 excel_cache，
+避免每个会话的第一个问题都去冷解析一次。
+
+- 按会话最近一条消息的时间（没有消息就按会话创建时间）倒序取 current_upload_id
+- 受 CACHE_WARMUP_MAX_UPLOADS（个数）和 CACHE_WARMUP_MAX_MB（缓存占用）两个预算约束
+- 在 lifespan 里作为后台任务跑，不挡启动；进度在 warmup_state 里，/ready 据此返回 503 / 200
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+
+from sqlalchemy import func, select
+
+from app.core.config import get_settings
+from app.core.database import get_sessionmaker
+from app.models.file_upload import INGEST_READY, FileUpload
+from app.models.message import Message
+from app.models.session import Session
+from app.services.excel_service import ExcelService, excel_cache
+
+logger = logging.getLogger(__name__)
+
+WARMUP_IDLE = "idle"        # 没开预热
+WARMUP_RUNNING = "warming"
+WARMUP_DONE = "done"
+WARMUP_FAILED = "failed"    # 预热本身出错也不影响服务，只是没预热
+
+warmup_state: dict[str, Any] = {"status": WARMUP_IDLE, "loaded": 0, "total": 0}
+
+
+def is_ready() -> bool:
+    return warmup_state["status"] != WARMUP_RUNNING
+
+
+async def recent_upload_ids(limit: int) -> list[str]:
+    """最近活跃的会话正在用的 upload（去重，按活跃时间倒序），只取已经解析成功的。"""
+    last_active = func.coalesce(func.max(Message.created_at), Session.created_at)
+    stmt = (
+        select(Session.current_upload_id)
+        .join(FileUpload, FileUpload.id == Session.current_upload_id)
+        .outerjoin(Message, Message.session_id == Session.id)
+        .where(FileUpload.status == INGEST_READY)
+        .group_by(Session.id, Session.current_upload_id, Session.created_at)
+        .order_by(last_active.desc())
+        .limit(limit)
+    )
+    SessionLocal = get_sessionmaker()
+    async with SessionLocal() as db:
+        rows = (await db.execute(stmt)).scalars().all()
+    return list(dict.fromkeys(rows))
+
+
+async def warm_cache() -> None:
+    settings = get_settings()
+    budget_bytes = int(settings.cache_warmup_max_mb) * 1024 * 1024
+    warmup_state.update(status=WARMUP_RUNNING, loaded=0, total=0)
+    try:
+        upload_ids = await recent_upload_ids(max(0, int(settings.cache_warmup_max_uploads)))
+        warmup_state["total"] = len(upload_ids)
+
+        SessionLocal = get_sessionmaker()
+        for upload_id in upload_ids:
+            if excel_cache.stats()["bytes"] >= budget_bytes:
+                logger.info("cache warmup stopped at budget after %d uploads", warmup_state["loaded"])
+                break
+            try:
+                async with SessionLocal() as db:
+                    await ExcelService.ensure_cached(db, upload_id)
+                warmup_state["loaded"] += 1
+            except Exception as e:  # 单个文件坏了不影响其它的
+                logger.warning("cache warmup skipped %s: %s", upload_id, type(e).__name__)
+        warmup_state["status"] = WARMUP_DONE
+    except asyncio.CancelledError:
+        warmup_state["status"] = WARMUP_DONE
+        raise
+    except Exception as e:
+        logger.warning("cache warmup failed: %s", e)
+        warmup_state["status"] = WARMUP_FAILED
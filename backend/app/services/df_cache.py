@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Optional
+
+import pandas as pd
+
+from app.core.config import get_settings
+
+
+def estimate_item_bytes(item: dict[str, Any]) -> int:
+    """
+    只统计 item 里的 DataFrame / Series，以及自带 memory_bytes() 的对象（schema 目录的影子列等）；
+    profile 这类小 dict 忽略不计。item["shared_bytes"]（mmap 共享的列）不算进进程私有内存。
+    """
+    total = -int(item.get("shared_bytes") or 0)
+    for v in item.values():
+        if isinstance(v, pd.DataFrame):
+            total += int(v.memory_usage(index=True, deep=True).sum())
+        elif isinstance(v, pd.Series):
+            total += int(v.memory_usage(index=True, deep=True))
+        elif hasattr(v, "memory_bytes"):
+            total += int(v.memory_bytes())
+    return max(0, total)
+
+
+def _default_max_bytes() -> int:
+    # 每次淘汰时现读配置：测试里会 cache_clear 之后改环境变量
+    return int(get_settings().excel_cache_max_mb) * 1024 * 1024
+
+
+@dataclass
+class _Entry:
+    item: dict[str, Any]
+    nbytes: int
+    pins: int = 0
+
+
+class DataFrameCache:
+    """
+    key -> {"df": DataFrame, "profile": dict, ...}；key 一般是 content_hash，upload_id 挂成别名
+
+    - 按字节预算做 LRU 淘汰（DataFrame.memory_usage(deep=True) 估算）
+    - pinned() 期间的条目不会被淘汰（正在被请求使用）
+    - 单个条目本身就超预算时照样保留，只是会把其它未 pin 的条目都挤出去
+    - 对外接口尽量像 dict：get / [] / in / pop / clear，老代码不用改
+    """
+
+    def __init__(self, max_bytes: Optional[Callable[[], int]] = None) -> None:
+        self._max_bytes = max_bytes or _default_max_bytes
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        # 别名 -> 真实 key（upload_id -> content_hash），同内容的多次上传共用一个条目
+        self._aliases: dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ----------------------------
+    # dict 风格接口
+    # ----------------------------
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            key = self._aliases.get(key, key)
+            e = self._entries.get(key)
+            if e is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return e.item
+
+    def put(self, key: str, item: dict[str, Any]) -> None:
+        nbytes = estimate_item_bytes(item)
+        with self._lock:
+            # 覆盖时原地换内容：pinned() 记的是 _Entry 对象，pin 跟着条目走
+            e = self._entries.get(key)
+            if e is not None:
+                self._bytes -= e.nbytes
+                e.item, e.nbytes = item, nbytes
+                self._entries.move_to_end(key)
+            else:
+                self._entries[key] = _Entry(item=item, nbytes=nbytes)
+            self._bytes += nbytes
+            self._evict(keep=key)
+
+    def __setitem__(self, key: str, item: dict[str, Any]) -> None:
+        self.put(key, item)
+
+    def __getitem__(self, key: str) -> dict[str, Any]:
+        item = self.get(key)
+        if item is None:
+            raise KeyError(key)
+        return item
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return self._aliases.get(key, key) in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """key 可以是别名；条目删掉之后，指向它的别名也一起清掉。"""
+        with self._lock:
+            key = self._aliases.pop(key, key)
+            self._drop_aliases(key)
+            e = self._entries.pop(key, None)
+            if e is None:
+                return default
+            self._bytes -= e.nbytes
+            return e.item
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    # ----------------------------
+    # 别名 / pin / 记账 / 统计
+    # ----------------------------
+    def alias(self, name: str, key: str) -> None:
+        if name == key:
+            return
+        with self._lock:
+            self._aliases[name] = key
+
+    def unalias(self, name: str) -> None:
+        with self._lock:
+            self._aliases.pop(name, None)
+
+    @contextmanager
+    def pinned(self, key: str) -> Iterator[None]:
+        """请求处理期间 pin 住条目（key 可以是别名）；key 不在缓存里时什么也不做。"""
+        with self._lock:
+            key = self._aliases.get(key, key)
+            e = self._entries.get(key)
+            if e is not None:
+                e.pins += 1
+        try:
+            yield
+        finally:
+            # 只还自己 pin 的那个条目：进来时 key 不在缓存里，期间别的请求装进来并 pin 住的条目不能动
+            if e is not None:
+                with self._lock:
+                    e.pins -= 1
+                    self._evict()
+
+    def account(self, key: str) -> None:
+        """条目里后加了东西（索引、影子列等）时重新估算大小。"""
+        with self._lock:
+            key = self._aliases.get(key, key)
+            e = self._entries.get(key)
+            if e is None:
+                return
+            nbytes = estimate_item_bytes(e.item)
+            self._bytes += nbytes - e.nbytes
+            e.nbytes = nbytes
+            self._evict(keep=key)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "shared_bytes": sum(int(e.item.get("shared_bytes") or 0) for e in self._entries.values()),
+                "max_bytes": int(self._max_bytes()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        budget = int(self._max_bytes())
+        if self._bytes <= budget:
+            return
+        # OrderedDict 头部就是最久没用的
+        for key in list(self._entries.keys()):
+            if self._bytes <= budget:
+                break
+            e = self._entries[key]
+            if key == keep or e.pins > 0:
+                continue
+            del self._entries[key]
+            self._bytes -= e.nbytes
+            self.evictions += 1
+            self._drop_aliases(key)
+
+    def _drop_aliases(self, key: str) -> None:
+        # 条目没了，指向它的别名也清掉（下次 ensure_cached 回填时会重新挂上）
+        for name in [n for n, k in self._aliases.items() if k == key]:
+            del self._aliases[name]
@@ -0,0 +1,338 @@
+"""
+xlsx 解析 + profile 计算（纯 CPU，不依赖 FastAPI / DB）。
+
+这里的函数会被 parse_executor 丢到进程池里跑，所以：
+- 只用模块级函数 + 可 pickle 的返回值
+- 不读 Settings，需要的开关都由调用方显式传进来
+"""
+
+from __future__ import annotations
+
+import json
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from app.services.schema_catalog import SchemaCatalog, infer_schema
+from app.services.sidecar import (
+    frame_from_arrow_bytes,
+    frame_to_arrow_bytes,
+    read_sidecar,
+    sidecar_available,
+    write_sidecar,
+)
+from app.services.stats_catalog import ColumnAggregates, compute_aggregates
+
+
+def _preview_records(df: pd.DataFrame, n: int = 10) -> list[dict[str, str]]:
+    head = df.head(n)
+    # category 列直接 fillna("") 会报“新类别”错，先还原成 object；其它列保持原样
+    cats = {c: object for c, t in head.dtypes.items() if isinstance(t, pd.CategoricalDtype)}
+    if cats:
+        head = head.astype(cats)
+    with pd.option_context("future.no_silent_downcasting", True):
+        return head.fillna("").astype(str).to_dict(orient="records")
+
+
+def build_profile(df: pd.DataFrame, dtype_report: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    # 基础 profile（给后续 LLM 用的“预览结构”）
+    profile = {
+        "rows": int(df.shape[0]),
+        "cols": int(df.shape[1]),
+        "columns": [str(c) for c in df.columns.tolist()],
+        "dtypes": {str(k): str(v) for k, v in df.dtypes.items()},
+        # 空表 mean() 是 NaN，JSON 列存不了 NaN，记成 0
+        "missing_rate": {str(k): float(v) if df.shape[0] else 0.0 for k, v in df.isna().mean().items()},
+        "preview": _preview_records(df),
+    }
+    if dtype_report is not None:
+        profile["memory"] = dtype_report
+    return profile
+
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def optimize_dtypes(df: pd.DataFrame, category_max_ratio: float = 0.5) -> tuple[pd.DataFrame, dict[str, Any]]:
+    """
+    入库后的 dtype 瘦身（可选，OPTIMIZE_DTYPES=true 才做）：
+    - 整数列 downcast 到最小的有符号整型（groupby/sum 在 pandas 里会自动升回 int64）
+    - 低基数文本列 -> category（姓名 / 班级 / 地区这类）
+    - 其余没有缺失值的纯文本列 -> Arrow 字符串；有缺失的保持 object，
+      否则预览里 NaN 会变成 <NA>，工具输出就和没优化时对不上了
+    - 浮点列不动：float32 会改变求和 / 均值结果
+    返回 (新 df, 报告)；报告记录优化前后的内存和每列的 dtype 变化。
+    """
+    before = _frame_bytes(df)
+    out = df.copy(deep=False)
+    changed: dict[str, str] = {}
+    n = len(df)
+
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_bool_dtype(s):
+            continue
+        if pd.api.types.is_integer_dtype(s) and not pd.api.types.is_extension_array_dtype(s):
+            small = pd.to_numeric(s, downcast="integer")
+            if small.dtype != s.dtype:
+                out[c] = small
+        elif s.dtype == object and n > 0:
+            if pd.api.types.infer_dtype(s, skipna=True) != "string":
+                continue
+            if s.nunique(dropna=True) <= max(1, int(n * category_max_ratio)):
+                out[c] = s.astype("category")
+            elif sidecar_available() and not s.hasnans:
+                out[c] = s.astype("string[pyarrow]")
+        if out[c].dtype != s.dtype:
+            changed[str(c)] = str(out[c].dtype)
+
+    after = _frame_bytes(out)
+    report = {
+        "before_bytes": before,
+        "after_bytes": after,
+        "saved_bytes": before - after,
+        "optimized_columns": changed,
+    }
+    return out, report
+
+
+class IngestLimitError(ValueError):
+    """工作簿超过解压大小 / 行数 / 单元格数上限，解析被提前中止。"""
+
+
+@dataclass
+class IngestLimits:
+    # 0 或 None 表示不限制
+    max_rows: Optional[int] = None
+    max_cells: Optional[int] = None
+    max_unzipped_bytes: Optional[int] = None
+    chunk_rows: int = 50_000
+
+
+def _check_unzipped_size(stored_path: Path, max_bytes: Optional[int]) -> None:
+    # xlsx 是 zip：10MB 的文件解压后可能是几个 GB 的 XML，先看 zip 目录里的原始大小
+    if not max_bytes:
+        return
+    try:
+        with zipfile.ZipFile(stored_path) as zf:
+            total = sum(info.file_size for info in zf.infolist())
+    except zipfile.BadZipFile:
+        return  # 交给 openpyxl 报“不是合法 xlsx”
+    if total > max_bytes:
+        raise IngestLimitError(f"workbook too large when decompressed ({total // (1024 * 1024)}MB)")
+
+
+def _convert_cell(cell) -> Any:
+    # 和 pandas 的 OpenpyxlReader._convert_cell 保持一致，结果才能和 read_excel 对得上
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == "e":
+        return np.nan
+    if cell.data_type == "n":
+        as_int = int(value)
+        return as_int if as_int == value else float(value)
+    return value
+
+
+def _lossy(raw: list[Any], dtype: np.dtype) -> bool:
+    # 转换后回不到原单元格的列："001" 这类文本被转成了数，或者整数和空格 / 小数混在一起变成了 float
+    if dtype == object:
+        return False
+    if any(isinstance(v, str) and v != "" for v in raw):
+        return True
+    return dtype.kind == "f" and any(type(v) is int for v in raw)
+
+
+def _parse_chunk(rows: list[list[Any]], width: int) -> tuple[pd.DataFrame, dict[int, list[Any]]]:
+    """返回 (分块, 原始单元格)；原始单元格只留转换有损的列，分块间类型对不上时拿它重新推断。"""
+    width = max([width] + [len(r) for r in rows])
+    padded = [r + [""] * (width - len(r)) for r in rows]
+    chunk = TextParser(padded, header=None).read()
+    raw: dict[int, list[Any]] = {}
+    for i in range(chunk.shape[1]):
+        dtype = chunk.dtypes.iloc[i]
+        if dtype == object:
+            continue
+        col = [r[i] for r in padded]
+        if _lossy(col, dtype):
+            raw[i] = col
+    return chunk, raw
+
+
+def _reinfer_column(values: Iterable[Any]) -> pd.Series:
+    # 各分块推断出的类型不一致（比如 bool 块 + 含缺失的块）：整列按 read_excel 的规则再推断一次
+    # values 要是原始单元格（有损的列从分块的原始值里取），不能拿已经转换过的值
+    # 每行只有一格：空单元格（""）那行不能被当成空行跳过
+    return TextParser([[v] for v in values], header=None, skip_blank_lines=False).read().iloc[:, 0]
+
+
+def _stream_rows(ws, limits: IngestLimits) -> Iterable[list[Any]]:
+    """逐行吐出转换好的单元格；尾部空行先攒着，后面还有数据才补发（read_excel 会裁掉尾部空行）。"""
+    blank_run = 0
+    n_rows = 0
+    n_cells = 0
+    for row in ws.rows:
+        converted = [_convert_cell(c) for c in row]
+        while converted and converted[-1] == "":
+            converted.pop()
+        if not converted:
+            blank_run += 1
+            continue
+
+        n_rows += blank_run + 1
+        n_cells += len(converted)
+        if limits.max_rows and n_rows > limits.max_rows + 1:  # +1：表头
+            raise IngestLimitError(f"too many rows (>{limits.max_rows})")
+        if limits.max_cells and n_cells > limits.max_cells:
+            raise IngestLimitError(f"too many cells (>{limits.max_cells})")
+
+        for _ in range(blank_run):
+            yield []
+        blank_run = 0
+        yield converted
+
+
+def read_workbook(stored_path: Path, limits: Optional[IngestLimits] = None) -> pd.DataFrame:
+    """
+    流式读取第一个 sheet（openpyxl read_only），结果与 pd.read_excel(stored_path) 一致。
+
+    - 每 chunk_rows 行推断一次类型、变成紧凑的 DataFrame 分块，不在内存里攒整张表的 list
+      （转换有损的列——"001" 转成了 1 之类——额外留着原始单元格，分块类型不一致时按原值重新推断）
+    - 超过行数 / 单元格数 / 解压大小上限立即抛 IngestLimitError，不等内存被吃光
+    """
+    from openpyxl import load_workbook
+
+    limits = limits or IngestLimits()
+    _check_unzipped_size(stored_path, limits.max_unzipped_bytes)
+
+    wb = load_workbook(stored_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[0]  # 默认 sheet0
+        ws.reset_dimensions()  # read_only 模式下 dimension 经常不准
+
+        header: Optional[list[Any]] = None
+        width = 0
+        chunks: list[pd.DataFrame] = []
+        raws: list[dict[int, list[Any]]] = []
+        buf: list[list[Any]] = []
+        for row in _stream_rows(ws, limits):
+            width = max(width, len(row))
+            if header is None:
+                header = row
+                continue
+            buf.append(row)
+            if len(buf) >= limits.chunk_rows:
+                chunk, raw = _parse_chunk(buf, width)
+                chunks.append(chunk)
+                raws.append(raw)
+                buf = []
+        if buf:
+            chunk, raw = _parse_chunk(buf, width)
+            chunks.append(chunk)
+            raws.append(raw)
+    finally:
+        wb.close()
+
+    if header is None:
+        return pd.DataFrame()
+
+    # 列名交给 TextParser 生成：Unnamed: n、重名 a.1 这些规则和 read_excel 完全一样
+    names = TextParser([header + [""] * (width - len(header))], header=0).read().columns
+    if not chunks:
+        return pd.DataFrame(columns=names, dtype=object)
+
+    cols = range(width)
+    parts = [c.reindex(columns=cols) for c in chunks]
+    if len(parts) == 1:
+        df = parts[0]
+    else:
+        data: dict[int, pd.Series] = {}
+        for i in cols:
+            pieces = [p[i] for p in parts]
+            if len({str(x.dtype) for x in pieces}) > 1:
+                data[i] = _reinfer_column([v for x, raw in zip(pieces, raws) for v in raw.get(i, x.tolist())])
+            else:
+                data[i] = pd.concat(pieces, ignore_index=True)
+        df = pd.DataFrame(data)
+    df.columns = names
+    return df
+
+
+@dataclass
+class ParsedUpload:
+    """
+    parse_upload 的返回值。DataFrame 按代价从低到高三选一带回：
+    - sidecar=True：已经写好 .arrow，父进程 memory_map 读就行，什么都不用传
+    - arrow：Arrow IPC stream 字节（跨进程）
+    - df：同进程执行时直接带回；或者 Arrow 存不了时退回 pickle
+    """
+
+    profile: dict[str, Any]
+    sidecar: bool = False
+    arrow: Optional[bytes] = None
+    df: Optional[pd.DataFrame] = None
+    # analyze=True 时在解析的进程里顺带算好的 schema 目录 / 列聚合（见 analyze_frame）
+    schema: Optional[SchemaCatalog] = None
+    aggregates: Optional[dict[str, ColumnAggregates]] = None
+
+
+def analyze_frame(df: pd.DataFrame) -> tuple[SchemaCatalog, dict[str, ColumnAggregates]]:
+    """
+    schema 推断 + 列聚合。逐列正则 / 字符串清洗 + 整表归约，全程拿着 GIL，
+    所以跟解析一样放在执行器里跑，不放 web 进程的线程里。
+    影子列按 RangeIndex 对齐，父进程从 Arrow / 旁路文件还原的 df 也是 RangeIndex，可以直接用。
+    """
+    schema = infer_schema(df)
+    return schema, compute_aggregates(df, schema)
+
+
+def parse_upload(
+    stored_path: str,
+    *,
+    use_sidecar: bool,
+    in_process: bool,
+    limits: Optional[IngestLimits] = None,
+    optimize: bool = False,
+    analyze: bool = False,
+) -> ParsedUpload:
+    path = Path(stored_path)
+    df = read_workbook(path, limits)
+
+    dtype_report = None
+    if optimize:
+        df, dtype_report = optimize_dtypes(df)
+
+    extra_meta = {"dtype_report": json.dumps(dtype_report)} if dtype_report else None
+    sidecar_ok = use_sidecar and write_sidecar(path, df, extra_meta)
+    profile = build_profile(df, dtype_report)
+    schema, aggregates = analyze_frame(df) if analyze else (None, None)
+
+    if in_process:
+        out = ParsedUpload(profile=profile, sidecar=sidecar_ok, df=df)
+    elif sidecar_ok:
+        out = ParsedUpload(profile=profile, sidecar=True)
+    else:
+        arrow = frame_to_arrow_bytes(df)
+        out = ParsedUpload(profile=profile, df=df) if arrow is None else ParsedUpload(profile=profile, arrow=arrow)
+    out.schema, out.aggregates = schema, aggregates
+    return out
+
+
+def materialize(parsed: ParsedUpload, stored_path: Path) -> pd.DataFrame:
+    """把 ParsedUpload 还原成 DataFrame（在父进程里调用）。"""
+    if parsed.df is not None:
+        return parsed.df
+    if parsed.arrow is not None:
+        return frame_from_arrow_bytes(parsed.arrow)
+    df = read_sidecar(stored_path) if parsed.sidecar else None
+    if df is None:
+        # 旁路文件刚写完就被删/改了：兜底再解析一次
+        df = read_workbook(stored_path)
+    return df
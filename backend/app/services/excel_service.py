@@ -1,22 +1,51 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import logging
+import os
 import uuid
 from pathlib import Path
 from typing import Any, Optional
 
-import pandas as pd
 from fastapi import HTTPException, UploadFile
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import get_settings
-from app.models.file_upload import FileUpload
+from app.core.database import get_sessionmaker
+from app.models.file_upload import (
+    INGEST_FAILED,
+    INGEST_PARSING,
+    INGEST_PENDING,
+    INGEST_READY,
+    FileUpload,
+)
 from app.models.session import Session
+from app.models.upload_blob import UploadBlob
+from app.services.df_cache import DataFrameCache
+from app.services.excel_ingest import IngestLimitError
+from app.services.parse_executor import load_upload
+from app.services.planner import ColumnMatcher
+from app.services.index_catalog import IndexCatalog
+from app.services.sidecar import shared_bytes, sidecar_path
 
 from sqlalchemy import select
 from app.models.file_upload import FileUpload
 
-# upload_id -> {"df": DataFrame, "profile": dict}
-excel_cache: dict[str, dict[str, Any]] = {}
+logger = logging.getLogger(__name__)
+
+# content_hash -> {"df": DataFrame, "profile": dict, "schema": SchemaCatalog}；按 EXCEL_CACHE_MAX_MB 做 LRU 淘汰
+# upload_id 通过 alias 指向 content_hash：同一份文件传多少次都只缓存一份
+excel_cache = DataFrameCache()
+
+# upload_id -> 正在跑的后台解析任务（INGEST_MODE=async）
+_ingest_jobs: dict[str, asyncio.Task] = {}
+
+# cache_key -> 正在进行的加载（single-flight）：同一份内容并发未命中时只解析一次，
+# 其它请求等同一个结果，失败也一起失败
+_inflight_loads: dict[str, asyncio.Task] = {}
 
 
 class ExcelService:
@@ -37,7 +66,8 @@ class ExcelService:
         db: AsyncSession,
         session_id: str,
         file: UploadFile,
-    ) -> tuple[FileUpload, dict[str, Any]]:
+    ) -> tuple[FileUpload, Optional[dict[str, Any]]]:
+        """同步模式返回 (记录, profile)；异步模式 profile 为 None，解析结果看 FileUpload.status。"""
         settings = get_settings()
 
         if not file.filename:
@@ -53,13 +83,17 @@ class ExcelService:
             raise HTTPException(status_code=404, detail="session not found")
 
         upload_id = str(uuid.uuid4())
-        stored_path = ExcelService._uploads_dir() / f"{upload_id}.xlsx"
+        uploads_dir = ExcelService._uploads_dir()
+        incoming = uploads_dir / ".incoming"
+        incoming.mkdir(parents=True, exist_ok=True)
+        tmp_path = incoming / f"{upload_id}.part"
 
-        # 流式写文件 + 大小限制
+        # 流式写文件 + 大小限制，边写边算 sha256
         max_bytes = int(settings.max_upload_mb) * 1024 * 1024
         size = 0
+        hasher = hashlib.sha256()
         try:
-            with stored_path.open("wb") as f:
+            with tmp_path.open("wb") as f:
                 while True:
                     chunk = await file.read(1024 * 1024)
                     if not chunk:
@@ -70,48 +104,365 @@ class ExcelService:
                             status_code=413,
                             detail=f"file too large (>{settings.max_upload_mb}MB)",
                         )
+                    hasher.update(chunk)
                     f.write(chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
         finally:
             await file.close()
 
-        # 读 Excel -> DataFrame（默认第一个 sheet），失败就清理文件
+        # 内容寻址：同样的字节只存一份 uploads/<sha256>.xlsx
+        content_hash = hasher.hexdigest()
+        stored_path = uploads_dir / f"{content_hash}.xlsx"
+        # 先拿 blob 引用（提交掉）再决定复用还是落盘：拿到之后并发的 delete_upload 就删不掉这个 blob 了
+        try:
+            blob_is_new = await ExcelService._acquire_blob(db, content_hash, stored_path, size)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        if stored_path.exists() and not blob_is_new:
+            tmp_path.unlink(missing_ok=True)
+        else:
+            # 新 blob 一律用自己这份（同名文件可能是上一个 blob 删到一半留下的）
+            os.replace(tmp_path, stored_path)
+
         try:
-            df = pd.read_excel(stored_path)  # 默认 sheet0
-        except Exception as e:
-            stored_path.unlink(missing_ok=True)
-            raise HTTPException(status_code=400, detail=f"invalid xlsx: {type(e).__name__}")
-
-        # 生成基础 profile（给后续 LLM 用的“预览结构”）
-        profile = {
-            "rows": int(df.shape[0]),
-            "cols": int(df.shape[1]),
-            "columns": [str(c) for c in df.columns.tolist()],
-            "dtypes": {str(k): str(v) for k, v in df.dtypes.items()},
-            "missing_rate": {str(k): float(v) for k, v in df.isna().mean().items()},
-            "preview": (
-                df.head(10)
-                .fillna("")
-                .astype(str)
-                .to_dict(orient="records")
-            ),
+            return await ExcelService._ingest_new_upload(
+                db,
+                upload_id=upload_id,
+                session_id=session_id,
+                filename=filename,
+                stored_path=stored_path,
+                content_hash=content_hash,
+                size=size,
+            )
+        except BaseException:
+            # 记录没建成：把上面拿的引用还回去（最后一个引用的话连文件一起删）
+            await db.rollback()
+            if await ExcelService._release_blob(db, content_hash, stored_path):
+                excel_cache.pop(content_hash)
+            await db.commit()
+            raise
+
+    @staticmethod
+    async def _ingest_new_upload(
+        db: AsyncSession,
+        *,
+        upload_id: str,
+        session_id: str,
+        filename: str,
+        stored_path: Path,
+        content_hash: str,
+        size: int,
+    ) -> tuple[FileUpload, Optional[dict[str, Any]]]:
+        settings = get_settings()
+        cached = excel_cache.get(content_hash)
+
+        # 异步模式：文件落盘就先入库返回 upload_id，解析 / profile 交给后台任务
+        if settings.ingest_mode.lower() == "async":
+            ready = cached is not None
+            rec = await ExcelService._create_upload_record(
+                db,
+                upload_id=upload_id,
+                session_id=session_id,
+                filename=filename,
+                stored_path=stored_path,
+                content_hash=content_hash,
+                size=size,
+                status=INGEST_READY if ready else INGEST_PENDING,
+                progress=100 if ready else 0,
+                profile=cached["profile"] if ready else None,
+            )
+            excel_cache.alias(upload_id, content_hash)
+            if not ready:
+                ExcelService._start_ingest_job(upload_id, stored_path, content_hash)
+            return rec, cached["profile"] if ready else None
+
+        # 读 Excel -> DataFrame（默认第一个 sheet）+ profile：丢给解析执行器，不卡事件循环；
+        # 顺带落一份列式旁路缓存，之后 ensure_cached 回填就不用再解析 xlsx。
+        # 同内容已经在缓存里就直接复用，连旁路文件都不用读
+        if cached is not None:
+            item = cached
+        else:
+            try:
+                item = await ExcelService._load_shared(content_hash, stored_path)
+            except Exception as e:
+                # 引用计数和文件由 save_and_cache_excel 统一回收
+                if isinstance(e, IngestLimitError):
+                    raise HTTPException(status_code=413, detail=f"workbook exceeds ingest limits: {e}")
+                raise HTTPException(status_code=400, detail=f"invalid xlsx: {type(e).__name__}")
+
+        # 入库：file_uploads + 更新 session.current_upload_id（blob 引用前面已经拿过了）
+        rec = await ExcelService._create_upload_record(
+            db,
+            upload_id=upload_id,
+            session_id=session_id,
+            filename=filename,
+            stored_path=stored_path,
+            content_hash=content_hash,
+            size=size,
+            status=INGEST_READY,
+            progress=100,
+            profile=item["profile"],
+        )
+
+        # 缓存 DataFrame（不入库），按内容共享；_load_shared 已经放进缓存了
+        excel_cache.alias(upload_id, content_hash)
+
+        return rec, item["profile"]
+
+    @staticmethod
+    async def _load_item(stored_path: Path) -> dict[str, Any]:
+        """解析 / 读旁路文件拿到 df + profile + schema 目录 + 列聚合（都在解析执行器里算），组装成缓存条目。"""
+        loaded = await load_upload(stored_path, use_sidecar=get_settings().excel_sidecar)
+        df, profile, schema = loaded.df, loaded.profile, loaded.schema
+        profile["schema"] = schema.to_dict()
+        return {
+            "df": df,
+            "profile": profile,
+            "schema": schema,
+            # 列名匹配的倒排索引：planner 每个问题只用对候选列打分
+            "matcher": ColumnMatcher(list(df.columns)),
+            # 列聚合（sum/mean/min/max/分位数/distinct）入库时算好；describe 按列懒算
+            "stats": loaded.stats,
+            # filter 用的列索引：第一次有谓词用到哪列才建，条目被淘汰时一起没了
+            "indexes": IndexCatalog(),
+            # 从 .arrow 映射进来的列是各 worker 共享的页，不占本进程的缓存预算
+            "shared_bytes": shared_bytes(df),
         }
 
-        # 入库：file_uploads + 更新 session.current_upload_id
+    @staticmethod
+    async def _load_shared(cache_key: str, stored_path: Path) -> dict[str, Any]:
+        """
+        按 cache_key 做 single-flight：第一个未命中的请求真正去加载并写缓存，
+        同时到达的请求 await 同一个 task。用 shield 包一层，某个请求被取消不会连累别人。
+        """
+        task = _inflight_loads.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(ExcelService._load_into_cache(cache_key, stored_path))
+            _inflight_loads[cache_key] = task
+
+            def _done(t: asyncio.Task) -> None:
+                if _inflight_loads.get(cache_key) is t:
+                    _inflight_loads.pop(cache_key, None)
+                # 所有等待方都被取消时也要把异常取走，否则会打 "never retrieved" 警告
+                if not t.cancelled():
+                    t.exception()
+
+            task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def _load_into_cache(cache_key: str, stored_path: Path) -> dict[str, Any]:
+        item = await ExcelService._load_item(stored_path)
+        excel_cache[cache_key] = item
+        return item
+
+    @staticmethod
+    async def _create_upload_record(
+        db: AsyncSession,
+        *,
+        upload_id: str,
+        session_id: str,
+        filename: str,
+        stored_path: Path,
+        content_hash: str,
+        size: int,
+        status: str,
+        progress: int,
+        profile: Optional[dict[str, Any]] = None,
+    ) -> FileUpload:
         rec = FileUpload(
             id=upload_id,
             session_id=session_id,
             filename=filename,
             stored_path=str(stored_path),
+            content_hash=content_hash,
+            status=status,
+            progress=progress,
+            profile=profile,
         )
         db.add(rec)
+        sess = await db.get(Session, session_id)
         sess.current_upload_id = upload_id
         await db.commit()
         await db.refresh(rec)
+        return rec
 
-        # 缓存 DataFrame（不入库）
-        excel_cache[upload_id] = {"df": df, "profile": profile}
+    @staticmethod
+    async def _acquire_blob(db: AsyncSession, content_hash: str, stored_path: Path, size: int) -> bool:
+        """
+        blob 引用计数 +1（不存在就建），单独一个事务立刻提交；返回 True 表示这次新建的。
+        两个请求同时建同一个 blob 时，输的那个改成 +1。
+        """
+        res = await db.execute(
+            update(UploadBlob)
+            .where(UploadBlob.content_hash == content_hash)
+            .values(ref_count=UploadBlob.ref_count + 1)
+        )
+        if res.rowcount == 1:
+            await db.commit()
+            return False
+        db.add(UploadBlob(content_hash=content_hash, stored_path=str(stored_path), size_bytes=size, ref_count=1))
+        try:
+            await db.commit()
+            return True
+        except IntegrityError:
+            await db.rollback()
+            await db.execute(
+                update(UploadBlob)
+                .where(UploadBlob.content_hash == content_hash)
+                .values(ref_count=UploadBlob.ref_count + 1)
+            )
+            await db.commit()
+            return False
 
-        return rec, profile
+    @staticmethod
+    async def _release_blob(db: AsyncSession, content_hash: str, stored_path: Path) -> bool:
+        """
+        blob 引用计数 -1，降到 0 就删 blob 行和文件；返回 True 表示删了。不提交，由调用方提交。
+        文件在提交之前删：blob 行的锁还在，并发的 _acquire_blob 会等到这边提交，
+        之后它看到的是“新 blob”，会自己把文件落回去。
+        """
+        await db.execute(
+            update(UploadBlob)
+            .where(UploadBlob.content_hash == content_hash)
+            .values(ref_count=UploadBlob.ref_count - 1)
+        )
+        # 条件删除：并发上传刚把计数加回去的话这里删不到，文件也就不会被误删
+        res = await db.execute(
+            delete(UploadBlob).where(
+                UploadBlob.content_hash == content_hash,
+                UploadBlob.ref_count <= 0,
+            )
+        )
+        if res.rowcount != 1:
+            return False
+        ExcelService._remove_blob_files(stored_path)
+        return True
+
+    @staticmethod
+    def _remove_blob_files(stored_path: Path) -> None:
+        stored_path.unlink(missing_ok=True)
+        sidecar_path(stored_path).unlink(missing_ok=True)
+
+    @staticmethod
+    async def delete_upload(db: AsyncSession, upload_id: str) -> bool:
+        """
+        删除一条上传记录。共享 blob 的引用计数 -1，降到 0 才真正删文件 / 旁路缓存 / 内存缓存。
+        返回 False 表示 upload 不存在。
+        """
+        fu = await db.get(FileUpload, upload_id)
+        if fu is None:
+            return False
+
+        content_hash = fu.content_hash
+        stored_path = Path(fu.stored_path)
+
+        sess = await db.get(Session, fu.session_id)
+        if sess is not None and sess.current_upload_id == upload_id:
+            sess.current_upload_id = None
+        await db.delete(fu)
+        # autoflush 关着：先把 file_uploads 的删除刷下去，否则下面删 blob 会撞外键
+        await db.flush()
+
+        if content_hash is None:
+            # 老数据：没有 blob，文件是这条记录独占的
+            await db.commit()
+            excel_cache.unalias(upload_id)
+            excel_cache.pop(upload_id)
+            ExcelService._remove_blob_files(stored_path)
+            return True
+
+        removed = await ExcelService._release_blob(db, content_hash, stored_path)
+        await db.commit()
+
+        excel_cache.unalias(upload_id)
+        if removed:
+            excel_cache.pop(content_hash)
+        return True
+
+    # ----------------------------
+    # 异步解析任务（INGEST_MODE=async）
+    # ----------------------------
+    @staticmethod
+    def _start_ingest_job(upload_id: str, stored_path: Path, cache_key: str) -> asyncio.Task:
+        task = _ingest_jobs.get(upload_id)
+        if task is not None and not task.done():
+            return task
+        task = asyncio.create_task(ExcelService._run_ingest_job(upload_id, stored_path, cache_key))
+        _ingest_jobs[upload_id] = task
+
+        def _forget(t: asyncio.Task) -> None:
+            if _ingest_jobs.get(upload_id) is t:
+                _ingest_jobs.pop(upload_id, None)
+
+        task.add_done_callback(_forget)
+        return task
+
+    @staticmethod
+    async def _set_ingest_status(
+        upload_id: str,
+        status: str,
+        progress: int,
+        error: Optional[str] = None,
+        profile: Optional[dict[str, Any]] = None,
+    ) -> None:
+        # 后台任务不能复用请求里的 db session（请求早就结束了），自己开一个
+        SessionLocal = get_sessionmaker()
+        async with SessionLocal() as db:
+            fu = await db.get(FileUpload, upload_id)
+            if fu is None:
+                return
+            fu.status = status
+            fu.progress = progress
+            fu.error = error
+            if profile is not None:
+                fu.profile = profile
+            await db.commit()
+
+    @staticmethod
+    async def _run_ingest_job(upload_id: str, stored_path: Path, cache_key: str) -> None:
+        if cache_key not in excel_cache:
+            await ExcelService._set_ingest_status(upload_id, INGEST_PARSING, 10)
+            try:
+                item = await ExcelService._load_shared(cache_key, stored_path)
+            except Exception as e:
+                logger.warning("ingest failed for %s: %s", upload_id, e)
+                if isinstance(e, IngestLimitError):
+                    error = f"workbook exceeds ingest limits: {e}"
+                else:
+                    error = f"invalid xlsx: {type(e).__name__}"
+                await ExcelService._set_ingest_status(upload_id, INGEST_FAILED, 100, error=error)
+                return
+        else:
+            item = excel_cache.get(cache_key) or {}
+
+        excel_cache.alias(upload_id, cache_key)
+        await ExcelService._set_ingest_status(upload_id, INGEST_READY, 100, profile=item.get("profile"))
+
+    @staticmethod
+    async def wait_until_ready(db: AsyncSession, upload_id: str, timeout_s: float) -> Optional[FileUpload]:
+        """
+        等 upload 解析完（或失败）；超时就原样返回当前记录，由调用方决定怎么报错。
+        本进程里没有对应任务（比如 worker 重启、任务在别的 worker 上）就在本地补跑一个，
+        解析是幂等的，最坏情况只是多解析一次。
+        """
+        fu = await db.get(FileUpload, upload_id)
+        if fu is None or fu.status in (INGEST_READY, INGEST_FAILED):
+            return fu
+
+        task = ExcelService._start_ingest_job(upload_id, Path(fu.stored_path), fu.content_hash or fu.id)
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=timeout_s)
+        except asyncio.TimeoutError:
+            pass
+
+        # 先结束当前事务（MySQL 默认 REPEATABLE READ，不结束就一直读到旧快照）
+        await db.commit()
+        await db.refresh(fu)
+        return fu
 
     @staticmethod
     def get_profile(upload_id: str) -> Optional[dict[str, Any]]:
@@ -120,6 +471,23 @@ class ExcelService:
             return None
         return item.get("profile")
 
+    @staticmethod
+    async def load_profile(db: AsyncSession, fu: FileUpload) -> Optional[dict[str, Any]]:
+        """
+        元数据路径用：优先读 file_uploads.profile（一次主键查询，不碰 DataFrame）。
+        老数据没落过 profile 才回填缓存，顺手把 profile 补进库里，下次就不用再解析。
+        """
+        if fu.profile is not None:
+            return fu.profile
+        if fu.status != INGEST_READY:
+            return None
+        item = await ExcelService.ensure_cached(db, fu.id)
+        if item is None:
+            return None
+        fu.profile = item["profile"]
+        await db.commit()
+        return fu.profile
+
     @staticmethod
     def get_df(upload_id: str):
         item = excel_cache.get(upload_id)
@@ -129,7 +497,7 @@ class ExcelService:
 
     @staticmethod
     async def ensure_cached(db: AsyncSession, upload_id: str) -> dict[str, Any] | None:
-        """保证 excel_cache 里有该 upload_id 的 df/profile；没有就从 stored_path 回填。"""
+        """保证 excel_cache 里有该 upload_id（按内容共享）的 df/profile；没有就从 stored_path 回填。"""
         item = excel_cache.get(upload_id)
         if item and item.get("df") is not None and item.get("profile") is not None:
             return item
@@ -138,20 +506,17 @@ class ExcelService:
         if fu is None:
             return None
 
+        # 老数据没有 content_hash，就按 upload_id 自己缓存
+        cache_key = fu.content_hash or fu.id
+        excel_cache.alias(upload_id, cache_key)
+        if cache_key != upload_id:
+            item = excel_cache.get(cache_key)
+            if item and item.get("df") is not None and item.get("profile") is not None:
+                return item
+
         stored_path = Path(fu.stored_path)
         if not stored_path.exists():
             return None
 
-        df = pd.read_excel(stored_path)
-
-        profile = {
-            "rows": int(df.shape[0]),
-            "cols": int(df.shape[1]),
-            "columns": [str(c) for c in df.columns.tolist()],
-            "dtypes": {str(k): str(v) for k, v in df.dtypes.items()},
-            "missing_rate": {str(k): float(v) for k, v in df.isna().mean().items()},
-            "preview": df.head(10).fillna("").astype(str).to_dict(orient="records"),
-        }
-
-        excel_cache[upload_id] = {"df": df, "profile": profile}
-        return excel_cache[upload_id]
\ No newline at end of file
+        # 并发的 cache miss（比如 worker 刚重启）共用一次加载
+        return await ExcelService._load_shared(cache_key, stored_path)
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+每个 upload 一份的列索引，给 filter 工具用；和 df 一起放在缓存条目里，条目被淘汰索引也跟着没了。
+
+两种索引，都是第一次有谓词用到这一列时才建：
+- SortedIndex（数值 / 时间列）：非空值按键稳定排序后的行号；范围谓词 = 两次二分，等值 = 上下界相同的范围
+- HashIndex（其它列）：按 str(v) 分组的行号（factorize 之后按编码排好），等值 / IN = 查几个桶
+
+查出来的行号都会重新排成升序，所以 df.iloc[行号] 和布尔掩码过滤的结果逐行一致。
+索引对应原始 df 的行；派生表（groupby 之后之类）不用索引，由工具自己扫。
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class SortedIndex:
+    # 非空行按键排好序的行号，和对应的键
+    order: np.ndarray
+    keys: np.ndarray
+
+    @classmethod
+    def build(cls, keys: np.ndarray, valid: np.ndarray) -> "SortedIndex":
+        pos = np.flatnonzero(valid)
+        vals = keys[pos]
+        o = np.argsort(vals, kind="stable")
+        return cls(order=pos[o], keys=vals[o])
+
+    def range(
+        self,
+        lo: Any = None,
+        hi: Any = None,
+        lo_inclusive: bool = True,
+        hi_inclusive: bool = True,
+    ) -> np.ndarray:
+        """lo / hi 为 None 表示不设界；返回命中的行号（未排序）。"""
+        start = 0 if lo is None else int(np.searchsorted(self.keys, lo, side="left" if lo_inclusive else "right"))
+        stop = len(self.keys) if hi is None else int(np.searchsorted(self.keys, hi, side="right" if hi_inclusive else "left"))
+        return self.order[start:max(start, stop)]
+
+    def memory_bytes(self) -> int:
+        return int(self.order.nbytes + self.keys.nbytes)
+
+
+@dataclass
+class HashIndex:
+    # 不同取值（str 形式）；第 i 个取值的行号是 positions[offsets[i]:offsets[i + 1]]
+    uniques: pd.Index
+    offsets: np.ndarray
+    positions: np.ndarray
+
+    @classmethod
+    def build(cls, labels: np.ndarray) -> "HashIndex":
+        """labels: object 数组，str 或 None（缺失）。"""
+        codes, uniques = pd.factorize(labels)
+        pos = np.flatnonzero(codes >= 0)
+        o = np.argsort(codes[pos], kind="stable")
+        counts = np.bincount(codes[pos], minlength=len(uniques))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(uniques=pd.Index(uniques), offsets=offsets, positions=pos[o])
+
+    def lookup(self, values: list[str]) -> np.ndarray:
+        idx = self.uniques.get_indexer(pd.Index(list(dict.fromkeys(values)), dtype=object))
+        parts = [self.positions[self.offsets[i]:self.offsets[i + 1]] for i in idx if i >= 0]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def values(self) -> list[str]:
+        return self.uniques.tolist()
+
+    def memory_bytes(self) -> int:
+        return int(self.uniques.memory_usage(deep=True) + self.offsets.nbytes + self.positions.nbytes)
+
+
+ColumnIndex = Union[SortedIndex, HashIndex]
+
+
+class IndexCatalog:
+    """列名 -> 索引。工具在线程池里跑，多个请求可能同时建同一列，用锁保护（和 StatsCatalog 一样）。"""
+
+    def __init__(self) -> None:
+        self._indexes: dict[tuple[str, str], ColumnIndex] = {}
+        self._lock = threading.Lock()
+        # 每建一个索引 +1：调用方据此判断要不要让缓存重新估算条目大小
+        self.version = 0
+
+    def get(self, kind: str, name: str, build: Callable[[], ColumnIndex]) -> ColumnIndex:
+        key = (kind, name)
+        with self._lock:
+            hit = self._indexes.get(key)
+        if hit is not None:
+            return hit
+        # 锁外建：不同列可以并行；同一列偶尔建两遍也无所谓
+        index = build()
+        with self._lock:
+            if key not in self._indexes:
+                self._indexes[key] = index
+                self.version += 1
+            return self._indexes[key]
+
+    def peek(self, kind: str, name: str) -> Optional[ColumnIndex]:
+        with self._lock:
+            return self._indexes.get((kind, name))
+
+    def indexed_columns(self) -> list[tuple[str, str]]:
+        with self._lock:
+            return list(self._indexes)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(ix.memory_bytes() for ix in self._indexes.values())
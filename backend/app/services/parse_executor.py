@@ -0,0 +1,180 @@
+"""
+xlsx 解析 / profile 计算的执行器。
+
+pd.read_excel 是纯 CPU 活，直接在 async handler 里跑会把同一个 uvicorn worker
+上的其它请求全部卡住，所以统一丢到这里：
+- process（默认）：进程池，spawn 启动（Windows 也一样），DataFrame 走 .arrow 旁路文件
+  或 Arrow IPC 字节带回来
+- thread：线程池，适合调试 / 单测
+- inline：直接在事件循环里跑（等价于老行为）
+
+schema 推断 + 列聚合（analyze_frame）也在这里跑：解析时在同一个 worker 里顺带算，
+从旁路文件回填时由 worker 自己 memory_map 旁路文件来算，结果（影子列 + 聚合）pickle 带回。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+from app.core.config import get_settings
+from app.services.excel_ingest import (
+    IngestLimits,
+    ParsedUpload,
+    analyze_frame,
+    build_profile,
+    materialize,
+    optimize_dtypes,
+    parse_upload,
+)
+from app.services.schema_catalog import SchemaCatalog
+from app.services.sidecar import read_sidecar, read_sidecar_meta
+from app.services.stats_catalog import StatsCatalog
+
+_lock = threading.Lock()
+_executor: Optional[Executor] = None
+_executor_key: Optional[tuple[str, int]] = None
+
+
+def _executor_for(kind: str, workers: int) -> Optional[Executor]:
+    global _executor, _executor_key
+    if kind == "inline":
+        return None
+
+    with _lock:
+        if _executor is not None and _executor_key == (kind, workers):
+            return _executor
+        # 配置变了（测试里常见）：旧的关掉重建
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+
+        if kind == "process":
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        elif kind == "thread":
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="excel-parse")
+        else:
+            raise ValueError(f"unknown PARSE_EXECUTOR: {kind}")
+        _executor_key = (kind, workers)
+        return _executor
+
+
+def shutdown_parse_executor() -> None:
+    global _executor, _executor_key
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        _executor_key = None
+
+
+def ingest_limits() -> IngestLimits:
+    # 子进程不读 Settings：上限在这里取好，随任务一起传过去
+    settings = get_settings()
+    return IngestLimits(
+        max_rows=settings.max_ingest_rows or None,
+        max_cells=settings.max_ingest_cells or None,
+        max_unzipped_bytes=(settings.max_ingest_unzipped_mb or 0) * 1024 * 1024 or None,
+    )
+
+
+async def _run_in_executor(fn: Callable[..., Any], *args: Any) -> Any:
+    """按 PARSE_EXECUTOR 跑一个模块级函数（进程池要能 pickle）；inline 直接调用。"""
+    settings = get_settings()
+    executor = _executor_for(settings.parse_executor.lower(), max(1, int(settings.parse_workers)))
+    if executor is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+async def parse_in_executor(stored_path: Path, *, use_sidecar: bool, analyze: bool = False) -> ParsedUpload:
+    settings = get_settings()
+    in_process = settings.parse_executor.lower() != "process"
+    return await _run_in_executor(
+        _call_parse_upload,
+        str(stored_path),
+        use_sidecar,
+        in_process,
+        ingest_limits(),
+        settings.optimize_dtypes,
+        analyze,
+    )
+
+
+def _call_parse_upload(
+    stored_path: str,
+    use_sidecar: bool,
+    in_process: bool,
+    limits: IngestLimits,
+    optimize: bool,
+    analyze: bool = False,
+) -> ParsedUpload:
+    # run_in_executor 不支持 kwargs；模块级函数才能被进程池 pickle
+    return parse_upload(
+        stored_path, use_sidecar=use_sidecar, in_process=in_process, limits=limits, optimize=optimize, analyze=analyze
+    )
+
+
+def _load_from_sidecar(stored_path: Path, optimize: bool) -> Optional[tuple[pd.DataFrame, dict[str, Any]]]:
+    df = read_sidecar(stored_path)
+    if df is None:
+        return None
+
+    report = None
+    raw = read_sidecar_meta(stored_path).get("dtype_report")
+    if raw:
+        report = json.loads(raw)
+    elif optimize:
+        # 旁路文件是没开优化时写的：现在补做一次（报告只反映这一次的节省）
+        df, report = optimize_dtypes(df)
+    return df, build_profile(df, report)
+
+
+def _analyze_sidecar(stored_path: str, optimize: bool) -> Optional[tuple[SchemaCatalog, dict[str, Any]]]:
+    # 进程池里跑：自己映射旁路文件（和父进程读到的是同一份内容），不用把 df 传过来
+    loaded = _load_from_sidecar(Path(stored_path), optimize)
+    return None if loaded is None else analyze_frame(loaded[0])
+
+
+@dataclass
+class LoadedUpload:
+    df: pd.DataFrame
+    profile: dict[str, Any]
+    schema: SchemaCatalog
+    stats: StatsCatalog
+
+
+async def load_upload(stored_path: Path, *, use_sidecar: bool) -> LoadedUpload:
+    """
+    回填缓存用：优先 memory_map 读 .arrow 旁路文件（放线程里，不占事件循环），
+    没有才把 xlsx 丢给解析执行器。schema 目录 / 列聚合都在执行器里算好带回来。
+    """
+    settings = get_settings()
+    if use_sidecar:
+        loaded = await asyncio.to_thread(_load_from_sidecar, stored_path, settings.optimize_dtypes)
+        if loaded is not None:
+            df, profile = loaded
+            analyzed = None
+            if settings.parse_executor.lower() == "process":
+                analyzed = await _run_in_executor(_analyze_sidecar, str(stored_path), settings.optimize_dtypes)
+            if analyzed is None:
+                # 线程池 / inline：直接用手上这份 df；进程池那边旁路文件刚好没了也走这里
+                analyzed = await _run_in_executor(analyze_frame, df)
+            schema, aggregates = analyzed
+            return LoadedUpload(df=df, profile=profile, schema=schema, stats=StatsCatalog(aggregates))
+
+    parsed = await parse_in_executor(stored_path, use_sidecar=use_sidecar, analyze=True)
+    df = await asyncio.to_thread(materialize, parsed, stored_path)
+    return LoadedUpload(
+        df=df, profile=parsed.profile, schema=parsed.schema, stats=StatsCatalog(parsed.aggregates)
+    )
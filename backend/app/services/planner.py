@@ -1,12 +1,16 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Optional
 
 import pandas as pd
 import re
 from difflib import SequenceMatcher
 
+from app.services.artifacts import encode_labels
+from app.services.index_catalog import IndexCatalog
+from app.services.schema_catalog import KIND_CATEGORICAL, NUMERIC_MIN_RATIO, SchemaCatalog, clean_numeric
+
 
 @dataclass
 class ToolCall:
@@ -75,11 +79,80 @@ def _score_column(question: str, col: str) -> float:
     return inter * 5.0 + jaccard * 50.0 + seq * 30.0
 
 
-def _match_cols(question: str, columns: list[str], top_k: int = 3) -> list[str]:
+MATCH_MIN_SCORE = 8.0
+
+
+class ColumnMatcher:
+    """
+    每个 upload 建一次的列名匹配索引，打分和 _score_column 完全一致，只是省掉重复劳动：
+    - 列名的归一化结果和 n-gram 预先算好，n-gram 建倒排索引（gram -> 列下标）
+    - 问题每次只归一化一遍；和问题有公共 n-gram 的列才完整打分
+    - 没有公共 n-gram 的列 inter = jaccard = 0，分数只剩 seq * 30：
+      先用 SequenceMatcher 的 real_quick_ratio / quick_ratio 上界筛掉不可能过阈值的，
+      过了上界的才真算 ratio()，所以结果和逐列打分一模一样
+    """
+
+    def __init__(self, columns: list[str]) -> None:
+        self.columns = [str(c) for c in columns]
+        self._norm = [_normalize_text(c) for c in self.columns]
+        self._grams = [_ngrams(cn) for cn in self._norm]
+        self._index: dict[str, list[int]] = {}
+        for i, grams in enumerate(self._grams):
+            for g in grams:
+                self._index.setdefault(g, []).append(i)
+
+    def scores(self, question: str, min_score: float = MATCH_MIN_SCORE) -> list[float]:
+        """每列的分数；低于 min_score 且没算精确值的列记 0.0（反正不会被选中）。"""
+        qn = _normalize_text(question)
+        qg = _ngrams(qn)
+
+        inter_counts: dict[int, int] = {}
+        for g in qg:
+            for i in self._index.get(g, ()):
+                inter_counts[i] = inter_counts.get(i, 0) + 1
+
+        seq_floor = min_score / 30.0
+        out: list[float] = []
+        for i, cn in enumerate(self._norm):
+            if not cn:
+                out.append(0.0)
+                continue
+            if cn in qn:
+                out.append(1000.0 + len(cn))
+                continue
+
+            inter = inter_counts.get(i, 0)
+            sm = SequenceMatcher(None, qn, cn)
+            if inter == 0 and (sm.real_quick_ratio() < seq_floor or sm.quick_ratio() < seq_floor):
+                out.append(0.0)
+                continue
+
+            union = max(1, len(qg | self._grams[i]))
+            jaccard = inter / union
+            seq = sm.ratio()
+            out.append(inter * 5.0 + jaccard * 50.0 + seq * 30.0)
+        return out
+
+    def match(self, question: str, top_k: int = 3) -> list[str]:
+        scored = list(zip(self.columns, self.scores(question)))
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return [c for c, s in scored if s >= MATCH_MIN_SCORE][:top_k]
+
+
+def _match_cols(
+    question: str,
+    columns: list[str],
+    top_k: int = 3,
+    matcher: Optional[ColumnMatcher] = None,
+) -> list[str]:
+    # 有按 upload 建好的索引就用索引（结果相同，只是快）
+    if matcher is not None and matcher.columns == [str(c) for c in columns]:
+        return matcher.match(question, top_k=top_k)
+
     scored = [(c, _score_column(question, c)) for c in columns]
     scored.sort(key=lambda x: x[1], reverse=True)
 
-    picked = [c for c, s in scored if s >= 8.0][:top_k]
+    picked = [c for c, s in scored if s >= MATCH_MIN_SCORE][:top_k]
     return picked
 
 
@@ -91,13 +164,17 @@ def _pick_time_col(columns: list[str]) -> str | None:
     return None
 
 
-def _numeric_cols(df: pd.DataFrame) -> list[str]:
+def _numeric_cols(df: pd.DataFrame, schema: Optional[SchemaCatalog] = None) -> list[str]:
     """
     识别“可用于数值计算”的列：
     - 原生 numeric dtype 直接算
     - object/string：尝试 to_numeric（支持百分号、逗号），只要至少有 1 个可转数值且占比不太离谱就算
       （这样 2 行里 1 个缺失也仍然算数值列）
+    有入库时的 schema 目录就直接查表，规则一样，不再逐列清洗。
     """
+    if schema is not None:
+        return schema.numeric_cols()
+
     out: list[str] = []
     n = len(df)
 
@@ -111,14 +188,7 @@ def _numeric_cols(df: pd.DataFrame) -> list[str]:
         s0 = df[c]
 
         # 处理 "95%"、"1,234"、空格等常见情况
-        s_clean = (
-            s0.astype(str)
-            .str.replace(r"[%％]", "", regex=True)
-            .str.replace(",", "", regex=False)
-            .str.strip()
-        )
-
-        s = pd.to_numeric(s_clean, errors="coerce")
+        s = clean_numeric(s0)
         non_na = int(s.notna().sum())
         if non_na == 0:
             continue
@@ -127,7 +197,7 @@ def _numeric_cols(df: pd.DataFrame) -> list[str]:
 
         # ✅ 阈值放宽：允许小样本缺失（2 行有 1 个缺失 => 0.5 通过）
         # 经验：>= 0.2 就够用；同时要求至少 1 个可转数值
-        if ratio >= 0.2:
+        if ratio >= NUMERIC_MIN_RATIO:
             out.append(str(c))
 
     return out
@@ -144,14 +214,210 @@ def _mentioned_cols(df: pd.DataFrame, q: str) -> list[str]:
     return hit
 
 
-def plan_tools(df: pd.DataFrame, question: str) -> list[ToolCall]:
+# 分组统计：问题里的词 -> groupby_agg 的聚合
+_GROUP_WORDS = ["按", "每个", "每一", "各个", "分组", "group by", " by ", " per "]
+_AGG_WORDS = [
+    ("mean", ["平均", "均值", "mean", "avg"]),
+    ("max", ["最大", "最高", "max"]),
+    ("min", ["最小", "最低", "min"]),
+    ("count", ["数量", "个数", "次数", "count"]),
+    ("sum", ["总和", "合计", "总计", "sum", "total"]),
+]
+
+
+# 极值 / 排名：“最高”“前 5”“top3” -> top_k
+_TOP_WORDS = ["最高", "最大", "最多", "max", "top", "前"]
+_BOTTOM_WORDS = ["最低", "最小", "最少", "min"]
+# 要的是“哪一行”而不只是极值本身：“最高的是谁”“哪个地区最低”“排名”
+_ROW_WORDS = ["谁", "哪", "名", "行", "记录", "who", "which"]
+_CN_DIGITS = {"一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9, "十": 10}
+TOP_K_MAX = 100
+
+
+def _pick_top_k(q: str) -> Optional[tuple[int, bool]]:
+    """返回 (k, ascending)；问题里没有极值 / 排名的意思就返回 None。"""
+    m = re.search(r"(?:前|top)\s*(\d+|[一二两三四五六七八九十])", q)
+    k = None
+    if m:
+        g = m.group(1)
+        k = int(g) if g.isdigit() else _CN_DIGITS[g]
+    ascending = any(w in q for w in _BOTTOM_WORDS)
+    if k is None:
+        if not ascending and not any(w in q for w in _TOP_WORDS if w not in ("前", "top")):
+            return None
+        k = 1
+    return min(max(k, 1), TOP_K_MAX), ascending
+
+
+def _pick_aggs(q: str) -> list[str]:
+    aggs = [name for name, words in _AGG_WORDS if any(w in q for w in words)]
+    return aggs or ["sum"]
+
+
+def _describe_call(cols: list[str]) -> ToolCall:
+    # 有命中的列就只 describe 这几列（统计目录按列缓存，列少也省输出长度）
+    return ToolCall("describe", {"cols": cols} if cols else {})
+
+
+# 过滤条件：“分数大于80” / “80分以上” / “只看三班”
+# 长的词放前面（“大于等于”要先于“大于”，“不超过”要先于“超过”）
+_CMP_WORDS = [
+    ("大于等于", "ge"), ("不少于", "ge"), ("不低于", "ge"), ("至少", "ge"), (">=", "ge"), ("≥", "ge"),
+    ("小于等于", "le"), ("不超过", "le"), ("不高于", "le"), ("不多于", "le"), ("至多", "le"), ("<=", "le"), ("≤", "le"),
+    ("大于", "gt"), ("超过", "gt"), ("高于", "gt"), ("多于", "gt"), (">", "gt"),
+    ("小于", "lt"), ("低于", "lt"), ("少于", "lt"), ("<", "lt"),
+]
+_CMP_OPS = dict(_CMP_WORDS)
+_NUM = r"(-?\d{1,3}(?:,\d{3})+(?:\.\d+)?|-?\d+(?:\.\d+)?)"
+_CMP_RE = re.compile("(" + "|".join(re.escape(w) for w, _ in _CMP_WORDS) + r")\s*" + _NUM)
+_CMP_POSTFIX_RE = re.compile(_NUM + r"\s*[^\d\s]{0,2}?(以上|以下)")
+# 取值太多的分类列不拿来逐个比对问题文本
+FILTER_VALUES_MAX = 5000
+# 分类取值要么紧跟在这些词后面（“只看三班”“状态是完成的”），要么在问题里是个完整的词
+_VALUE_CUES = ["只看", "只要", "只算", "仅看", "仅", "只", "等于", "属于", "是", "为"]
+# 完整的词：两边是开头 / 结尾、标点空白（列名去掉之后也是空格）、“的”“按”和并列连词，或者紧挨着另一个取值
+_VALUE_SEPS = set(" \t，,。.、；;：:？?！!（）()“”\"'的和或与及跟里中按")
+
+
+def _number(text: str) -> int | float:
+    v = float(text.replace(",", ""))
+    return int(v) if v.is_integer() else v
+
+
+def _col_before(q: str, cols: list[str], pos: int) -> Optional[str]:
+    """pos 之前最近提到的列（同一位置取更长的列名）。"""
+    best, best_pos = None, -1
+    for c in cols:
+        i = q.rfind(c.lower(), 0, pos)
+        if i >= 0 and (i + len(c) > best_pos or (i + len(c) == best_pos and len(c) > len(best or ""))):
+            best, best_pos = c, i + len(c)
+    return best
+
+
+def _range_filters(q: str, num_cols: list[str]) -> list[dict[str, Any]]:
+    out = []
+    for m in _CMP_RE.finditer(q):
+        col = _col_before(q, num_cols, m.start())
+        if col is not None:
+            out.append({"col": col, "op": _CMP_OPS[m.group(1)], "value": _number(m.group(2))})
+    for m in _CMP_POSTFIX_RE.finditer(q):
+        col = _col_before(q, num_cols, m.start())
+        if col is not None:
+            out.append({"col": col, "op": "ge" if m.group(2) == "以上" else "le", "value": _number(m.group(1))})
+    return out
+
+
+def _column_values(df: pd.DataFrame, col: str, indexes: Optional[IndexCatalog]) -> list[str]:
+    # filter 已经给这列建过哈希索引就直接拿它的取值；没建过只取去重后的值（按 str(v)，和索引一致），
+    # 不在这里建索引——真正命中了取值的列，由 filter 工具执行时再建
+    ix = indexes.peek("hash", col) if indexes is not None else None
+    if ix is not None:
+        values = ix.values()
+    else:
+        labels = encode_labels(pd.Series(df[col].unique()))
+        values = list(dict.fromkeys(v for v in labels if v is not None))
+    return values if len(values) <= FILTER_VALUES_MAX else []
+
+
+def _value_is_predicate(text: str, value: str, spans: list[tuple[int, int]]) -> bool:
+    starts = {a for a, _ in spans}
+    ends = {b for _, b in spans}
+    for m in re.finditer(re.escape(value), text):
+        i, j = m.start(), m.end()
+        if any(text[:i].rstrip().endswith(w) for w in _VALUE_CUES):
+            return True
+        left = i == 0 or text[i - 1] in _VALUE_SEPS or i in ends
+        right = j == len(text) or text[j] in _VALUE_SEPS or j in starts
+        if left and right:
+            return True
+    return False
+
+
+def _value_filters(
+    df: pd.DataFrame,
+    question: str,
+    schema: Optional[SchemaCatalog],
+    indexes: Optional[IndexCatalog],
+) -> list[dict[str, Any]]:
+    # 只看分类列（要靠 schema 目录判断）；问题里提到的列名先去掉，免得取值恰好是列名的一部分
+    if schema is None:
+        return []
+    cols = [str(c) for c in df.columns]
+    text = question
+    for c in sorted(cols, key=len, reverse=True):
+        text = text.replace(c, " ")
+
+    hits: list[tuple[str, str]] = []
+    for c in cols:
+        if schema.kind(c) != KIND_CATEGORICAL:
+            continue
+        hits.extend((c, v) for v in _column_values(df, c, indexes) if len(v) >= 2 and v in text)
+    # “十三班”命中时“三班”也在文本里：只留最长的
+    hits = [(c, v) for c, v in hits if not any(v != w and v in w for _, w in hits)]
+    # 光是子串不算（“完成率最高”里的“完成”、“完成情况”不是在筛状态）：要有提示词或者是完整的词
+    spans = [(m.start(), m.end()) for _, v in hits for m in re.finditer(re.escape(v), text)]
+    hits = [(c, v) for c, v in hits if _value_is_predicate(text, v, spans)]
+
+    by_col: dict[str, list[str]] = {}
+    for c, v in hits:
+        by_col.setdefault(c, []).append(v)
+    return [
+        {"col": c, "op": "eq", "value": vs[0]} if len(vs) == 1 else {"col": c, "op": "in", "value": vs}
+        for c, vs in by_col.items()
+    ]
+
+
+def plan_tools(
+    df: pd.DataFrame,
+    question: str,
+    schema: Optional[SchemaCatalog] = None,
+    matcher: Optional[ColumnMatcher] = None,
+    indexes: Optional[IndexCatalog] = None,
+) -> list[ToolCall]:
+    """
+    问题里带过滤条件时先 filter 再按原来的规则规划（后面的步骤都作用在过滤后的行上）；
+    indexes 是 upload 级的列索引：已经建好的哈希索引直接拿来取分类列的取值，规划本身不建索引。
+    """
+    plan = _plan_rules(df, question, schema, matcher)
+    where = _range_filters(_lower(question), _numeric_cols(df, schema)) + _value_filters(df, question, schema, indexes)
+    if not where:
+        return plan
+    if [c.name for c in plan] == ["profile", "describe"]:
+        # 默认计划只有画像 + 描述统计：过滤之后把命中的行也列出来（总和之类的计划不用）
+        plan = [*plan, ToolCall("head", {"n": 20})]
+    return [ToolCall("filter", {"where": where}), *plan]
+
+
+def _plan_rules(
+    df: pd.DataFrame,
+    question: str,
+    schema: Optional[SchemaCatalog] = None,
+    matcher: Optional[ColumnMatcher] = None,
+) -> list[ToolCall]:
     cols = [str(c) for c in df.columns.tolist()]
     q = _lower(question)
 
-    matched = _match_cols(question, cols)
-    num_cols = _numeric_cols(df)
+    matched = _match_cols(question, cols, matcher=matcher)
+    num_cols = _numeric_cols(df, schema)
     matched_numeric = [c for c in matched if c in num_cols]
 
+    # ---------------------------------------------------------
+    # 规则 G：按某个非数值列分组统计（“每个地区的平均销售额”）
+    # 趋势问题交给规则 1（分组之后还要排序 + 画图）
+    # ---------------------------------------------------------
+    if any(k in q for k in _GROUP_WORDS) and not any(k in q for k in ["趋势", "走势", "trend"]):
+        keys = [c for c in matched if c not in num_cols][:1]
+        if keys:
+            aggs = _pick_aggs(q)
+            values = [c for c in matched_numeric if c not in keys]
+            if not values and aggs == ["count"]:
+                values = keys
+            if values:
+                return [
+                    ToolCall("groupby_agg", {"group_by": keys[0], "value_cols": values, "aggs": aggs}),
+                    ToolCall("head", {"n": 20}),
+                ]
+
     # ---------------------------------------------------------
     # ✅ 规则 0：总和 / 合计 / sum / total
     # 放在最前面，避免被趋势/describe 吃掉
@@ -187,7 +453,7 @@ def plan_tools(df: pd.DataFrame, question: str) -> list[ToolCall]:
 
         if t and values:
             return [
-                ToolCall("groupby_sum", {"group_col": t, "value_cols": values}),
+                ToolCall("groupby_agg", {"group_by": t, "value_cols": values, "aggs": ["sum"]}),
                 ToolCall("sort_time", {"by": t}),
                 ToolCall("chart_line", {"x_col": t, "y_cols": values, "max_points": 200}),
                 ToolCall("head", {"n": 20}),
@@ -203,10 +469,25 @@ def plan_tools(df: pd.DataFrame, question: str) -> list[ToolCall]:
         return [ToolCall("describe", {})]
 
     # ---------------------------------------------------------
-    # 规则 2：最大/最小/均值 ——先 describe
+    # 规则 2：最高 / 最低 / 前 N ——有数值列就直接取 top-k 行（整行带出来，谁最高一眼可见）
+    # 只问极值本身（“销售额最大是多少”）：column_stats 读入库时算好的 max / min，不用排序
+    # ---------------------------------------------------------
+    top = _pick_top_k(q)
+    if top is not None and matched_numeric:
+        k, ascending = top
+        ranked = k > 1 or re.search(r"前|top", q) or any(w in q for w in _ROW_WORDS)
+        if not ranked:
+            return [ToolCall("column_stats", {"cols": matched_numeric, "stats": ["min" if ascending else "max"]})]
+        return [ToolCall("top_k", {"by": matched_numeric[0], "k": k, "ascending": ascending})]
+
+    # ---------------------------------------------------------
+    # 规则 3：均值 / 没找到数值列的极值
+    # 命中了数值列：column_stats 直接读入库时算好的列聚合；否则先 describe
     # ---------------------------------------------------------
     if any(k in q for k in ["最大", "最小", "均值", "平均", "max", "min", "mean", "avg"]):
-        return [ToolCall("describe", {})]
+        if matched_numeric:
+            return [ToolCall("column_stats", {"cols": matched_numeric})]
+        return [_describe_call(matched)]
 
-    # 默认：profile + describe
-    return [ToolCall("profile", {}), ToolCall("describe", {})]
+    # 默认：profile + describe（问题里提到了哪些列就只看这些列）
+    return [ToolCall("profile", {}), _describe_call(matched)]
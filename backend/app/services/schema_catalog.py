@@ -0,0 +1,278 @@
+"""
+上传时一次性做的列类型推断（schema 目录）。
+
+每列归成一类：numeric / percent / thousands / datetime / month / boolean / categorical / text / empty，
+同时把“能当数值用”的字符串列清洗成 float 影子列、时间列算好排序键，跟原始 df 一起放进缓存。
+planner 和工具直接查目录，不用每个问题都 astype(str) + 正则 + to_numeric 再来一遍。
+
+判定规则和原来 planner._numeric_cols / tool_sort_time 的逐请求逻辑保持一致，
+所以有没有目录，选出来的列、排出来的顺序都一样。
+"""
+
+from __future__ import annotations
+
+import re
+import warnings
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+KIND_NUMERIC = "numeric"
+KIND_PERCENT = "percent"
+KIND_THOUSANDS = "thousands"
+KIND_DATETIME = "datetime"
+KIND_MONTH = "month"
+KIND_BOOLEAN = "boolean"
+KIND_CATEGORICAL = "categorical"
+KIND_TEXT = "text"
+KIND_EMPTY = "empty"
+
+# 可转数值的占比 >= 这个值就算数值列（2 行里 1 个缺失也算）
+NUMERIC_MIN_RATIO = 0.2
+# 能解析成时间 / 月份的占比 > 这个值才按时间排序
+TIME_MIN_RATIO = 0.6
+# 去重后取值个数 <= 非空行数 * 这个比例就算分类列
+CATEGORICAL_MAX_RATIO = 0.5
+
+_MONTHS = {
+    "jan": 1, "january": 1,
+    "feb": 2, "february": 2,
+    "mar": 3, "march": 3,
+    "apr": 4, "april": 4,
+    "may": 5,
+    "jun": 6, "june": 6,
+    "jul": 7, "july": 7,
+    "aug": 8, "august": 8,
+    "sep": 9, "sept": 9, "september": 9,
+    "oct": 10, "october": 10,
+    "nov": 11, "november": 11,
+    "dec": 12, "december": 12,
+}
+
+
+def month_to_num(val: Any) -> Optional[int]:
+    s = str(val).strip().lower()
+    if s in _MONTHS:
+        return _MONTHS[s]
+    mm = re.match(r"^(\d{1,2})\s*月$", s)
+    if mm:
+        n = int(mm.group(1))
+        if 1 <= n <= 12:
+            return n
+    if s.isdigit():
+        n = int(s)
+        if 1 <= n <= 12:
+            return n
+    return None
+
+
+def clean_numeric(s: pd.Series) -> pd.Series:
+    """处理 "95%"、"1,234"、空格等常见写法；转不了的是 NaN。"""
+    s_clean = (
+        s.astype(str)
+        .str.replace(r"[%％]", "", regex=True)
+        .str.replace(",", "", regex=False)
+        .str.strip()
+    )
+    return pd.to_numeric(s_clean, errors="coerce")
+
+
+def _datetime_format(values: pd.Series) -> Optional[str]:
+    # 和 pandas 自己推断格式的做法一样：看第一个非空字符串；显式传进去就不用每次再猜
+    first = values.dropna()
+    if first.empty or not isinstance(first.iloc[0], str):
+        return None
+    return guess_datetime_format(first.iloc[0])
+
+
+def _parse_datetime(values: pd.Series) -> pd.Series:
+    fmt = _datetime_format(values)
+    if fmt is not None:
+        return pd.to_datetime(values, format=fmt, errors="coerce")
+    with warnings.catch_warnings():
+        # 格式推断不出来时 pandas 会逐个走 dateutil 并警告，这里就是在试探，不需要提示
+        warnings.simplefilter("ignore", UserWarning)
+        return pd.to_datetime(values, errors="coerce")
+
+
+def month_series_to_num(values: pd.Series) -> pd.Series:
+    """month_to_num 的向量化版本：英文月份查表，“N月” / 纯数字用 str 方法解析；解析不了是 NaN。"""
+    s = values.astype(str).str.strip().str.lower()
+    by_name = s.map(_MONTHS).astype(float)
+    cn = pd.to_numeric(s.str.extract(r"^(\d{1,2})\s*月$", expand=False), errors="coerce")
+    digits = pd.to_numeric(s.where(s.str.isdigit()), errors="coerce")
+    num = cn.fillna(digits)
+    return by_name.fillna(num.where((num >= 1) & (num <= 12)))
+
+
+def _parse_month(values: pd.Series) -> pd.Series:
+    return month_series_to_num(values)
+
+
+@dataclass
+class TimeLookup:
+    """
+    一列的去重取值 -> 解析结果（datetime / 月份号）。入库时每个取值只解析一次；
+    groupby 之后的派生表里同名列的取值都来自原列，sort_time 直接按值查表，不用再解析。
+    """
+
+    values: pd.Index
+    dt: pd.Series       # datetime64（可能带时区），解析不了是 NaT
+    month: np.ndarray   # float，解析不了是 NaN
+
+    @classmethod
+    def build(cls, s: pd.Series) -> tuple["TimeLookup", np.ndarray]:
+        codes, uniques = pd.factorize(s, use_na_sentinel=True)
+        u = pd.Series(uniques, dtype=object)
+        dt = pd.to_datetime(_parse_datetime(u)).reset_index(drop=True)
+        month = _parse_month(u).to_numpy(dtype=float)
+        return cls(pd.Index(uniques, dtype=object), dt, month), codes
+
+    def codes_for(self, s: pd.Series) -> Optional[np.ndarray]:
+        """s 每个值在表里的位置（缺失是 -1）；有表里没有的取值就返回 None。"""
+        codes = self.values.get_indexer(s)
+        if ((codes < 0) & s.notna().to_numpy()).any():
+            return None
+        return codes
+
+    def key(self, codes: np.ndarray, s: pd.Series) -> Optional[pd.Series]:
+        """按 time_key 的规则挑 datetime / 月份；都不够 0.6 返回 None。"""
+        n = max(1, len(codes))
+        missing = codes < 0
+        safe = np.where(missing, 0, codes)
+        if len(self.values) == 0:
+            return None
+
+        dt = pd.Series(self.dt.array.take(safe), index=s.index, name=s.name).where(~missing)
+        if dt.notna().sum() / n > TIME_MIN_RATIO:
+            return dt
+
+        month = self.month.take(safe)
+        month[missing] = np.nan
+        if (~np.isnan(month)).sum() / n > TIME_MIN_RATIO:
+            out = pd.Series(month, index=s.index, name=s.name)
+            # 和 Series.map 的结果保持同一个 dtype：没缺失就是整型
+            return out if out.hasnans else out.astype(np.int64)
+        return None
+
+    def memory_bytes(self) -> int:
+        return int(self.values.memory_usage(deep=True)) + int(self.dt.memory_usage(index=False)) + self.month.nbytes
+
+
+def _plain_object(s: pd.Series) -> pd.Series:
+    if isinstance(s.dtype, (pd.CategoricalDtype, pd.StringDtype)):
+        out = s.astype(object)
+        return out.where(out.notna(), np.nan)
+    return s
+
+
+def time_key_and_lookup(s: pd.Series) -> tuple[Optional[pd.Series], Optional[TimeLookup]]:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s, None
+    s = _plain_object(s)
+    lookup, codes = TimeLookup.build(s)
+    key = lookup.key(codes, s)
+    return key, (lookup if key is not None else None)
+
+
+def time_key(s: pd.Series) -> Optional[pd.Series]:
+    """
+    时间列的排序键：先试 datetime，再试月份（Jan / 1月 / 1..12），能解析的占比都要 > 0.6；
+    都不行返回 None（调用方按原值排序）。
+    """
+    return time_key_and_lookup(s)[0]
+
+
+@dataclass
+class ColumnSchema:
+    kind: str
+    numeric: bool  # planner 可以把它当数值列用
+
+
+@dataclass
+class SchemaCatalog:
+    columns: dict[str, ColumnSchema] = field(default_factory=dict)
+    # 字符串列清洗出来的 float 影子列（原生数值列不存，直接用原列）
+    numeric: dict[str, pd.Series] = field(default_factory=dict)
+    # 时间 / 月份列的排序键（datetime64 或 1..12）
+    time: dict[str, pd.Series] = field(default_factory=dict)
+    # 文本时间列的 取值 -> 排序键 查找表（派生表上 sort_time 用）
+    time_lookup: dict[str, TimeLookup] = field(default_factory=dict)
+
+    def kind(self, col: str) -> Optional[str]:
+        c = self.columns.get(col)
+        return c.kind if c else None
+
+    def numeric_cols(self) -> list[str]:
+        return [name for name, c in self.columns.items() if c.numeric]
+
+    def to_dict(self) -> dict[str, str]:
+        # 给 profile / LLM 看的精简版
+        return {name: c.kind for name, c in self.columns.items()}
+
+    def memory_bytes(self) -> int:
+        total = 0
+        for s in list(self.numeric.values()) + list(self.time.values()):
+            total += int(s.memory_usage(index=False, deep=True))
+        return total + sum(lk.memory_bytes() for lk in self.time_lookup.values())
+
+
+_Inferred = tuple[ColumnSchema, Optional[pd.Series], Optional[pd.Series], Optional[TimeLookup]]
+
+
+def _infer_column(s: pd.Series, n: int) -> _Inferred:
+    if pd.api.types.is_bool_dtype(s):
+        return ColumnSchema(KIND_BOOLEAN, True), None, None, None
+    if pd.api.types.is_numeric_dtype(s):
+        # 整列空的 Excel 列读进来是 float64：类型记成 empty，但 planner 照旧当数值列
+        kind = KIND_NUMERIC if s.notna().any() else KIND_EMPTY
+        return ColumnSchema(kind, True), None, None, None
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return ColumnSchema(KIND_DATETIME, False), None, s, None
+
+    non_null = int(s.notna().sum())
+    if non_null == 0:
+        return ColumnSchema(KIND_EMPTY, False), None, None, None
+
+    num = clean_numeric(s)
+    if int(num.notna().sum()) > 0 and num.notna().sum() / max(1, n) >= NUMERIC_MIN_RATIO:
+        raw = s.astype(str)
+        if raw.str.contains(r"[%％]", regex=True).any():
+            kind = KIND_PERCENT
+        elif raw.str.contains(",", regex=False).any():
+            kind = KIND_THOUSANDS
+        else:
+            kind = KIND_NUMERIC
+        return ColumnSchema(kind, True), num.astype(float), None, None
+
+    key, lookup = time_key_and_lookup(s)
+    if key is not None:
+        kind = KIND_DATETIME if pd.api.types.is_datetime64_any_dtype(key) else KIND_MONTH
+        return ColumnSchema(kind, False), None, key, lookup
+
+    few_values = s.nunique(dropna=True) <= max(1, int(non_null * CATEGORICAL_MAX_RATIO))
+    if isinstance(s.dtype, pd.CategoricalDtype) or few_values:
+        return ColumnSchema(KIND_CATEGORICAL, False), None, None, None
+    return ColumnSchema(KIND_TEXT, False), None, None, None
+
+
+def infer_schema(df: pd.DataFrame) -> SchemaCatalog:
+    """整表扫一遍，返回 schema 目录（影子列和 df 共用同一个 index）。"""
+    cat = SchemaCatalog()
+    n = len(df)
+    for i, c in enumerate(df.columns):
+        name = str(c)
+        if name in cat.columns:  # 重名列只认第一个（df[c] 会取到 DataFrame）
+            continue
+        col_schema, num, key, lookup = _infer_column(df.iloc[:, i], n)
+        cat.columns[name] = col_schema
+        if num is not None:
+            cat.numeric[name] = num
+        if key is not None:
+            cat.time[name] = key
+        if lookup is not None:
+            cat.time_lookup[name] = lookup
+    return cat
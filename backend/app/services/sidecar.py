@@ -0,0 +1,197 @@
+"""
+上传文件的列式旁路缓存（Arrow IPC，即 Feather v2 格式）。
+
+data/uploads/<content_hash>.xlsx 旁边放一个 <content_hash>.arrow：
+- schema metadata 里写版本号 + 源文件 size/mtime，任何一项对不上就视为过期
+- 读取走 memory_map，worker 重启后回填缓存不用再解析 xlsx
+- 按内容寻址，所有 worker 打开的是同一个文件（upload_blobs 表就是共享索引）：
+  数值列零拷贝映射成 DataFrame，物理页走 OS page cache，N 个 worker 只占一份内存
+- pyarrow 不可用、或者列类型 Arrow 存不了（混合类型 object 列等）时直接跳过，
+  调用方退回 pd.read_excel
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+try:  # pyarrow 是可选依赖：没装就只是没有旁路缓存
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:  # pragma: no cover
+    pa = None
+    pa_ipc = None
+
+logger = logging.getLogger(__name__)
+
+# 格式有变化（列处理方式、metadata 字段）就 +1，旧文件会被自动当成过期
+# v2：浮点列的 NaN 按值存（不转成 null），读回来可以零拷贝
+SIDECAR_VERSION = "2"
+SIDECAR_SUFFIX = ".arrow"
+
+_META_VERSION = b"datawhisper.sidecar_version"
+_META_SRC_SIZE = b"datawhisper.source_size"
+_META_SRC_MTIME = b"datawhisper.source_mtime_ns"
+_META_EXTRA_PREFIX = b"datawhisper.extra."
+
+
+def _table_to_frame(table: "pa.Table") -> pd.DataFrame:
+    # split_blocks：每列单独一个 block，没有 null 的数值列直接是 Arrow 缓冲区（mmap）上的只读视图
+    df = table.to_pandas(split_blocks=True)
+    # Arrow 的字符串空值回来是 None，read_excel 给的是 NaN；统一成 NaN，
+    # 否则 astype(str) / to_string 这类输出会从 "nan" 变成 "None"
+    for c in df.columns:
+        s = df[c]
+        if s.dtype == object and s.hasnans:
+            df[c] = s.where(s.notna(), np.nan)
+        elif isinstance(s.dtype, pd.StringDtype) and s.dtype.storage != "pyarrow":
+            # pandas metadata 只记了 "string"，还原成写入时的 Arrow 字符串（不用再拷成 Python 对象）
+            df[c] = s.astype("string[pyarrow]")
+    return df
+
+
+def _frame_to_table(df: pd.DataFrame) -> "pa.Table":
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # from_pandas 会把浮点 NaN 变成 null，读回来就得重新分配数组填 NaN；
+    # 按原值写进去，读的时候就能直接映射
+    for i, c in enumerate(df.columns):
+        s = df.iloc[:, i]
+        if s.dtype.kind == "f" and isinstance(s.dtype, np.dtype) and s.hasnans:
+            table = table.set_column(i, table.field(i), pa.array(s.to_numpy(), type=table.field(i).type))
+    return table
+
+
+def shared_bytes(df: pd.DataFrame) -> int:
+    """df 里直接映射在 Arrow 缓冲区上的列（只读视图）占的字节数：这部分各 worker 共享，不算进进程私有内存。"""
+    total = 0
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i].to_numpy(copy=False) if isinstance(df.dtypes.iloc[i], np.dtype) else None
+        if values is not None and values.dtype != object and not values.flags.writeable:
+            total += int(values.nbytes)
+    return total
+
+
+def sidecar_available() -> bool:
+    return pa is not None
+
+
+def sidecar_path(stored_path: Path) -> Path:
+    return Path(stored_path).with_suffix(SIDECAR_SUFFIX)
+
+
+def _source_fingerprint(stored_path: Path) -> dict[bytes, bytes]:
+    st = Path(stored_path).stat()
+    return {
+        _META_SRC_SIZE: str(st.st_size).encode(),
+        _META_SRC_MTIME: str(st.st_mtime_ns).encode(),
+    }
+
+
+def write_sidecar(
+    stored_path: Path,
+    df: pd.DataFrame,
+    extra_meta: Optional[dict[str, str]] = None,
+) -> bool:
+    """
+    把 df 写成 stored_path 旁边的 .arrow 文件；写不了返回 False（不抛异常）。
+    extra_meta 是随文件一起存的小字符串（比如 dtype 优化报告），用 read_sidecar_meta 读回。
+    """
+    if pa is None:
+        return False
+
+    # Arrow 会把列名统一转成 str（比如表头是 2023 这种数字），读回来就和 read_excel 不一致了
+    if not all(isinstance(c, str) for c in df.columns):
+        return False
+
+    target = sidecar_path(stored_path)
+    tmp = target.with_name(target.name + ".tmp")
+    try:
+        table = _frame_to_table(df)
+        meta = dict(table.schema.metadata or {})
+        meta[_META_VERSION] = SIDECAR_VERSION.encode()
+        meta.update(_source_fingerprint(stored_path))
+        for k, v in (extra_meta or {}).items():
+            meta[_META_EXTRA_PREFIX + k.encode()] = v.encode()
+        table = table.replace_schema_metadata(meta)
+
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with pa_ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        # 先写临时文件再 rename，别的请求永远读不到写了一半的文件
+        os.replace(tmp, target)
+        return True
+    except (pa.ArrowException, TypeError, ValueError, OSError) as e:
+        logger.info("skip sidecar for %s: %s", stored_path, type(e).__name__)
+        tmp.unlink(missing_ok=True)
+        return False
+
+
+def _is_fresh(meta: dict[bytes, bytes], stored_path: Path) -> bool:
+    if meta.get(_META_VERSION) != SIDECAR_VERSION.encode():
+        return False
+    fp = _source_fingerprint(stored_path)
+    return all(meta.get(k) == v for k, v in fp.items())
+
+
+def read_sidecar(stored_path: Path) -> Optional[pd.DataFrame]:
+    """读取旁路缓存；不存在 / 版本不对 / 源文件变了 / 文件损坏都返回 None。"""
+    if pa is None:
+        return None
+
+    target = sidecar_path(stored_path)
+    if not target.exists() or not Path(stored_path).exists():
+        return None
+
+    try:
+        with pa.memory_map(str(target), "r") as source:
+            reader = pa_ipc.open_file(source)
+            if not _is_fresh(reader.schema.metadata or {}, stored_path):
+                return None
+            table = reader.read_all()
+        return _table_to_frame(table)
+    except (pa.ArrowException, OSError) as e:
+        logger.warning("broken sidecar %s: %s", target, type(e).__name__)
+        return None
+
+
+def read_sidecar_meta(stored_path: Path) -> dict[str, str]:
+    """只读 schema 里的 extra_meta（不读数据）；旁路缓存无效时返回空 dict。"""
+    if pa is None:
+        return {}
+
+    target = sidecar_path(stored_path)
+    if not target.exists() or not Path(stored_path).exists():
+        return {}
+
+    try:
+        with pa.memory_map(str(target), "r") as source:
+            meta = pa_ipc.open_file(source).schema.metadata or {}
+    except (pa.ArrowException, OSError):
+        return {}
+    if not _is_fresh(meta, stored_path):
+        return {}
+    n = len(_META_EXTRA_PREFIX)
+    return {k[n:].decode(): v.decode() for k, v in meta.items() if k.startswith(_META_EXTRA_PREFIX)}
+
+
+def frame_to_arrow_bytes(df: pd.DataFrame) -> Optional[bytes]:
+    """DataFrame -> Arrow IPC stream（跨进程传输用）；存不了返回 None，调用方自己退回 pickle。"""
+    if pa is None or not all(isinstance(c, str) for c in df.columns):
+        return None
+    try:
+        table = _frame_to_table(df)
+        sink = pa.BufferOutputStream()
+        with pa_ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    except (pa.ArrowException, TypeError, ValueError):
+        return None
+
+
+def frame_from_arrow_bytes(data: bytes) -> pd.DataFrame:
+    return _table_to_frame(pa_ipc.open_stream(pa.py_buffer(data)).read_all())
@@ -0,0 +1,219 @@
+"""
+每个 upload 一份的统计目录，跟 df 一起放在缓存条目里。
+
+两部分：
+- 列聚合（入库时一次算好）：count / null_count / 近似 distinct，数值列再加 sum / mean / min / max /
+  近似分位数。同 dtype 的列叠成一个 (列数, 行数) 的矩阵一起归约，和 pandas 对 block 做 sum/min/max
+  的方式一样，所以 sum_numeric / column_stats（均值、只问最大最小值的问题）从目录拿到的数和直接 df.sum() 逐位一致；
+  字符串数值列（"1,200"、"95%"）用 schema 目录的影子列算，标记 from_text。
+- describe（按列懒算）：几乎每个问题的默认计划都有 describe，宽表上 describe(include="all")
+  是整条请求里最贵的一步；第一次用到哪列才算哪列，之后直接拿。
+
+近似的两项：
+- 分位数：非空值超过 QUANTILE_SAMPLE 个时按等间隔抽样算（线性插值，和 pandas 默认一致）
+- distinct：非空值不超过 DISTINCT_EXACT_MAX 个时精确，否则 HyperLogLog（4096 个寄存器，误差约 1.6%）
+
+工具在线程池里跑，多个请求可能同时补同一列 describe，用锁保护。
+"""
+
+from __future__ import annotations
+
+import threading
+import warnings
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from app.services.schema_catalog import SchemaCatalog
+
+QUANTILES = (0.25, 0.5, 0.75)
+QUANTILE_SAMPLE = 100_000
+DISTINCT_EXACT_MAX = 50_000
+_HLL_P = 12
+
+
+@dataclass
+class ColumnAggregates:
+    count: int
+    null_count: int
+    distinct: int
+    distinct_exact: bool
+    numeric: bool = False
+    # 数值来自字符串列清洗出来的影子列（df.sum(numeric_only=True) 不会算这些列）
+    from_text: bool = False
+    sum: Any = None
+    mean: Optional[float] = None
+    min: Any = None
+    max: Any = None
+    # {"25%": ..., "50%": ..., "75%": ...}
+    quantiles: dict[str, float] = field(default_factory=dict)
+    quantiles_exact: bool = True
+
+    def get(self, stat: str) -> Any:
+        if stat in self.quantiles:
+            return self.quantiles[stat]
+        return getattr(self, stat)
+
+
+def _hll_distinct(hashes: np.ndarray) -> int:
+    m = 1 << _HLL_P
+    idx = (hashes >> np.uint64(64 - _HLL_P)).astype(np.int64)
+    # 剩下的 52 位：前导零个数 + 1（最低位补 1，保证不会全零）
+    rest = (hashes << np.uint64(_HLL_P)) | np.uint64(1 << (_HLL_P - 1))
+    rank = (64 - np.floor(np.log2(rest.astype(np.float64)))).astype(np.int8)
+    regs = np.zeros(m, dtype=np.int8)
+    np.maximum.at(regs, idx, rank)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    est = alpha * m * m / np.sum(np.power(2.0, -regs.astype(np.float64)))
+    zeros = int((regs == 0).sum())
+    if est <= 2.5 * m and zeros:
+        est = m * np.log(m / zeros)  # 小基数修正
+    return int(round(est))
+
+
+def _distinct(values: pd.Series) -> tuple[int, bool]:
+    valid = values.dropna()
+    if len(valid) <= DISTINCT_EXACT_MAX:
+        return int(valid.nunique()), True
+    try:
+        hashes = pd.util.hash_array(valid.to_numpy())
+    except TypeError:  # 混了不可哈希的值：退回精确
+        return int(valid.astype(str).nunique()), True
+    return _hll_distinct(hashes), False
+
+
+def _native(v: Any) -> Any:
+    return v.item() if isinstance(v, np.generic) else v
+
+
+def _numeric_block(mat: np.ndarray, kind: str) -> list[dict[str, Any]]:
+    """mat: (列数, 行数)，同一种 dtype。返回每列的 sum/mean/min/max/分位数。"""
+    k, n = mat.shape
+    if kind in "biu":
+        # 整型 / 布尔没有缺失；布尔的 sum 是 True 的个数
+        sums = mat.sum(axis=1)
+        fsums = mat.sum(axis=1, dtype=np.float64)
+        counts = np.full(k, n)
+        mins = mat.min(axis=1) if n else np.full(k, np.nan)
+        maxs = mat.max(axis=1) if n else np.full(k, np.nan)
+        fmat = mat.astype(np.float64)
+    else:
+        fmat = mat.astype(np.float64, copy=False)
+        mask = np.isnan(fmat)
+        counts = n - mask.sum(axis=1)
+        # 和 pandas nansum 一样：NaN 填 0 再沿行（连续内存）求和
+        sums = fsums = np.where(mask, 0.0, fmat).sum(axis=1)
+        mins = np.fmin.reduce(fmat, axis=1) if n else np.full(k, np.nan)
+        maxs = np.fmax.reduce(fmat, axis=1) if n else np.full(k, np.nan)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, fsums / np.maximum(counts, 1), np.nan)
+
+    # 分位数：点太多就等间隔抽样
+    step = max(1, -(-n // QUANTILE_SAMPLE))
+    sample = fmat[:, ::step]
+    if sample.shape[1] and not np.isnan(sample).all():
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # 整列 NaN：All-NaN slice
+            qs = np.nanquantile(sample, QUANTILES, axis=1)
+    else:
+        qs = np.full((len(QUANTILES), k), np.nan)
+
+    out = []
+    for j in range(k):
+        out.append(
+            {
+                "sum": _native(sums[j]),
+                "mean": float(means[j]),
+                "min": _native(mins[j]),
+                "max": _native(maxs[j]),
+                "quantiles": {f"{int(q * 100)}%": float(qs[i][j]) for i, q in enumerate(QUANTILES)},
+                "quantiles_exact": step == 1,
+            }
+        )
+    return out
+
+
+def compute_aggregates(df: pd.DataFrame, schema: Optional["SchemaCatalog"] = None) -> dict[str, ColumnAggregates]:
+    """整表一次算完每列的聚合；重名列只认第一个（和 schema 目录一样）。"""
+    out: dict[str, ColumnAggregates] = {}
+    notna = df.notna().sum().to_numpy()
+    n = len(df)
+
+    numeric_by_kind: dict[str, list[tuple[str, np.ndarray, bool]]] = {}
+    for i, c in enumerate(df.columns):
+        name = str(c)
+        if name in out:
+            continue
+        s = df.iloc[:, i]
+        distinct, exact = _distinct(s)
+        out[name] = ColumnAggregates(
+            count=int(notna[i]), null_count=int(n - notna[i]), distinct=distinct, distinct_exact=exact
+        )
+        if pd.api.types.is_numeric_dtype(s) and not isinstance(s.dtype, pd.CategoricalDtype):
+            if s.dtype.kind in "biuf":
+                arr = s.to_numpy()
+            else:  # 可空扩展类型（Int64 / Float64 / boolean）：缺失转 NaN
+                arr = s.to_numpy(dtype=np.float64, na_value=np.nan)
+            numeric_by_kind.setdefault(f"{arr.dtype.kind}:{arr.dtype}", []).append((name, arr, False))
+        elif schema is not None and name in schema.numeric:
+            numeric_by_kind.setdefault("f:shadow", []).append(
+                (name, schema.numeric[name].to_numpy(dtype=np.float64), True)
+            )
+
+    for key, cols in numeric_by_kind.items():
+        mat = np.vstack([arr for _, arr, _ in cols]) if n else np.empty((len(cols), 0))
+        for (name, _, from_text), agg in zip(cols, _numeric_block(mat, key[0])):
+            a = out[name]
+            a.numeric, a.from_text = True, from_text
+            a.sum, a.mean, a.min, a.max = agg["sum"], agg["mean"], agg["min"], agg["max"]
+            a.quantiles, a.quantiles_exact = agg["quantiles"], agg["quantiles_exact"]
+    return out
+
+
+class StatsCatalog:
+    def __init__(self, aggregates: Optional[dict[str, ColumnAggregates]] = None) -> None:
+        self.aggregates: dict[str, ColumnAggregates] = aggregates or {}
+        self._describe: dict[str, pd.Series] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, schema: Optional["SchemaCatalog"] = None) -> "StatsCatalog":
+        return cls(compute_aggregates(df, schema))
+
+    def native_series(self, cols: list[str], stat: str) -> Optional[pd.Series]:
+        """
+        等价于 df[cols].<stat>(numeric_only=True)：只取原生数值列，按 cols 顺序拼成 Series；
+        有列不在目录里就返回 None（调用方自己算）。
+        """
+        vals = {}
+        for c in cols:
+            a = self.aggregates.get(c)
+            if a is None:
+                return None
+            if a.numeric and not a.from_text:
+                vals[c] = a.get(stat)
+        return pd.Series(vals, dtype=None if vals else np.float64)
+
+    def describe_column(self, name: str, compute: Callable[[], pd.Series]) -> pd.Series:
+        with self._lock:
+            hit = self._describe.get(name)
+        if hit is not None:
+            return hit
+        # 锁外算：不同列可以并行；同一列偶尔算两遍也无所谓，结果一样
+        desc = compute()
+        with self._lock:
+            return self._describe.setdefault(name, desc)
+
+    def described_columns(self) -> list[str]:
+        with self._lock:
+            return list(self._describe)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            desc = sum(int(s.memory_usage(index=True, deep=True)) for s in self._describe.values())
+        # 聚合每列就十来个数，按 200 字节估
+        return desc + 200 * len(self.aggregates)
@@ -0,0 +1,127 @@
+"""
+工具链的执行器。
+
+pandas 工具是同步 CPU 活，宽表上一个 describe 就能跑好几秒，直接在 async handler 里跑会把
+同一个 worker 上的其它请求全卡住，所以每一步都丢到有界线程池里：
+- thread（默认）：TOOL_WORKERS 个线程，同时最多这么多个工具在跑，多出来的排队
+- inline：直接在事件循环里跑（等价于老行为，调试用）
+
+超时：单个工具 TOOL_TIMEOUT_S（注册时可以单独指定），整条工具链 TOOL_REQUEST_TIMEOUT_S，
+每一步实际用的是两者里剩得少的那个。超时的一步返回 ERROR 的 ToolResult，后面的步骤直接跳过。
+还在排队的任务会被取消；已经在跑的 pandas 调用没法从外面打断，只能不等它——
+结果丢掉，线程跑完自己回到池子里。
+
+不提供进程池：工具吃的是缓存里常驻内存的 DataFrame，每次调用都 pickle 过去比算还贵。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+import pandas as pd
+
+from app.core.config import get_settings
+from app.services.tools.registry import ToolContext, ToolRegistry, ToolResult
+
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_workers: Optional[int] = None
+
+
+def _executor_for(kind: str, workers: int) -> Optional[ThreadPoolExecutor]:
+    global _executor, _executor_workers
+    if kind == "inline":
+        return None
+    if kind != "thread":
+        raise ValueError(f"unknown TOOL_EXECUTOR: {kind}")
+
+    with _lock:
+        if _executor is not None and _executor_workers == workers:
+            return _executor
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool-exec")
+        _executor_workers = workers
+        return _executor
+
+
+def shutdown_tool_executor() -> None:
+    global _executor, _executor_workers
+    with _lock:
+        if _executor is not None:
+            # 超时被丢下的工具可能还在跑，不等它们
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _executor_workers = None
+
+
+def timeout_result(name: str, seconds: float) -> ToolResult:
+    return ToolResult(
+        kind="text",
+        value=f"ERROR: tool timed out after {seconds:g}s: {name}",
+        preview="tool timeout",
+    )
+
+
+def skipped_result(name: str) -> ToolResult:
+    return ToolResult(
+        kind="text",
+        value=f"ERROR: skipped after an earlier step timed out: {name}",
+        preview="skipped (timeout)",
+    )
+
+
+class ToolRunner:
+    """
+    一次请求用一个：记着整条链的截止时间。
+    当成 logical_plan.execute_async 的 run 回调用，返回 (结果, 能不能缓存)。
+    """
+
+    def __init__(
+        self,
+        reg: ToolRegistry,
+        ctx: Optional[ToolContext] = None,
+        *,
+        timeout_s: Optional[float] = None,
+        request_timeout_s: Optional[float] = None,
+    ) -> None:
+        settings = get_settings()
+        self.reg = reg
+        self.ctx = ctx
+        self.timeout_s = settings.tool_timeout_s if timeout_s is None else timeout_s
+        request_timeout_s = settings.tool_request_timeout_s if request_timeout_s is None else request_timeout_s
+        self.deadline = time.monotonic() + request_timeout_s if request_timeout_s > 0 else None
+        self.executor = _executor_for(settings.tool_executor.lower(), max(1, int(settings.tool_workers)))
+        self.timed_out = False
+
+    def _budget(self, name: str) -> Optional[float]:
+        per_tool = self.reg.timeout(name)
+        per_tool = self.timeout_s if per_tool is None else per_tool
+        budgets = [per_tool] if per_tool and per_tool > 0 else []
+        if self.deadline is not None:
+            budgets.append(self.deadline - time.monotonic())
+        return min(budgets) if budgets else None
+
+    async def __call__(self, name: str, df: pd.DataFrame, args: dict[str, Any]) -> tuple[ToolResult, bool]:
+        if self.timed_out:
+            return skipped_result(name), False
+        if self.executor is None:
+            return self.reg.invoke(name, df, args, self.ctx), True
+
+        budget = self._budget(name)
+        if budget is not None and budget <= 0:
+            self.timed_out = True
+            return timeout_result(name, 0), False
+
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self.executor, self.reg.invoke, name, df, args, self.ctx)
+        try:
+            # wait_for 超时会 cancel 包装的 future：还在排队的任务就不会再跑了
+            return await asyncio.wait_for(fut, timeout=budget), True
+        except asyncio.TimeoutError:
+            self.timed_out = True
+            return timeout_result(name, budget), False
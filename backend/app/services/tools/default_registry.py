@@ -5,20 +5,32 @@ def build_default_registry() -> ToolRegistry:
     r = ToolRegistry()  # ✅ 每次新建，绝不会重复注册
 
     # 下面是示例：按你原来的工具一个个 register
-    r.register("profile", pt.tool_profile)
-    r.register("describe", pt.tool_describe)
-    r.register("head", pt.tool_head)
-    r.register("sum_numeric", pt.tool_sum_numeric)
-    r.register("groupby_sum", pt.tool_groupby_sum)
-    r.register("sort_time", pt.tool_sort_time)
-    r.register("chart_line", pt.tool_chart_line)
+    # profile / head 只看形状或切前几行，比查缓存还便宜，不进工具结果缓存
+    r.register("profile", pt.tool_profile, cacheable=False)
+    # describe 按列缓存在统计目录里，需要 ctx
+    r.register("describe", pt.tool_describe, uses_ctx=True)
+    r.register("head", pt.tool_head, cacheable=False)
+    # 原始 df 上直接读入库时算好的列聚合，比查工具结果缓存还便宜
+    r.register("sum_numeric", pt.tool_sum_numeric, uses_ctx=True, cacheable=False)
+    r.register("column_stats", pt.tool_column_stats, uses_ctx=True, cacheable=False)
+    # 这几个会用入库时的 schema 目录（影子数值列 / 时间排序键），需要 ctx
+    r.register("groupby_agg", pt.tool_groupby_agg, uses_ctx=True)
+    # 老名字留着（记忆里的计划 / 外部调用），内部都走 groupby_agg
+    r.register("groupby_sum", pt.tool_groupby_sum, uses_ctx=True)
+    r.register("groupby_mean", pt.tool_groupby_mean, uses_ctx=True)
+    r.register("sort_time", pt.tool_sort_time, uses_ctx=True)
+    r.register("top_k", pt.tool_top_k, uses_ctx=True)
+    # 原始 df 上走列索引，查一次比拷一份缓存的结果表还便宜
+    r.register("filter", pt.tool_filter, uses_ctx=True, cacheable=False)
+    r.register("chart_line", pt.tool_chart_line, uses_ctx=True)
 
     # ✅ 新增的兜底趋势图
     r.register(
         "chart_line_index",
-        lambda df, y_cols, max_points=200, **kw: pt.tool_chart_line_index(
-            df, y_cols=y_cols, max_points=max_points
+        lambda df, y_cols, max_points=200, ctx=None, downsample="lttb", **kw: pt.tool_chart_line_index(
+            df, y_cols=y_cols, max_points=max_points, ctx=ctx, downsample=downsample
         ),
+        uses_ctx=True,
     )
 
     return r
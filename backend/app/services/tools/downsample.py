@@ -0,0 +1,118 @@
+"""
+折线图降采样：在点数预算内保住整条曲线的形状，而不是只画前 max_points 行。
+
+- lttb（默认）：Largest-Triangle-Three-Buckets，每个桶挑和左右邻点围成三角形面积最大的那个点，
+  峰谷都保得住
+- minmax：每个桶留最小值和最大值两个点（更快，尖峰一定在）
+- head：老行为，直接取前 max_points 行
+
+缺失值（NaN）：降采样只在有值的点上做；两个有值点之间的每段缺失留一个缺失点当“断口”，
+前端照样断线。断口太多（超过预算的 1/4）时只留最长的那些，短的小缺口在这个分辨率下看不出来。
+
+返回的都是原序列里的行位置（升序），多条 series 共用一个 x 轴，所以按位置挑行。
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+DOWNSAMPLE_MODES = ("lttb", "minmax", "head")
+
+
+def _lttb(x: np.ndarray, y: np.ndarray, budget: int) -> np.ndarray:
+    """对 (x, y) 做 LTTB，返回选中点在输入里的下标；预算够两个点时首尾一定保留。"""
+    n = len(y)
+    if budget >= n or n <= 2:
+        return np.arange(n)
+    if budget < 3:
+        # 只够一个点就只留第一个，不能超预算
+        return np.array([0, n - 1][:max(1, budget)])
+
+    # 中间 n-2 个点均分成 budget-2 个桶
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    picked = np.empty(budget, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(budget - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # 下一个桶的均值当第三个顶点（最后一个桶用末点）
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        nhi = max(nhi, nlo + 1)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def _minmax(y: np.ndarray, budget: int) -> np.ndarray:
+    n = len(y)
+    if budget >= n:
+        return np.arange(n)
+    if budget < 2:
+        return np.array([0])
+    buckets = budget // 2
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    out: list[int] = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi <= lo:
+            continue
+        seg = y[lo:hi]
+        out.extend({lo + int(np.argmin(seg)), lo + int(np.argmax(seg))})
+    return np.unique(np.array(out, dtype=np.int64))
+
+
+def _gap_markers(valid: np.ndarray, limit: int) -> np.ndarray:
+    """有值点之间每一段缺失的第一个位置；超过 limit 段时只留最长的 limit 段。"""
+    if limit <= 0:
+        return np.array([], dtype=np.int64)
+    vpos = np.flatnonzero(valid)
+    if len(vpos) < 2:
+        return np.array([], dtype=np.int64)
+    gaps = np.diff(vpos) - 1
+    where = np.flatnonzero(gaps > 0)
+    if len(where) > limit:
+        where = np.sort(where[np.argsort(-gaps[where], kind="stable")[:limit]])
+    return vpos[where] + 1
+
+
+def downsample_positions(y: np.ndarray, budget: int, mode: str = "lttb") -> np.ndarray:
+    """单条序列：返回要保留的行位置（升序）。"""
+    n = len(y)
+    budget = max(1, int(budget))
+    if n <= budget:
+        return np.arange(n)
+    if mode == "head":
+        return np.arange(budget)
+    if mode not in DOWNSAMPLE_MODES:
+        raise ValueError(f"unknown downsample mode: {mode}")
+
+    valid = ~np.isnan(y)
+    markers = _gap_markers(valid, budget // 4)
+    vpos = np.flatnonzero(valid)
+    rest = max(1, budget - len(markers))
+    if len(vpos) == 0:
+        return markers
+    if mode == "lttb":
+        keep = vpos[_lttb(vpos.astype(float), y[vpos], rest)]
+    else:
+        keep = vpos[_minmax(y[vpos], rest)]
+    return np.union1d(keep, markers)
+
+
+def downsample_rows(ys: list[np.ndarray], budget: int, mode: str = "lttb") -> np.ndarray:
+    """
+    多条 series 共用 x 轴：每条分到 budget / 条数 的预算，各自挑点后取并集，总数不超过 budget。
+    """
+    if not ys:
+        return np.array([], dtype=np.int64)
+    n = len(ys[0])
+    budget = max(1, int(budget))
+    if n <= budget:
+        return np.arange(n)
+    if mode == "head":
+        return np.arange(budget)
+    each = max(1, budget // len(ys))
+    picked = np.unique(np.concatenate([downsample_positions(y, each, mode) for y in ys]))
+    return picked[:budget]
@@ -0,0 +1,309 @@
+"""
+工具链的逻辑计划 + 优化器。
+
+planner 给出的 ToolCall 序列先变成逻辑步骤，从后往前推每一步“下游到底要用哪些列、前多少行”，
+再改写物理执行方式，最后才真正跑工具：
+- 投影下推：只读部分列的步骤（groupby / 画图 / 指定列求和）执行前先把 df 投影到这些列
+- sort + head 融合：排序之后下游只看前 N 行（head、画图的 max_points、预览的 15 行）时，
+  排序按 top-k 执行，不物化整张排好序的表
+- 不被任何下游读取的列不会跟着进 groupby 之类的步骤
+- 谓词下推：filter 挪到排序之前；谓词只涉及分组键时也挪到 groupby 之前（先过滤行再分组，
+  原始 df 上还能用列索引）。结果不变：稳定排序和过滤可交换，按分组键过滤只是少算几个组
+  （groupby 输出的行号标签会不一样，但预览、artifact 都不带行号）
+
+表格输出的预览会把所有列、前 15 行都打出来，所以这些也算“被读取”，
+优化前后每一步的输出预览、图表、最终回答都不变；trace 里照样一步一条，另附物理执行说明。
+
+ctx 带了 fingerprint 时，每一步先查工具结果缓存（见 result_cache），key 里带上输入表的血缘。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Generator, Optional
+
+import pandas as pd
+
+from .registry import ToolContext, ToolRegistry, ToolResult
+from .result_cache import (
+    SOURCE_LINEAGE,
+    ToolResultCache,
+    projection_lineage,
+    result_key,
+    tool_result_cache,
+)
+
+# 表格预览打印的行数（pandas_tools._df_preview 的默认值）
+PREVIEW_ROWS = 15
+
+Cols = Optional[frozenset[str]]   # None 表示全部列
+Rows = Optional[int]              # None 表示全部行
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    # 输出是不是表格（是的话会替换后续步骤拿到的 df）
+    table_out: bool
+    # 这一步自己读哪些列：None = 全部
+    reads_cols: Callable[[dict[str, Any]], Cols] = lambda args: None
+    # 这一步自己读输入的前多少行：None = 全部
+    reads_rows: Callable[[dict[str, Any]], Rows] = lambda args: None
+    # 输出表和输入表是同一批列、只是换了行（排序 / head），下游的列需求原样往上传
+    passthrough: bool = False
+    # 支持 limit 参数（排序类，可以融合成 top-k）
+    accepts_limit: bool = False
+
+
+def _cols(*names: Any) -> frozenset[str]:
+    out: set[str] = set()
+    for n in names:
+        if isinstance(n, (list, tuple)):
+            out.update(str(x) for x in n)
+        elif n is not None:
+            out.add(str(n))
+    return frozenset(out)
+
+
+def _chart_rows(args: dict[str, Any]) -> Rows:
+    # 降采样要看整条序列；只有 head 模式才是只读前 max_points 行
+    if args.get("downsample", "lttb") == "head":
+        return int(args.get("max_points", 200))
+    return None
+
+
+TOOL_SPECS: dict[str, ToolSpec] = {
+    "profile": ToolSpec(table_out=False, reads_rows=lambda a: 0),
+    "describe": ToolSpec(table_out=False, reads_cols=lambda a: _cols(a["cols"]) if a.get("cols") else None),
+    "sum_numeric": ToolSpec(table_out=False, reads_cols=lambda a: _cols(a["cols"]) if a.get("cols") else None),
+    "column_stats": ToolSpec(table_out=False, reads_cols=lambda a: _cols(a["cols"]) if a.get("cols") else None),
+    "pick_top1": ToolSpec(table_out=False, reads_rows=lambda a: 1),
+    "chart_line": ToolSpec(
+        table_out=False,
+        reads_cols=lambda a: _cols(a["x_col"], a["y_cols"]),
+        reads_rows=_chart_rows,
+    ),
+    "chart_line_index": ToolSpec(
+        table_out=False,
+        reads_cols=lambda a: _cols(a["y_cols"]),
+        reads_rows=_chart_rows,
+    ),
+    "groupby_agg": ToolSpec(table_out=True, reads_cols=lambda a: _cols(a["group_by"], a["value_cols"])),
+    "groupby_sum": ToolSpec(table_out=True, reads_cols=lambda a: _cols(a["group_col"], a["value_cols"])),
+    "groupby_mean": ToolSpec(table_out=True, reads_cols=lambda a: _cols(a["group_col"], a["value_cols"])),
+    "head": ToolSpec(table_out=True, passthrough=True, reads_rows=lambda a: int(a.get("n", 10))),
+    "sort": ToolSpec(table_out=True, passthrough=True, accepts_limit=True),
+    "sort_time": ToolSpec(table_out=True, passthrough=True, accepts_limit=True),
+    # 自己就是 top-k（k 在参数里），输出和输入同一批列
+    "top_k": ToolSpec(table_out=True, passthrough=True),
+    # 只挑行，列不变；谓词用到的列是全表的列，所以不在它前面投影
+    "filter": ToolSpec(table_out=True, passthrough=True),
+}
+
+_GROUPBY_KEYS: dict[str, str] = {"groupby_agg": "group_by", "groupby_sum": "group_col", "groupby_mean": "group_col"}
+
+# 没登记的工具：保守处理，当成读全表、输出新表
+_UNKNOWN = ToolSpec(table_out=True)
+
+
+@dataclass
+class LogicalStep:
+    name: str
+    args: dict[str, Any]
+    # 执行前把输入投影到这些列（按原列顺序）；None 表示不投影
+    project: Optional[list[str]] = None
+    # 排序只需要产出前 limit 行（top-k）
+    limit: Optional[int] = None
+    notes: list[str] = field(default_factory=list)
+
+
+def _union_cols(a: Cols, b: Cols) -> Cols:
+    if a is None or b is None:
+        return None
+    return a | b
+
+
+def _max_rows(a: Rows, b: Rows) -> Rows:
+    if a is None or b is None:
+        return None
+    return max(a, b)
+
+
+def _projection(columns: list[str], need: Cols) -> Optional[list[str]]:
+    if need is None:
+        return None
+    if len(set(columns)) != len(columns) or not need.issubset(columns):
+        return None  # 重名列 / 参数里的列不存在：交给工具自己报错
+    picked = [c for c in columns if c in need]
+    return picked if len(picked) < len(columns) else None
+
+
+def _filter_cols(args: dict[str, Any]) -> Cols:
+    where = args.get("where")
+    preds = [where] if isinstance(where, dict) else list(where or [])
+    try:
+        return _cols(*[p["col"] for p in preds])
+    except (KeyError, TypeError):
+        return None
+
+
+def _can_push_below(prev: LogicalStep, filt: LogicalStep) -> bool:
+    """filter 能不能挪到 prev 前面执行（结果不变）。"""
+    if prev.name in ("sort", "sort_time"):
+        # 带 limit 的排序是 top-k：先截断再过滤和先过滤再截断不一样
+        return prev.args.get("limit") is None
+    key = _GROUPBY_KEYS.get(prev.name)
+    if key is not None:
+        need = _filter_cols(filt.args)
+        return need is not None and bool(need) and need.issubset(_cols(prev.args.get(key)))
+    return False
+
+
+def _push_down_filters(steps: list[LogicalStep]) -> list[LogicalStep]:
+    for i in range(1, len(steps)):
+        j = i
+        while j > 0 and steps[j].name == "filter" and _can_push_below(steps[j - 1], steps[j]):
+            steps[j].notes.append(f"pushdown(before {steps[j - 1].name})")
+            steps[j - 1], steps[j] = steps[j], steps[j - 1]
+            j -= 1
+    return steps
+
+
+def optimize(calls: list[Any], columns: list[str]) -> list[LogicalStep]:
+    """calls 是 planner 的 ToolCall 列表；columns 是原始 df 的列名。"""
+    steps = _push_down_filters([LogicalStep(name=c.name, args=dict(c.args)) for c in calls])
+
+    # 从后往前：need_* 是“当前这张表被下游读取的列 / 行”
+    need_cols: Cols = frozenset()
+    need_rows: Rows = 0
+    per_step: list[tuple[Cols, Rows]] = [(None, None)] * len(steps)
+    for i in range(len(steps) - 1, -1, -1):
+        spec = TOOL_SPECS.get(steps[i].name, _UNKNOWN)
+        args = steps[i].args
+        try:
+            own_cols, own_rows = spec.reads_cols(args), spec.reads_rows(args)
+        except (KeyError, TypeError, ValueError):
+            own_cols, own_rows = None, None
+
+        if not spec.table_out:
+            # 文本 / 图表：df 原样流到下一步
+            per_step[i] = (own_cols, own_rows)
+            need_cols = _union_cols(need_cols, own_cols)
+            need_rows = _max_rows(need_rows, own_rows)
+            continue
+
+        # 表格输出：预览会打出所有列 + 前 15 行
+        out_rows = _max_rows(need_rows, PREVIEW_ROWS)
+        if spec.accepts_limit and out_rows is not None:
+            steps[i].limit = out_rows
+            steps[i].notes.append(f"top_k(k={out_rows})")
+        if spec.passthrough:
+            need_cols = None
+            need_rows = None if spec.accepts_limit else own_rows
+        else:
+            need_cols = own_cols
+            need_rows = own_rows
+        per_step[i] = (need_cols, need_rows)
+
+    # 再从前往后：知道每一步输入表的列名，才能生成具体的投影
+    current_cols: Optional[list[str]] = list(columns)
+    for i, step in enumerate(steps):
+        spec = TOOL_SPECS.get(step.name, _UNKNOWN)
+        if current_cols is not None:
+            step.project = _projection(current_cols, per_step[i][0])
+            if step.project is not None:
+                step.notes.append(f"project({len(step.project)}/{len(current_cols)} cols)")
+        if spec.table_out and not spec.passthrough:
+            current_cols = None  # 新表的列名要执行了才知道，后面不再投影
+    return steps
+
+
+# 一次工具调用：(工具名, 输入 df, 参数)
+Call = tuple[str, pd.DataFrame, dict[str, Any]]
+
+
+def _drive(
+    reg: ToolRegistry,
+    df: pd.DataFrame,
+    steps: list[LogicalStep],
+    ctx: Optional[ToolContext],
+    cache: Optional[ToolResultCache],
+) -> Generator[Call, tuple[ToolResult, bool], list[tuple[LogicalStep, ToolResult]]]:
+    """
+    执行计划的公共部分（投影、limit、结果缓存、血缘）。真正调工具交给调用方：
+    yield 出一次调用，调用方 send 回 (结果, 能不能缓存)。同步 / 异步执行共用这一份。
+    """
+    cache = cache if cache is not None else tool_result_cache
+    use_cache = ctx is not None and bool(ctx.fingerprint) and cache.enabled()
+
+    out: list[tuple[LogicalStep, ToolResult]] = []
+    current = df
+    lineage: Any = SOURCE_LINEAGE
+    for step in steps:
+        spec = TOOL_SPECS.get(step.name, _UNKNOWN)
+        inp = current
+        inp_lineage = lineage
+        if step.project is not None:
+            inp = current[step.project]
+            inp_lineage = projection_lineage(lineage, step.project)
+            if ctx is not None and ctx.is_source(current):
+                ctx.source_views.append(inp)
+
+        args = step.args
+        if step.limit is not None and spec.accepts_limit:
+            args = {**args, "limit": step.limit}
+
+        key = None
+        res = None
+        if use_cache and reg.cacheable(step.name):
+            key = result_key(ctx.fingerprint, step.name, args, inp_lineage)
+            res = cache.get(key)
+            if res is not None:
+                step.notes.append("cached")
+        if res is None:
+            res, ok = yield (step.name, inp, args)
+            if key is not None and ok:
+                cache.put(key, res)
+        out.append((step, res))
+
+        if res.kind == "table":
+            current = res.value
+            # 下游拿到的是这一步的输出：血缘换成这一步的 key（不缓存的工具也照样算出来）
+            lineage = key or (
+                result_key(ctx.fingerprint or "", step.name, args, inp_lineage) if ctx is not None else None
+            )
+    return out
+
+
+def execute(
+    reg: ToolRegistry,
+    df: pd.DataFrame,
+    steps: list[LogicalStep],
+    ctx: Optional[ToolContext] = None,
+    cache: Optional[ToolResultCache] = None,
+) -> list[tuple[LogicalStep, ToolResult]]:
+    """按优化后的逻辑步骤执行；返回每一步的 (步骤, 结果)，用来生成 trace。"""
+    gen = _drive(reg, df, steps, ctx, cache)
+    try:
+        name, inp, args = next(gen)
+        while True:
+            name, inp, args = gen.send((reg.invoke(name, inp, args, ctx), True))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def execute_async(
+    reg: ToolRegistry,
+    df: pd.DataFrame,
+    steps: list[LogicalStep],
+    run: Callable[[str, pd.DataFrame, dict[str, Any]], Awaitable[tuple[ToolResult, bool]]],
+    ctx: Optional[ToolContext] = None,
+    cache: Optional[ToolResultCache] = None,
+) -> list[tuple[LogicalStep, ToolResult]]:
+    """同 execute，但每次工具调用交给 run（比如丢到工具执行器里、带超时）。"""
+    gen = _drive(reg, df, steps, ctx, cache)
+    try:
+        name, inp, args = next(gen)
+        while True:
+            name, inp, args = gen.send(await run(name, inp, args))
+    except StopIteration as stop:
+        return stop.value
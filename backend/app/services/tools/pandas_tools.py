@@ -4,13 +4,67 @@ from typing import Any
 
 import pandas as pd
 
-from .registry import ToolResult
+from .downsample import DOWNSAMPLE_MODES, downsample_rows
+from .registry import ToolContext, ToolResult
 
-import re
+import numpy as np
 
+from app.services.artifacts import encode_floats, encode_labels
+from app.services.index_catalog import HashIndex, SortedIndex
+from app.services.schema_catalog import KIND_CATEGORICAL, KIND_EMPTY, KIND_TEXT, clean_numeric, time_key
+from app.services.stats_catalog import StatsCatalog, compute_aggregates
 
 
-def _df_preview(df: pd.DataFrame, n: int = 15) -> str:
+def _is_optimized(dtype: Any) -> bool:
+    if isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)):
+        return True
+    return isinstance(dtype, np.dtype) and dtype.kind == "i" and dtype != np.int64
+
+
+def _plain_series(s: pd.Series) -> pd.Series:
+    """
+    把入库时 dtype 瘦身后的列还原成 read_excel 原本的样子（category / Arrow 字符串 -> object，
+    小整型 -> int64），保证工具结果和没优化时逐字一致。没优化过的列原样返回，不拷贝。
+    """
+    if not _is_optimized(s.dtype):
+        return s
+    if s.dtype.kind == "i":
+        return s.astype(np.int64)
+    out = s.astype(object)
+    return out.where(out.notna(), np.nan)
+
+
+def _plain(df: pd.DataFrame) -> pd.DataFrame:
+    if not any(_is_optimized(t) for t in df.dtypes):
+        return df
+    out = df.copy(deep=False)
+    for i in range(out.shape[1]):
+        out.isetitem(i, _plain_series(out.iloc[:, i]))
+    return out
+
+
+def _to_numeric(s: pd.Series) -> pd.Series:
+    # category 直接 to_numeric 会全变 NaN，先还原
+    return pd.to_numeric(_plain_series(s), errors="coerce")
+
+
+def _numeric(df: pd.DataFrame, col: str, ctx: ToolContext | None) -> pd.Series:
+    # 原始 df 上的字符串数值列直接拿入库时清洗好的影子列
+    if ctx is not None and ctx.schema is not None and col in ctx.schema.numeric:
+        if ctx.is_source(df):
+            return ctx.schema.numeric[col]
+        # 派生表（filter / head 之后）没有影子列：用和入库时一样的清洗，"1,200" 不会变成 NaN
+        s = df[col]
+        if not pd.api.types.is_numeric_dtype(s):
+            return clean_numeric(_plain_series(s))
+    return _to_numeric(df[col])
+
+
+# 表格输出给 LLM 的预览行数
+PREVIEW_ROWS = 15
+
+
+def _df_preview(df: pd.DataFrame, n: int = PREVIEW_ROWS) -> str:
     if df is None:
         return "<none>"
     if df.empty:
@@ -28,58 +82,215 @@ def tool_profile(df: pd.DataFrame) -> ToolResult:
     )
 
 
-def tool_describe(df: pd.DataFrame) -> ToolResult:
-    desc = df.describe(include="all").fillna("")
+def _describe_order(ldesc: list[pd.Series]) -> list[str]:
+    # 和 DataFrame.describe 拼行名的方式一样：统计项少的列先排，依次并进来
+    names: list[str] = []
+    seen: set[str] = set()
+    for idx in sorted((x.index for x in ldesc), key=len):
+        for name in idx:
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+    return names
+
+
+def _describe(df: pd.DataFrame, ctx: ToolContext | None) -> pd.DataFrame:
+    """
+    等价于 _plain(df).describe(include="all")，但按列算再拼起来：
+    原始 df（或它的列投影）上每列的结果缓存在统计目录里，下次直接拿。
+    """
+    if df.shape[1] == 0:
+        return df.describe(include="all")  # 没有列：照旧让 pandas 报错
+    stats = None
+    if ctx is not None and ctx.stats is not None and ctx.is_source(df) and df.columns.is_unique:
+        stats = ctx.stats
+
+    ldesc = []
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        compute = lambda col=col: _plain_series(col).describe()  # noqa: E731
+        ldesc.append(stats.describe_column(str(df.columns[i]), compute) if stats is not None else compute())
+
+    names = _describe_order(ldesc)
+    out = pd.concat([x.reindex(names) for x in ldesc], axis=1, sort=False)
+    out.columns = df.columns.copy()
+    return out
+
+
+def tool_describe(df: pd.DataFrame, cols: list[str] | None = None, ctx: ToolContext | None = None) -> ToolResult:
+    if cols:
+        for c in cols:
+            if c not in df.columns:
+                return ToolResult(kind="text", value=f"ERROR: col not found: {c}", preview="col missing")
+        sub = df[list(dict.fromkeys(cols))]
+        # 原始 df 的列子集也算原始 df 的投影，统计目录照样能用
+        if ctx is not None and ctx.is_source(df):
+            ctx.source_views.append(sub)
+        df = sub
+    desc = _describe(df, ctx).fillna("")
     text = desc.to_string()[:1500]
     return ToolResult(kind="text", value=text, preview=text[:250])
 
 
-import pandas as pd
-
-def tool_groupby_sum(df: pd.DataFrame, group_col: str, value_cols: list[str]) -> ToolResult:
-    # 参数校验
-    if group_col not in df.columns:
-        return ToolResult(kind="text", value=f"ERROR: group_col not found: {group_col}", preview="group_col missing")
-    for c in value_cols:
-        if c not in df.columns:
-            return ToolResult(kind="text", value=f"ERROR: value_col not found: {c}", preview="value_col missing")
+# groupby_agg 支持的聚合；前四个按数值算（"1,234" 之类先清洗），count / nunique 看原始值
+AGG_FUNCS = ("sum", "mean", "min", "max", "count", "nunique")
+_NUMERIC_AGGS = frozenset({"sum", "mean", "min", "max"})
 
-    # 只保留需要的列，避免无关列干扰
-    tmp = df[[group_col] + value_cols].copy()
 
-    # ✅ 强制转数值：转不了就 NaN
-    for c in value_cols:
-        tmp[c] = pd.to_numeric(tmp[c], errors="coerce")
-
-    g = tmp.groupby(group_col, as_index=False)
-
-    # ✅ sum + count 配合：避免“全 NaN 的组”被 sum 成 0
-    sum_df = g[value_cols].sum()     # NaN 会被跳过
-    cnt_df = g[value_cols].count()   # count 不包含 NaN
-
-    # ✅ 若某组该列 count==0，说明全部缺失，把 sum 的 0 改回缺失
-    for c in value_cols:
-        mask_all_missing = cnt_df[c] == 0
-        sum_df.loc[mask_all_missing, c] = pd.NA
-
-    return ToolResult(kind="table", value=sum_df, preview=_df_preview(sum_df))
-
-
-def tool_groupby_mean(df: pd.DataFrame, group_col: str, value_cols: list[str]) -> ToolResult:
-    if group_col not in df.columns:
-        return ToolResult(kind="text", value=f"ERROR: group_col not found: {group_col}", preview="group_col missing")
+def tool_groupby_agg(
+    df: pd.DataFrame,
+    group_by: str | list[str],
+    value_cols: list[str],
+    aggs: list[str] | None = None,
+    ctx: ToolContext | None = None,
+) -> ToolResult:
+    """
+    一次分组、多个聚合：分组键只 factorize 一次，每个聚合都是同一个 groupby 对象上的 cython 归约。
+    sum 用 min_count=1，全 NaN 的组结果是缺失而不是 0。
+    只有一个聚合时输出列名就是原列名（和 groupby_sum / groupby_mean 一样），多个时是 列名_聚合。
+    """
+    keys = [group_by] if isinstance(group_by, str) else list(group_by)
+    aggs = list(aggs or ["sum"])
+    if not keys:
+        return ToolResult(kind="text", value="ERROR: group_by is empty", preview="group_by missing")
+    for k in keys:
+        if k not in df.columns:
+            return ToolResult(kind="text", value=f"ERROR: group_col not found: {k}", preview="group_col missing")
     for c in value_cols:
         if c not in df.columns:
             return ToolResult(kind="text", value=f"ERROR: value_col not found: {c}", preview="value_col missing")
+    for a in aggs:
+        if a not in AGG_FUNCS:
+            return ToolResult(kind="text", value=f"ERROR: unsupported agg: {a}", preview="agg unsupported")
+
+    # 内部列名用位置编号：分组键和值列重名、同一列既要数值又要原始值都不冲突
+    want_num = any(a in _NUMERIC_AGGS for a in aggs)
+    want_raw = any(a not in _NUMERIC_AGGS for a in aggs)
+    data: dict[str, pd.Series] = {}
+    for i, k in enumerate(keys):
+        data[f"__k{i}"] = _plain_series(df[k])
+    for j, c in enumerate(value_cols):
+        if want_num:
+            data[f"__n{j}"] = _numeric(df, c, ctx)
+        if want_raw:
+            data[f"__r{j}"] = _plain_series(df[c])
+    tmp = pd.DataFrame(data)
+
+    g = tmp.groupby([f"__k{i}" for i in range(len(keys))])
+    single = len(aggs) == 1
+    out: dict[str, pd.Series] = {}
+    for j, c in enumerate(value_cols):
+        for a in aggs:
+            if a in _NUMERIC_AGGS:
+                col = g[f"__n{j}"]
+                s_out = col.sum(min_count=1) if a == "sum" else getattr(col, a)()
+            else:
+                s_out = getattr(g[f"__r{j}"], a)()
+            name = c if single and c not in keys else f"{c}_{a}"
+            out[name] = s_out
+
+    res = pd.DataFrame(out) if out else g.size().to_frame("count")
+    res.index.names = keys
+    res = res.reset_index()
+    return ToolResult(kind="table", value=res, preview=_df_preview(res))
+
+
+def tool_groupby_sum(
+    df: pd.DataFrame,
+    group_col: str,
+    value_cols: list[str],
+    ctx: ToolContext | None = None,
+) -> ToolResult:
+    # 老接口：等价于 groupby_agg(aggs=["sum"])，留着给已经记下来的计划 / 调用方
+    return tool_groupby_agg(df, group_col, value_cols, ["sum"], ctx=ctx)
+
 
-    g = df.groupby(group_col)[value_cols].mean(numeric_only=True).reset_index()
-    return ToolResult(kind="table", value=g, preview=_df_preview(g))
+def tool_groupby_mean(
+    df: pd.DataFrame,
+    group_col: str,
+    value_cols: list[str],
+    ctx: ToolContext | None = None,
+) -> ToolResult:
+    # 老接口：现在也会先把值列清洗成数值（以前文本列直接被 numeric_only 丢掉）
+    return tool_groupby_agg(df, group_col, value_cols, ["mean"], ctx=ctx)
+
+
+def _stable_positions(values: np.ndarray, ascending: bool) -> np.ndarray:
+    # 降序也要保持原始顺序：反着排再翻回来（和 pandas kind="stable" 一致）
+    if ascending:
+        return np.argsort(values, kind="stable")
+    n = len(values)
+    return (n - 1 - np.argsort(values[::-1], kind="stable"))[::-1]
+
+
+def _top_k_positions(key: pd.Series, ascending: bool, k: int) -> np.ndarray | None:
+    """
+    等价于 key.sort_values(ascending, kind="stable", na_position="last") 的前 k 个位置，
+    但只对进入前 k 的候选行排序（np.partition 找第 k 个值）。
+    非数值 / 时间的键返回 None，调用方退回完整排序。
+    """
+    if pd.api.types.is_datetime64_any_dtype(key) and not isinstance(key.dtype, pd.DatetimeTZDtype):
+        mask = key.isna().to_numpy()
+        values = key.to_numpy().view(np.int64)
+    elif pd.api.types.is_numeric_dtype(key) and not pd.api.types.is_bool_dtype(key):
+        arr = pd.to_numeric(key, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        mask = np.isnan(arr)
+        values = key.to_numpy() if key.dtype.kind in "iu" else arr
+    else:
+        return None
+
+    valid = np.flatnonzero(~mask)
+    vv = values[valid]
+    if len(vv) > k:
+        # 第 k 名的值：比它好的全要，和它相等的按原始顺序补够 k 个
+        kth = np.partition(vv, k - 1)[k - 1] if ascending else np.partition(vv, len(vv) - k)[len(vv) - k]
+        better = vv < kth if ascending else vv > kth
+        ties = np.flatnonzero(vv == kth)[: k - int(better.sum())]
+        keep = np.sort(np.concatenate([np.flatnonzero(better), ties]))
+        valid, vv = valid[keep], vv[keep]
+    ordered = valid[_stable_positions(vv, ascending)]
+    if len(ordered) < k:
+        ordered = np.concatenate([ordered, np.flatnonzero(mask)[: k - len(ordered)]])
+    return ordered
+
+
+def _sort_rows(df: pd.DataFrame, key: pd.Series, ascending: bool, limit: int | None = None) -> pd.DataFrame:
+    """按 key 稳定排序（缺失值在最后）；给了 limit 就只取前 limit 行（top-k，不做全量排序）。"""
+    if limit is not None and limit < len(df):
+        pos = _top_k_positions(key, ascending, int(limit))
+        if pos is not None:
+            return df.iloc[pos]
+    order = key.reset_index(drop=True).sort_values(ascending=ascending, kind="stable", na_position="last").index
+    out = df.iloc[order.to_numpy()]
+    return out if limit is None else out.head(int(limit))
+
+
+def tool_sort(df: pd.DataFrame, by: str, ascending: bool = False, limit: int | None = None) -> ToolResult:
+    if by not in df.columns:
+        return ToolResult(kind="text", value=f"ERROR: sort key not found: {by}", preview="sort key missing")
+    out = _sort_rows(df, _plain_series(df[by]), ascending=ascending, limit=limit)
+    return ToolResult(kind="table", value=out, preview=_df_preview(out))
 
 
-def tool_sort(df: pd.DataFrame, by: str, ascending: bool = False) -> ToolResult:
+def tool_top_k(
+    df: pd.DataFrame,
+    by: str,
+    k: int = 1,
+    ascending: bool = False,
+    ctx: ToolContext | None = None,
+) -> ToolResult:
+    """
+    按 by 取前 k 行（ascending=False 是最大的 k 个）：np.partition 选出候选再只排这 k 个，
+    结果和 sort_values(kind="stable", na_position="last").head(k) 逐行一致——并列按原始顺序，缺失值排最后。
+    by 是（清洗后的）数值列就按数值比；整列都转不成数才按原值比。
+    """
     if by not in df.columns:
         return ToolResult(kind="text", value=f"ERROR: sort key not found: {by}", preview="sort key missing")
-    out = df.sort_values(by=by, ascending=ascending)
+    k = max(1, int(k))
+    key = _numeric(df, by, ctx)
+    if key.isna().all() and df[by].notna().any():
+        key = _plain_series(df[by])
+    out = _sort_rows(df, key, ascending=bool(ascending), limit=k)
     return ToolResult(kind="table", value=out, preview=_df_preview(out))
 
 
@@ -97,7 +308,18 @@ def tool_pick_top1(df: pd.DataFrame, key_col: str) -> ToolResult:
     return ToolResult(kind="json", value=row, preview=str(row)[:250])
 
 
-def tool_sum_numeric(df: pd.DataFrame, cols: list[str] | None = None) -> ToolResult:
+def _catalog(df: pd.DataFrame, ctx: ToolContext | None) -> StatsCatalog | None:
+    """原始 df（或它的列投影）且列名不重复时才能直接用入库时算好的列聚合。"""
+    if ctx is None or ctx.stats is None or not ctx.stats.aggregates:
+        return None
+    if not ctx.is_source(df) or df.columns.has_duplicates:
+        return None
+    return ctx.stats
+
+
+def tool_sum_numeric(
+    df: pd.DataFrame, cols: list[str] | None = None, ctx: ToolContext | None = None
+) -> ToolResult:
     if cols:
         for c in cols:
             if c not in df.columns:
@@ -106,73 +328,237 @@ def tool_sum_numeric(df: pd.DataFrame, cols: list[str] | None = None) -> ToolRes
     else:
         target = df
 
-    s = target.sum(numeric_only=True).to_dict()
+    s = None
+    stats = _catalog(df, ctx)
+    if stats is not None and not target.columns.has_duplicates:
+        s = stats.native_series([str(c) for c in target.columns], "sum")
+    if s is None:
+        s = target.sum(numeric_only=True)
+    s = s.to_dict()
     text = "\n".join([f"- {k}: {v}" for k, v in s.items()]) or "没有可求和的数值列。"
     return ToolResult(kind="text", value=text, preview=text[:250])
 
-def _month_to_num(val: str):
-    s = str(val).strip().lower()
-    m = {
-        "jan": 1, "january": 1,
-        "feb": 2, "february": 2,
-        "mar": 3, "march": 3,
-        "apr": 4, "april": 4,
-        "may": 5,
-        "jun": 6, "june": 6,
-        "jul": 7, "july": 7,
-        "aug": 8, "august": 8,
-        "sep": 9, "sept": 9, "september": 9,
-        "oct": 10, "october": 10,
-        "nov": 11, "november": 11,
-        "dec": 12, "december": 12,
-    }
-    if s in m:
-        return m[s]
-    mm = re.match(r"^(\d{1,2})\s*月$", s)
-    if mm:
-        n = int(mm.group(1))
-        if 1 <= n <= 12:
-            return n
-    if s.isdigit():
-        n = int(s)
-        if 1 <= n <= 12:
-            return n
-    return None
-
-
-def tool_sort_time(df: pd.DataFrame, by: str) -> ToolResult:
-    if by not in df.columns:
-        return ToolResult(kind="text", value=f"ERROR: sort key not found: {by}", preview="sort key missing")
 
-    col = df[by]
+# column_stats 能要的统计量；分位数 / distinct 在大表上是近似的，输出里带 ≈
+COLUMN_STATS = ("count", "null_count", "distinct", "sum", "mean", "min", "max", "25%", "50%", "75%")
+_DEFAULT_COLUMN_STATS = ("count", "mean", "min", "max")
+
+
+def tool_column_stats(
+    df: pd.DataFrame,
+    cols: list[str] | None = None,
+    stats: list[str] | None = None,
+    ctx: ToolContext | None = None,
+) -> ToolResult:
+    """
+    逐列的汇总统计。原始 df 直接读入库时算好的列聚合（不扫数据），派生表现算。
+    字符串数值列（"1,200"）在原始 df 上也有数值统计（schema 目录的影子列）。
+    没给 cols 就是所有数值列。
+    """
+    stats = list(stats or _DEFAULT_COLUMN_STATS)
+    for st in stats:
+        if st not in COLUMN_STATS:
+            return ToolResult(kind="text", value=f"ERROR: unsupported stat: {st}", preview="bad stat")
+    for c in cols or []:
+        if c not in df.columns:
+            return ToolResult(kind="text", value=f"ERROR: col not found: {c}", preview="col missing")
+
+    catalog = _catalog(df, ctx)
+    if catalog is not None:
+        aggs = catalog.aggregates
+    else:
+        sub = df[list(dict.fromkeys(cols))] if cols else df
+        aggs = compute_aggregates(sub)
+    names = [str(c) for c in dict.fromkeys(cols)] if cols else [k for k, a in aggs.items() if a.numeric]
+
+    lines = []
+    for name in names:
+        a = aggs[name]
+        parts = []
+        for st in stats:
+            v = a.get(st)
+            if v is None:  # 非数值列没有 sum/mean/...
+                continue
+            approx = (st == "distinct" and not a.distinct_exact) or (st.endswith("%") and not a.quantiles_exact)
+            parts.append(f"{st}{'≈' if approx else '='}{v}")
+        lines.append(f"- {name}: " + (", ".join(parts) or "（非数值列）"))
+    text = "\n".join(lines) or "没有数值列。"
+    return ToolResult(kind="text", value=text, preview=text[:250])
+
 
-    # 1) 先尝试 datetime
+def _time_sort_key(df: pd.DataFrame, by: str, ctx: ToolContext | None) -> pd.Series:
+    """sort_time 的排序键：datetime > 月份映射 > 原值（解析得出来的占比要 > 0.6）。"""
+    if ctx is not None and ctx.schema is not None:
+        # 0) 原始 df：入库时已经算好排序键 / 已知不是时间列，就不用再逐个解析
+        if ctx.is_source(df):
+            key = ctx.schema.time.get(by)
+            if key is not None:
+                return key
+            if ctx.schema.kind(by) in (KIND_CATEGORICAL, KIND_TEXT, KIND_EMPTY):
+                return _plain_series(df[by])
+        # 1) 派生表（groupby 之后的月份列之类）：取值都在入库时的查找表里，直接查
+        lookup = ctx.schema.time_lookup.get(by)
+        if lookup is not None:
+            col = _plain_series(df[by])
+            codes = lookup.codes_for(col)
+            if codes is not None:
+                key = lookup.key(codes, col)
+                return col if key is None else key
+
+    # 2) 没有目录：现场解析（同样是先 datetime 再月份，只解析去重后的取值）
+    col = _plain_series(df[by])
     try:
-        dt = pd.to_datetime(col, errors="coerce")
-        if dt.notna().mean() > 0.6:
-            out = df.assign(__t=dt).sort_values("__t").drop(columns="__t")
-            return ToolResult(kind="table", value=out, preview=_df_preview(out))
-    except Exception:
-        pass
-
-    # 2) 再尝试月份映射（Jan/Feb/… 或 1月）
+        key = time_key(col)
+    except (TypeError, ValueError, OverflowError):
+        key = None
+    return col if key is None else key
+
+
+# filter 支持的谓词；多个谓词之间是 AND
+FILTER_OPS = ("eq", "in", "gt", "ge", "lt", "le", "between")
+_RANGE_OPS = frozenset({"gt", "ge", "lt", "le", "between"})
+
+
+def _filter_key(df: pd.DataFrame, col: str, ctx: ToolContext | None) -> tuple[str, np.ndarray, np.ndarray]:
+    """
+    谓词比较用的键：(模式, 键, 非空掩码)。
+    - time：datetime 列，按纳秒整数比
+    - num：原生数值列 / schema 认定的字符串数值列（"1,200"），按清洗后的 float 比
+    - text：其它列，按 str(v) 比，只支持 eq / in
+    """
+    s = df[col]
+    if pd.api.types.is_datetime64_any_dtype(s):
+        keys = pd.DatetimeIndex(s).as_unit("ns").asi8
+        return "time", keys, s.notna().to_numpy()
+    is_num = pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)
+    if is_num or (ctx is not None and ctx.schema is not None and col in ctx.schema.numeric):
+        keys = _numeric(df, col, ctx).to_numpy(dtype=np.float64, na_value=np.nan)
+        return "num", keys, ~np.isnan(keys)
+    labels = np.array(encode_labels(s), dtype=object)
+    return "text", labels, pd.notna(labels)
+
+
+def _filter_value(mode: str, v: Any, tz: Any) -> Any:
+    if mode == "num":
+        return float(v)
+    if mode == "time":
+        ts = pd.Timestamp(v)
+        if tz is not None and ts.tz is None:
+            ts = ts.tz_localize(tz)
+        return ts.as_unit("ns").value
+    return str(v)
+
+
+def _filter_bounds(op: str, vals: list[Any]) -> tuple[Any, Any, bool, bool]:
+    """范围谓词 -> (下界, 上界, 含下界, 含上界)。"""
+    if op == "between":
+        return vals[0], vals[1], True, True
+    if op in ("gt", "ge"):
+        return vals[0], None, op == "ge", True
+    return None, vals[0], True, op == "le"
+
+
+def _filter_positions(
+    df: pd.DataFrame, pred: dict[str, Any], ctx: ToolContext | None
+) -> np.ndarray | str:
+    """一个谓词命中的行号（升序）；参数不对返回错误文本。"""
+    col, op, value = pred.get("col"), pred.get("op", "eq"), pred.get("value")
+    if col not in df.columns:
+        return f"ERROR: col not found: {col}"
+    if op not in FILTER_OPS:
+        return f"ERROR: unsupported op: {op}"
+    raw = list(value) if op in ("in", "between") and isinstance(value, (list, tuple)) else [value]
+    if op == "between" and len(raw) != 2:
+        return "ERROR: between needs [low, high]"
+
+    mode, keys, valid = _filter_key(df, col, ctx)
+    if mode == "text" and op in _RANGE_OPS:
+        return f"ERROR: range filter on non-numeric column: {col}"
+    tz = getattr(df[col].dtype, "tz", None)
     try:
-        mapped = col.map(_month_to_num)
-        if mapped.notna().mean() > 0.6:
-            out = df.assign(__t=mapped).sort_values("__t").drop(columns="__t")
-            return ToolResult(kind="table", value=out, preview=_df_preview(out))
-    except Exception:
-        pass
-
-    # 3) 退回普通排序
-    out = df.sort_values(by=by, ascending=True)
+        vals = [_filter_value(mode, v, tz) for v in raw]
+    except (TypeError, ValueError):
+        return f"ERROR: bad filter value for {col}: {value}"
+
+    # 原始 df：走（懒建的）列索引
+    if ctx is not None and ctx.indexes is not None and ctx.is_source(df):
+        if mode == "text":
+            ix = ctx.indexes.get("hash", col, lambda: HashIndex.build(keys))
+            return np.sort(ix.lookup(vals))
+        ix = ctx.indexes.get("sorted", col, lambda: SortedIndex.build(keys, valid))
+        if op in _RANGE_OPS:
+            hits = ix.range(*_filter_bounds(op, vals))
+        else:
+            hits = np.concatenate([ix.range(v, v) for v in vals])
+        return np.unique(hits)
+
+    # 派生表：扫一遍
+    if mode == "text":
+        mask = pd.Series(keys).isin(vals).to_numpy()
+    elif op in _RANGE_OPS:
+        lo, hi, lo_inc, hi_inc = _filter_bounds(op, vals)
+        mask = valid.copy()
+        if lo is not None:
+            mask &= keys >= lo if lo_inc else keys > lo
+        if hi is not None:
+            mask &= keys <= hi if hi_inc else keys < hi
+    else:
+        mask = valid & np.isin(keys, vals)
+    return np.flatnonzero(mask)
+
+
+def tool_filter(
+    df: pd.DataFrame,
+    where: list[dict[str, Any]] | dict[str, Any],
+    ctx: ToolContext | None = None,
+) -> ToolResult:
+    """
+    按谓词过滤行，保持原顺序。where 是 {"col", "op", "value"} 的列表（AND）：
+    eq / in（value 是列表）/ gt / ge / lt / le / between（value 是 [low, high]，两端都含）。
+    原始 df 上用 upload 级的列索引（范围走排序索引，等值走哈希索引），派生表直接扫；两条路结果一样。
+    """
+    preds = [where] if isinstance(where, dict) else list(where or [])
+    if not preds:
+        return ToolResult(kind="text", value="ERROR: where is empty", preview="where missing")
+
+    pos: np.ndarray | None = None
+    for pred in preds:
+        hits = _filter_positions(df, pred, ctx)
+        if isinstance(hits, str):
+            return ToolResult(kind="text", value=hits, preview=hits[:250])
+        pos = hits if pos is None else np.intersect1d(pos, hits, assume_unique=True)
+    out = df.iloc[pos]
     return ToolResult(kind="table", value=out, preview=_df_preview(out))
 
+
+def tool_sort_time(
+    df: pd.DataFrame,
+    by: str,
+    ctx: ToolContext | None = None,
+    limit: int | None = None,
+) -> ToolResult:
+    if by not in df.columns:
+        return ToolResult(kind="text", value=f"ERROR: sort key not found: {by}", preview="sort key missing")
+
+    out = _sort_rows(df, _time_sort_key(df, by, ctx), ascending=True, limit=limit)
+    return ToolResult(kind="table", value=out, preview=_df_preview(out))
+
+def _chart_points(
+    ys: list[np.ndarray], max_points: int, downsample: str
+) -> tuple[np.ndarray, dict[str, Any]]:
+    """挑要画的行位置，顺便生成 spec 里的 downsample 说明（原始点数 / 实际点数）。"""
+    n = len(ys[0]) if ys else 0
+    pos = downsample_rows(ys, max_points, downsample)
+    return pos, {"method": downsample if n > max_points else "none", "original_points": n, "points": int(len(pos))}
+
+
 def tool_chart_line(
     df: pd.DataFrame,
     x_col: str,
     y_cols: list[str],
     max_points: int = 200,
+    ctx: ToolContext | None = None,
+    downsample: str = "lttb",
 ) -> ToolResult:
     # 参数校验
     if x_col not in df.columns:
@@ -180,50 +566,59 @@ def tool_chart_line(
     for c in y_cols:
         if c not in df.columns:
             return ToolResult(kind="text", value=f"ERROR: y_col not found: {c}", preview="y_col missing")
+    if downsample not in DOWNSAMPLE_MODES:
+        return ToolResult(kind="text", value=f"ERROR: unknown downsample: {downsample}", preview="downsample unknown")
 
-    # 截断点数（但不做 dropna！）
-    d = df[[x_col] + y_cols].copy().head(max_points)
+    # 点数超预算时降采样（整条曲线的形状都在），不做 dropna：缺失点照样留着当断口
+    ys_all = [_numeric(df, c, ctx).to_numpy(dtype=float, na_value=np.nan) for c in y_cols]
+    pos, info = _chart_points(ys_all, max_points, downsample)
 
-    # x：保留所有点；缺失则 None；其余转成 str（稳定）
-    xs_raw = d[x_col].tolist()
-    xs = [None if pd.isna(v) else str(v) for v in xs_raw]
-
-    series = []
-    for c in y_cols:
-        ys_raw = pd.to_numeric(d[c], errors="coerce").tolist()
-        ys = [None if (v is None or (isinstance(v, float) and pd.isna(v))) else float(v) for v in ys_raw]
-        series.append({"name": str(c), "values": ys})
-
-    # 如果所有 y 全是 None，就没必要画了
-    if all(all(v is None for v in s["values"]) for s in series):
+    # 如果所有 y 全是缺失，就没必要画了
+    if all(np.isnan(y[pos]).all() for y in ys_all):
         return ToolResult(kind="text", value="ERROR: all series values are missing", preview="all missing")
 
+    # x：保留所有点；缺失则 None；其余转成 str（稳定）
+    xs = encode_labels(df[x_col].iloc[pos])
+    series = [{"name": str(c), "values": encode_floats(y[pos])} for c, y in zip(y_cols, ys_all)]
+
     spec = {
         "type": "line",
         "x": {"name": str(x_col), "values": xs},
         "series": series,
+        "downsample": info,
     }
-    return ToolResult(kind="chart", value=spec, preview=f"line x={x_col} y={y_cols}")
+    return ToolResult(
+        kind="chart",
+        value=spec,
+        preview=f"line x={x_col} y={y_cols} points={info['points']}/{info['original_points']}",
+    )
 
 
 
-def tool_chart_line_index(df: pd.DataFrame, y_cols: list[str], max_points: int = 200) -> ToolResult:
+def tool_chart_line_index(
+    df: pd.DataFrame,
+    y_cols: list[str],
+    max_points: int = 200,
+    ctx: ToolContext | None = None,
+    downsample: str = "lttb",
+) -> ToolResult:
     for c in y_cols:
         if c not in df.columns:
             return ToolResult(kind="text", value=f"ERROR: y_col not found: {c}", preview="y_col missing")
+    if downsample not in DOWNSAMPLE_MODES:
+        return ToolResult(kind="text", value=f"ERROR: unknown downsample: {downsample}", preview="downsample unknown")
 
-    n = min(len(df), max_points)
-    x = list(range(1, n + 1))
+    ys_all = [_numeric(df, c, ctx).to_numpy(dtype=float, na_value=np.nan) for c in y_cols]
+    pos, info = _chart_points(ys_all, max_points, downsample)
+    # x 还是原来的行号（从 1 开始），降采样后不连续
+    x = (pos + 1).tolist()
 
-    series = []
-    for c in y_cols:
-        ys = pd.to_numeric(df[c], errors="coerce").tolist()[:n]
-        ys = [None if (v is None or (isinstance(v, float) and pd.isna(v))) else float(v) for v in ys]
-        series.append({"name": str(c), "values": ys})
+    series = [{"name": str(c), "values": encode_floats(y[pos])} for c, y in zip(y_cols, ys_all)]
 
     spec = {
         "type": "line",
         "x": {"name": "index", "values": x},
         "series": series,
+        "downsample": info,
     }
     return ToolResult(kind="chart", value=spec, preview=f"line chart by index: series={[s['name'] for s in series]}")
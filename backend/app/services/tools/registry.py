@@ -1,7 +1,14 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from app.services.index_catalog import IndexCatalog
+    from app.services.schema_catalog import SchemaCatalog
+    from app.services.stats_catalog import StatsCatalog
 
 
 @dataclass
@@ -11,17 +18,78 @@ class ToolResult:
     preview: str            # 给 debug 用的短预览
 
 
+@dataclass
+class ToolContext:
+    """
+    一次请求里所有工具共享的上下文：上传的原始 df + 入库时算好的 schema 目录 + 统计目录 + 列索引。
+    影子列和原始 df 按 index 对齐，所以只有工具拿到的正好是原始 df 时才能直接用。
+    """
+    source_df: Optional["pd.DataFrame"] = None
+    schema: Optional["SchemaCatalog"] = None
+    # 入库时算好的列聚合 + 按列缓存的 describe（同一个 upload 的所有请求共用）
+    stats: Optional["StatsCatalog"] = None
+    # filter 用的列索引（懒建，跟着缓存条目走）
+    indexes: Optional["IndexCatalog"] = None
+    # 执行计划对原始 df 做的列投影（行没动，影子列照样对得上）
+    source_views: list["pd.DataFrame"] = field(default_factory=list)
+    # 上传内容的标识（content_hash）：工具结果缓存的 key 前缀，为空就不走缓存
+    fingerprint: Optional[str] = None
+
+    def is_source(self, df: "pd.DataFrame") -> bool:
+        if self.source_df is None:
+            return False
+        return df is self.source_df or any(df is v for v in self.source_views)
+
+
 ToolFn = Callable[..., ToolResult]
 
 
 class ToolRegistry:
     def __init__(self) -> None:
         self._tools: dict[str, ToolFn] = {}
+        self._uses_ctx: set[str] = set()
+        self._no_cache: set[str] = set()
+        self._timeouts: dict[str, float] = {}
 
-    def register(self, name: str, fn: ToolFn) -> None:
+    def register(
+        self,
+        name: str,
+        fn: ToolFn,
+        *,
+        uses_ctx: bool = False,
+        cacheable: bool = True,
+        timeout_s: Optional[float] = None,
+    ) -> None:
         if name in self._tools:
             raise ValueError(f"tool already registered: {name}")
         self._tools[name] = fn
+        if uses_ctx:
+            self._uses_ctx.add(name)
+        if not cacheable:
+            self._no_cache.add(name)
+        if timeout_s is not None:
+            self._timeouts[name] = float(timeout_s)
+
+    def cacheable(self, name: str) -> bool:
+        """结果能不能进工具结果缓存（有副作用 / 比查缓存还便宜的工具注册时关掉）。"""
+        return name not in self._no_cache
+
+    def timeout(self, name: str) -> Optional[float]:
+        """注册时单独指定的超时（秒）；None 表示用全局的 TOOL_TIMEOUT_S。"""
+        return self._timeouts.get(name)
+
+    def invoke(
+        self,
+        name: str,
+        df: "pd.DataFrame",
+        args: dict[str, Any],
+        ctx: Optional[ToolContext] = None,
+    ) -> ToolResult:
+        # 只有声明了 uses_ctx 的工具才会收到 ctx，老工具签名不用动
+        fn = self.get(name)
+        if name in self._uses_ctx:
+            return fn(df, ctx=ctx, **args)
+        return fn(df, **args)
 
     def get(self, name: str) -> ToolFn:
         if name not in self._tools:
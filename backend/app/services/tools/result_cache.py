@@ -0,0 +1,159 @@
+"""
+工具结果缓存：不同问题经常共用前缀（describe、同一组列的 groupby_sum……），
+同一份内容上算过的就直接拿。
+
+key = (上传内容标识, 工具名, 规范化后的参数, 输入表的血缘)
+- 内容标识是 content_hash，文件内容不可变，所以不用失效，只按预算淘汰
+- 血缘：原始 df 是 "src"；投影记成 (父血缘, 列)；某一步输出的表，血缘就是那一步的 key。
+  同样的工具 + 参数作用在不同的中间表上不会串
+- 按字节预算（TOOL_CACHE_MAX_MB）做 LRU，大小按 DataFrame.memory_usage / 文本长度估算
+- 注册时 cacheable=False 的工具不缓存
+
+缓存里的值是只读的：表格存一份独立拷贝并把底层数组设成不可写，取出时给浅拷贝，
+下游换列 / 重新赋值不影响缓存，原地改值会直接报错；dict（图表 / json）取出时深拷贝。
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import get_settings
+
+from .registry import ToolResult
+
+SOURCE_LINEAGE = "src"
+
+
+def canonical_args(args: dict[str, Any]) -> str:
+    return json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def result_key(fingerprint: str, tool: str, args: dict[str, Any], lineage: Hashable) -> tuple:
+    return (fingerprint, tool, canonical_args(args), lineage)
+
+
+def projection_lineage(parent: Hashable, columns: list[str]) -> tuple:
+    return ("project", parent, tuple(columns))
+
+
+def estimate_result_bytes(res: ToolResult) -> int:
+    v = res.value
+    if isinstance(v, pd.DataFrame):
+        n = int(v.memory_usage(index=True, deep=True).sum())
+    elif isinstance(v, str):
+        n = len(v.encode("utf-8"))
+    else:
+        try:
+            n = len(json.dumps(v, default=str))
+        except (TypeError, ValueError):
+            n = 1024
+    return n + len(res.preview.encode("utf-8"))
+
+
+def _freeze_frame(df: pd.DataFrame) -> pd.DataFrame:
+    frozen = df.copy(deep=True)
+    # pandas 没有公开的只读 DataFrame：把每个 block 的 numpy 数组设成不可写
+    for blk in getattr(frozen._mgr, "blocks", ()):
+        values = getattr(blk, "values", None)
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+    return frozen
+
+
+def _freeze(res: ToolResult) -> ToolResult:
+    if isinstance(res.value, pd.DataFrame):
+        return ToolResult(kind=res.kind, value=_freeze_frame(res.value), preview=res.preview)
+    if isinstance(res.value, (dict, list)):
+        return ToolResult(kind=res.kind, value=copy.deepcopy(res.value), preview=res.preview)
+    return res
+
+
+def _thaw(res: ToolResult) -> ToolResult:
+    if isinstance(res.value, pd.DataFrame):
+        return ToolResult(kind=res.kind, value=res.value.copy(deep=False), preview=res.preview)
+    if isinstance(res.value, (dict, list)):
+        return ToolResult(kind=res.kind, value=copy.deepcopy(res.value), preview=res.preview)
+    return res
+
+
+def _default_max_bytes() -> int:
+    return int(get_settings().tool_cache_max_mb) * 1024 * 1024
+
+
+@dataclass
+class _Entry:
+    result: ToolResult
+    nbytes: int
+
+
+class ToolResultCache:
+    def __init__(self, max_bytes: Optional[Callable[[], int]] = None) -> None:
+        self._max_bytes = max_bytes or _default_max_bytes
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def enabled(self) -> bool:
+        return int(self._max_bytes()) > 0
+
+    def get(self, key: tuple) -> Optional[ToolResult]:
+        with self._lock:
+            e = self._entries.get(key)
+            if e is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _thaw(e.result)
+
+    def put(self, key: tuple, res: ToolResult) -> None:
+        budget = int(self._max_bytes())
+        nbytes = estimate_result_bytes(res)
+        if budget <= 0 or nbytes > budget:
+            return  # 单个结果就超预算：不缓存，免得把别的全挤掉
+        frozen = _freeze(res)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = _Entry(frozen, nbytes)
+            self._bytes += nbytes
+            while self._bytes > budget and self._entries:
+                _, e = self._entries.popitem(last=False)
+                self._bytes -= e.nbytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": int(self._max_bytes()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+tool_result_cache = ToolResultCache()
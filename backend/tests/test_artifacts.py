@@ -0,0 +1,97 @@
+import base64
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.config import get_settings
+from app.services.agent_service import AgentService
+from app.services.artifacts import encode_floats, encode_labels, table_artifact
+from app.services.planner import ToolCall
+from app.services.sidecar import frame_from_arrow_bytes, pa
+
+
+def test_vectorized_encoders_match_per_element_conversion():
+    y = np.array([1.0, np.nan, 2.5, -0.1])
+    assert encode_floats(y) == [1.0, None, 2.5, -0.1]
+
+    cols = [
+        pd.Series(["Jan", None, "Mar", 3]),
+        pd.Series([1, 2, 3]),
+        pd.Series([0.1, np.nan, 1e20]),
+        pd.to_datetime(pd.Series(["2024-01-01 00:00", None, "2024-03-05 12:30"])),
+        pd.Series(["a", None, "b"], dtype="category"),
+    ]
+    for s in cols:
+        assert encode_labels(s) == [None if pd.isna(v) else str(v) for v in s.tolist()]
+
+
+def test_table_artifact_is_columnar_and_bounded():
+    df = pd.DataFrame(
+        {
+            "地区": ["华东", None, "华南"],
+            "销售额": [1.5, np.nan, 3.0],
+            "单数": [1, 2, 3],
+            "日期": pd.to_datetime(["2024-01-01", None, "2024-01-03"]),
+        }
+    )
+    art = table_artifact(df, max_rows=2)
+    assert art["columns"] == ["地区", "销售额", "单数", "日期"]
+    assert art["rows"] == 2 and art["total_rows"] == 3 and art["encoding"] == "json"
+    assert art["data"] == [["华东", None], [1.5, None], [1, 2], ["2024-01-01T00:00:00", None]]
+
+    records = json.dumps(df.head(2).astype(object).where(df.head(2).notna(), None).to_dict(orient="records"), default=str)
+    assert len(json.dumps(art["data"])) < len(records)
+
+
+@pytest.mark.skipif(pa is None, reason="pyarrow not installed")
+def test_large_tables_can_ship_as_arrow():
+    os.environ["ARTIFACT_ARROW"] = "true"
+    os.environ["ARTIFACT_ARROW_MIN_ROWS"] = "10"
+    get_settings.cache_clear()
+    try:
+        df = pd.DataFrame({"v": np.arange(50, dtype=float), "k": [f"r{i}" for i in range(50)]})
+        art = table_artifact(df)
+        assert art["encoding"] == "arrow" and "data" not in art
+        back = frame_from_arrow_bytes(base64.b64decode(art["arrow"]))
+        pd.testing.assert_frame_equal(back, df, check_dtype=False)
+        assert table_artifact(df.head(5))["encoding"] == "json"
+    finally:
+        os.environ.pop("ARTIFACT_ARROW", None)
+        os.environ.pop("ARTIFACT_ARROW_MIN_ROWS", None)
+        get_settings.cache_clear()
+
+
+@pytest.mark.skipif(pa is None, reason="pyarrow not installed")
+def test_arrow_kicks_in_with_default_thresholds():
+    # 只打开开关，行数上限 / 门槛都用默认值
+    os.environ["ARTIFACT_ARROW"] = "true"
+    get_settings.cache_clear()
+    try:
+        settings = get_settings()
+        df = pd.DataFrame({"v": np.arange(5000, dtype=float)})
+        art = table_artifact(df)
+        assert art["encoding"] == "arrow" and art["rows"] == settings.artifact_table_max_rows
+        assert len(frame_from_arrow_bytes(base64.b64decode(art["arrow"]))) == art["rows"]
+        # 被截满的表即使门槛配得比上限高也走 Arrow
+        assert table_artifact(df, max_rows=settings.artifact_arrow_min_rows // 2)["encoding"] == "arrow"
+        assert table_artifact(df.head(10))["encoding"] == "json"
+    finally:
+        os.environ.pop("ARTIFACT_ARROW", None)
+        get_settings.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_table_artifact_only_when_asked_or_too_long_for_the_reply():
+    df = pd.DataFrame({"k": [f"r{i}" for i in range(100)], "v": np.arange(100)})
+
+    async def tables(question, n):
+        out = await AgentService._run_tools({"df": df}, [ToolCall("head", {"n": n})], question=question)
+        return [a for a in out["artifacts"] if a["kind"] == "table"]
+
+    # 预览里已经全给了 LLM：回复里就有，不再带一份
+    assert await tables("前5行", 5) == []
+    assert [a["rows"] for a in await tables("列出前5行的明细", 5)] == [5]
+    assert [a["rows"] for a in await tables("前50行", 50)] == [50]
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from app.services.tools import pandas_tools as pt
+from app.services.tools.downsample import downsample_positions
+
+
+def test_lttb_keeps_late_peaks_and_records_counts():
+    n = 100_000
+    y = np.sin(np.linspace(0, 20, n))
+    y[90_000] = 50.0  # 最后 10% 里的尖峰：以前 head(200) 根本画不到
+    df = pd.DataFrame({"t": np.arange(n), "v": y})
+
+    spec = pt.tool_chart_line(df, "t", ["v"], max_points=200).value
+    assert spec["downsample"] == {"method": "lttb", "original_points": n, "points": 200}
+    assert len(spec["x"]["values"]) == len(spec["series"][0]["values"]) == 200
+    assert spec["x"]["values"][0] == "0" and spec["x"]["values"][-1] == str(n - 1)
+    assert 50.0 in spec["series"][0]["values"]
+
+    mm = pt.tool_chart_line_index(df, ["v"], max_points=200, downsample="minmax").value
+    assert mm["downsample"]["points"] <= 200 and 50.0 in mm["series"][0]["values"]
+
+    head = pt.tool_chart_line(df, "t", ["v"], max_points=200, downsample="head").value
+    assert head["x"]["values"][-1] == "199"
+
+
+def test_nan_gaps_survive_downsampling():
+    y = np.arange(10_000, dtype=float)
+    y[3_000:3_500] = np.nan
+    y[7_000:7_010] = np.nan
+    pos = downsample_positions(y, 100)
+    assert len(pos) <= 100
+    # 每段缺失都留了一个断口，首尾有值点都在
+    assert 3_000 in pos and 7_000 in pos
+    assert pos[0] == 0 and pos[-1] == 9_999
+
+
+def test_small_series_unchanged():
+    df = pd.DataFrame({"m": ["Jan", "Feb", "Mar"], "v": [1.0, None, 3.0]})
+    spec = pt.tool_chart_line(df, "m", ["v"]).value
+    assert spec["series"][0]["values"] == [1.0, None, 3.0]
+    assert spec["downsample"] == {"method": "none", "original_points": 3, "points": 3}
+
+
+def test_tiny_budgets_are_not_exceeded():
+    y = np.sin(np.linspace(0, 20, 1_000))
+    y[500:510] = np.nan
+    for mode in ("lttb", "minmax", "head"):
+        for budget in (1, 2, 3, 4):
+            assert len(downsample_positions(y, budget, mode)) <= budget
+    assert downsample_positions(y, 1).tolist() == [0]
+    assert downsample_positions(y, 2).tolist() == [0, 999]
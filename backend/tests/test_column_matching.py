@@ -9,3 +9,27 @@ def test_match_cols_completion_rate_synonym():
     m = _match_cols("按任务点完成率给出趋势图", cols)
     assert "任务点完成百分比" in m
 
+
+
+def test_column_matcher_matches_pairwise_scoring():
+    import random
+
+    from app.services.planner import ColumnMatcher
+
+    rng = random.Random(7)
+    base = ["任务点完成百分比", "课程视频进度", "班级", "分组", "学生姓名", "Sales", "月份", "销售额(万元)", "完成率", "A"]
+    cols = base + ["".join(rng.choice("销售额完成进度班级学生月份数量金额率") for _ in range(rng.randint(1, 8))) for _ in range(300)]
+    matcher = ColumnMatcher(cols)
+
+    questions = [
+        "按任务点完成率给出趋势图",
+        "sales 总和",
+        "哪个班级的学生最多？",
+        "销售额（万元）最高的月份",
+        "每月 完成-率 走势",
+        "a",
+        "",
+    ] + ["".join(rng.choice("销售额完成进度班级学生月份数量金额率的是多少") for _ in range(rng.randint(2, 20))) for _ in range(50)]
+
+    for q in questions:
+        assert matcher.match(q) == _match_cols(q, cols)
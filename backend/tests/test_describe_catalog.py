@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from app.services.planner import plan_tools
+from app.services.stats_catalog import StatsCatalog
+from app.services.tools import pandas_tools as pt
+from app.services.tools.registry import ToolContext
+
+
+def _frame(n=60):
+    rng = np.random.default_rng(5)
+    return pd.DataFrame(
+        {
+            "销售额": rng.random(n) * 100,
+            "地区": rng.choice(["华东", "华北", None], n),
+            "日期": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 90, n), "D"),
+            "数量": rng.integers(0, 9, n),
+            "达标": rng.random(n) < 0.5,
+            "空列": [np.nan] * n,
+        }
+    )
+
+
+def test_column_wise_describe_matches_pandas():
+    df = _frame()
+    for cols in [None, ["地区"], ["销售额", "地区"], ["日期", "达标"], ["空列"]]:
+        sub = df if cols is None else df[cols]
+        want = sub.describe(include="all").fillna("").to_string()[:1500]
+        assert pt.tool_describe(df, cols).value == want
+
+
+def test_describe_is_served_from_catalog_per_column():
+    df = _frame()
+    stats = StatsCatalog()
+    ctx = ToolContext(source_df=df, stats=stats)
+
+    first = pt.tool_describe(df, ["销售额", "地区"], ctx=ctx).value
+    assert stats.described_columns() == ["销售额", "地区"]  # 只算了子集
+    full = pt.tool_describe(df, ctx=ctx).value
+    assert set(stats.described_columns()) == set(df.columns)
+    assert full == pt.tool_describe(df).value
+
+    # 再来一次：全部命中，不重新计算
+    before = set(stats.described_columns())
+    assert pt.tool_describe(df, ["销售额", "地区"], ctx=ctx).value == first
+    assert set(stats.described_columns()) == before
+
+    # 派生表不走目录
+    assert pt.tool_describe(df.head(5), ctx=ctx).value == pt.tool_describe(df.head(5)).value
+
+
+def test_planner_scopes_describe_to_matched_columns():
+    df = _frame()
+    assert plan_tools(df, "地区的平均值")[0].args == {"cols": ["地区"]}
+    assert plan_tools(df, "随便看看")[-1].args == {}
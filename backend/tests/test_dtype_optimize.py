@@ -0,0 +1,76 @@
+import pandas as pd
+
+from app.services.excel_ingest import build_profile, materialize, optimize_dtypes, parse_upload
+from app.services.tools import pandas_tools as pt
+
+
+def _frame():
+    n = 60
+    return pd.DataFrame(
+        {
+            "month": (["Jan", "Feb", "Mar", "Apr", float("nan"), "Jun"] * 10)[:n],
+            "class": (["一班", "二班", "三班"] * 20)[:n],
+            "name": [f"学生{i}" for i in range(n)],
+            "score": [i % 7 for i in range(n)],
+            "sales": [float(i) if i % 5 else None for i in range(n)],
+            "note": [float("nan") if i % 4 else f"备注{i}" for i in range(n)],
+        }
+    )
+
+
+def _run_tools(df):
+    return [
+        pt.tool_profile(df),
+        pt.tool_describe(df),
+        pt.tool_head(df, n=8),
+        pt.tool_sum_numeric(df),
+        pt.tool_groupby_sum(df, "class", ["score", "sales"]),
+        pt.tool_groupby_mean(df, "month", ["sales"]),
+        pt.tool_sort(df, "score", ascending=False),
+        pt.tool_sort(df, "class", ascending=True),
+        pt.tool_sort_time(df, "month"),
+        pt.tool_chart_line(df, "month", ["score", "sales"]),
+        pt.tool_chart_line_index(df, ["class", "sales"]),
+    ]
+
+
+def test_optimize_dtypes_shrinks_memory():
+    df = _frame()
+    opt, report = optimize_dtypes(df)
+
+    assert report["saved_bytes"] > 0
+    assert report["after_bytes"] < report["before_bytes"]
+    assert str(opt["class"].dtype) == "category"
+    assert str(opt["score"].dtype) == "int8"
+    assert opt["sales"].dtype == df["sales"].dtype  # 浮点不动
+    assert build_profile(opt, report)["memory"] == report
+
+
+def test_tools_give_identical_results_after_optimize():
+    df = _frame()
+    opt, _ = optimize_dtypes(df)
+
+    for plain, slim in zip(_run_tools(df), _run_tools(opt)):
+        assert plain.kind == slim.kind
+        assert plain.preview == slim.preview
+        if plain.kind == "table":
+            pd.testing.assert_frame_equal(
+                plain.value.reset_index(drop=True),
+                slim.value.reset_index(drop=True),
+                check_dtype=False,
+                check_categorical=False,
+            )
+        else:
+            assert plain.value == slim.value
+
+
+def test_parse_upload_optimizes_and_sidecar_roundtrips(tmp_path):
+    src = tmp_path / "demo.xlsx"
+    _frame().to_excel(src, index=False, engine="openpyxl")
+
+    parsed = parse_upload(str(src), use_sidecar=True, in_process=False, optimize=True)
+    assert parsed.profile["memory"]["saved_bytes"] > 0
+
+    df = materialize(parsed, src)
+    assert str(df["class"].dtype) == "category"
+    assert pt.tool_describe(df).value == pt.tool_describe(pd.read_excel(src)).value
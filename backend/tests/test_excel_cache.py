@@ -0,0 +1,96 @@
+import pandas as pd
+
+from app.services.df_cache import DataFrameCache, estimate_item_bytes
+
+
+def _item(n: int) -> dict:
+    df = pd.DataFrame({"a": range(n), "b": ["x" * 10] * n})
+    return {"df": df, "profile": {"rows": n}}
+
+
+def test_lru_evicts_oldest_when_over_budget():
+    one = estimate_item_bytes(_item(1000))
+    cache = DataFrameCache(max_bytes=lambda: int(one * 2.5))
+
+    cache["u1"] = _item(1000)
+    cache["u2"] = _item(1000)
+    assert cache.get("u1") is not None  # u1 变成最近使用
+
+    cache["u3"] = _item(1000)
+    assert "u2" not in cache
+    assert "u1" in cache and "u3" in cache
+
+    st = cache.stats()
+    assert st["evictions"] == 1
+    assert st["hits"] == 1
+    assert st["entries"] == 2
+    assert st["bytes"] <= st["max_bytes"]
+
+
+def test_pinned_entry_survives_eviction():
+    one = estimate_item_bytes(_item(1000))
+    cache = DataFrameCache(max_bytes=lambda: int(one * 1.5))
+
+    cache["u1"] = _item(1000)
+    with cache.pinned("u1"):
+        cache["u2"] = _item(1000)
+        assert "u1" in cache  # 正在使用，不能淘汰
+
+    # pin 释放后重新按预算淘汰
+    assert len(cache) == 1
+    assert cache.get("missing") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_pop_drops_aliases_of_the_entry():
+    cache = DataFrameCache(max_bytes=lambda: 1 << 40)
+    cache["h1"] = _item(10)
+    cache["h2"] = _item(10)
+    cache.alias("u1", "h1")
+    cache.alias("u2", "h1")
+    cache.alias("u3", "h2")
+
+    assert cache.pop("h1") is not None
+    assert "u1" not in cache and "u2" not in cache
+    # 之后同名 key 重新放进来，老别名不会“复活”
+    cache["h1"] = _item(10)
+    assert "u1" not in cache and "u2" not in cache
+
+    # 按别名 pop：删的是它指向的条目
+    assert cache.pop("u3") is not None
+    assert "h2" not in cache and len(cache) == 1
+
+
+def test_pin_on_a_missing_key_does_not_release_someone_elses_pin():
+    one = estimate_item_bytes(_item(1000))
+    cache = DataFrameCache(max_bytes=lambda: int(one * 1.5))
+
+    with cache.pinned("u1"):  # 进来时还没有 u1
+        cache["u1"] = _item(1000)  # 另一个请求装进来并 pin 住
+        other = cache.pinned("u1")
+        other.__enter__()
+    # 第一个 pin 退出不能把别人的 pin 还掉
+    cache["u2"] = _item(1000)
+    assert "u1" in cache
+    other.__exit__(None, None, None)
+    assert "u1" not in cache  # pin 都还了：按预算挤掉
+
+    # 被 put 覆盖的条目 pin 还在
+    cache["u1"] = _item(1000)
+    with cache.pinned("u1"):
+        cache["u1"] = _item(1000)
+        cache["u3"] = _item(1000)
+        assert "u1" in cache
+    assert len(cache) == 1
+
+
+def test_eviction_drops_aliases_of_the_entry():
+    one = estimate_item_bytes(_item(1000))
+    cache = DataFrameCache(max_bytes=lambda: int(one * 1.5))
+    cache["h1"] = _item(1000)
+    cache.alias("u1", "h1")
+    cache["h2"] = _item(1000)  # 挤掉 h1
+    assert "h1" not in cache and "u1" not in cache
+
+    cache["h1"] = _item(1000)
+    assert "u1" not in cache  # 没有留下指向 h1 的旧别名
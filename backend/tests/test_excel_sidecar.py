@@ -0,0 +1,65 @@
+import os
+
+import pandas as pd
+
+from app.services.excel_ingest import materialize, parse_upload
+from app.services.sidecar import read_sidecar, shared_bytes, sidecar_path, write_sidecar
+
+
+def _write_xlsx(path, df):
+    df.to_excel(path, index=False, engine="openpyxl")
+
+
+def test_parse_writes_and_reuses_sidecar(tmp_path):
+    src = tmp_path / "demo.xlsx"
+    _write_xlsx(src, pd.DataFrame({"month": ["Jan", "Feb", None], "sales": [10, None, 5]}))
+
+    parsed = parse_upload(str(src), use_sidecar=True, in_process=False)
+    assert parsed.sidecar and parsed.arrow is None and parsed.df is None
+    assert sidecar_path(src).exists()
+
+    # 之后直接读旁路缓存，结果和 read_excel 完全一致
+    df = read_sidecar(src)
+    assert df is not None
+    pd.testing.assert_frame_equal(df, pd.read_excel(src))
+    pd.testing.assert_frame_equal(materialize(parsed, src), pd.read_excel(src))
+
+
+def test_parse_without_sidecar_transfers_arrow_bytes(tmp_path):
+    src = tmp_path / "demo.xlsx"
+    _write_xlsx(src, pd.DataFrame({"a": [1, 2], "b": ["x", None]}))
+
+    parsed = parse_upload(str(src), use_sidecar=False, in_process=False)
+    assert parsed.arrow is not None and not sidecar_path(src).exists()
+    assert parsed.profile["rows"] == 2
+    pd.testing.assert_frame_equal(materialize(parsed, src), pd.read_excel(src))
+
+
+def test_sidecar_is_stale_after_source_changes(tmp_path):
+    src = tmp_path / "demo.xlsx"
+    _write_xlsx(src, pd.DataFrame({"a": [1, 2]}))
+    assert write_sidecar(src, pd.read_excel(src))
+
+    _write_xlsx(src, pd.DataFrame({"a": [1, 2, 3]}))
+    os.utime(src, ns=(0, 0))
+    assert read_sidecar(src) is None
+
+
+def test_sidecar_skips_non_string_headers(tmp_path):
+    src = tmp_path / "demo.xlsx"
+    _write_xlsx(src, pd.DataFrame({2023: [1, 2]}))
+    assert write_sidecar(src, pd.read_excel(src)) is False
+    assert not sidecar_path(src).exists()
+
+
+def test_sidecar_maps_numeric_columns_zero_copy(tmp_path):
+    src = tmp_path / "demo.xlsx"
+    _write_xlsx(src, pd.DataFrame({"a": [1, 2, 3], "f": [1.5, None, 2.5], "s": ["x", None, "y"]}))
+    assert write_sidecar(src, pd.read_excel(src))
+
+    df = read_sidecar(src)
+    pd.testing.assert_frame_equal(df, pd.read_excel(src))
+    # 数值列（含 NaN 的浮点列）是 mmap 上的只读视图，不占进程私有内存
+    assert not df["a"].to_numpy().flags.writeable
+    assert not df["f"].to_numpy().flags.writeable
+    assert shared_bytes(df) == df["a"].to_numpy().nbytes + df["f"].to_numpy().nbytes
@@ -62,15 +62,16 @@ async def test_excel_upload_creates_session_and_upload(tmp_path):
         sid = data["session_id"]
         uid = data["upload_id"]
 
-    # 校验：文件落盘
-    saved = tmp_path / "uploads" / f"{uid}.xlsx"
-    assert saved.exists()
-
     # 校验：DB 写入 file_uploads + 更新 sessions.current_upload_id
     SessionLocal = db.get_sessionmaker()
     async with SessionLocal() as s:
         fu = (await s.execute(select(FileUpload).where(FileUpload.id == uid))).scalar_one()
         assert fu.session_id == sid
 
+        # 校验：文件按内容哈希落盘
+        saved = tmp_path / "uploads" / f"{fu.content_hash}.xlsx"
+        assert saved.exists()
+        assert fu.stored_path == str(saved)
+
         sess = (await s.execute(select(Session).where(Session.id == sid))).scalar_one()
         assert sess.current_upload_id == uid
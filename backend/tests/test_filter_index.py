@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+
+from app.services.df_cache import DataFrameCache
+from app.services.index_catalog import IndexCatalog
+from app.services.planner import ToolCall, plan_tools
+from app.services.schema_catalog import infer_schema
+from app.services.tools import pandas_tools as pt
+from app.services.tools.default_registry import build_default_registry
+from app.services.tools.logical_plan import execute, optimize
+from app.services.tools.registry import ToolContext
+
+
+def _frame(n=400):
+    rng = np.random.default_rng(3)
+    return pd.DataFrame(
+        {
+            "班级": rng.choice(["一班", "二班", "三班", "十三班", None], n),
+            "分数": np.where(rng.random(n) < 0.1, np.nan, rng.integers(40, 100, n)),
+            "金额": [f"{v:,}" for v in rng.integers(500, 3000, n)],
+            "日期": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 90, n), "D"),
+        }
+    )
+
+
+def _ctx(df):
+    return ToolContext(source_df=df, schema=infer_schema(df), indexes=IndexCatalog())
+
+
+def test_index_and_scan_paths_agree_with_pandas():
+    df = _frame()
+    ctx = _ctx(df)
+    amount = df["金额"].str.replace(",", "").astype(float)
+    cases = [
+        ([{"col": "班级", "op": "eq", "value": "三班"}], df["班级"] == "三班"),
+        ([{"col": "班级", "op": "in", "value": ["一班", "十三班"]}], df["班级"].isin(["一班", "十三班"])),
+        ([{"col": "分数", "op": "gt", "value": 80}], df["分数"] > 80),
+        ([{"col": "分数", "op": "eq", "value": 60}], df["分数"] == 60),
+        ([{"col": "金额", "op": "between", "value": [1000, "2000"]}], amount.between(1000, 2000)),
+        ([{"col": "日期", "op": "lt", "value": "2024-02-01"}], df["日期"] < "2024-02-01"),
+        (
+            [{"col": "分数", "op": "le", "value": 70}, {"col": "班级", "op": "eq", "value": "二班"}],
+            (df["分数"] <= 70) & (df["班级"] == "二班"),
+        ),
+    ]
+    for where, mask in cases:
+        want = df[mask]
+        indexed = pt.tool_filter(df, where, ctx=ctx).value
+        scanned = pt.tool_filter(df.copy(), where, ctx=ctx).value  # 不是原始 df：扫描
+        pd.testing.assert_frame_equal(indexed, want)
+        pd.testing.assert_frame_equal(scanned, want)
+
+    assert "ERROR" in pt.tool_filter(df, [{"col": "班级", "op": "gt", "value": 1}], ctx=ctx).value
+    assert "ERROR" in pt.tool_filter(df, [{"col": "分数", "op": "eq", "value": "高"}], ctx=ctx).value
+
+
+def test_indexes_are_lazy_and_accounted_in_the_cache_entry():
+    df = _frame()
+    ctx = _ctx(df)
+    cache = DataFrameCache(max_bytes=lambda: 1 << 40)
+    cache.put("h", {"df": df, "indexes": ctx.indexes})
+    before = cache.stats()["bytes"]
+
+    pt.tool_filter(df, [{"col": "分数", "op": "ge", "value": 90}], ctx=ctx)
+    assert ctx.indexes.indexed_columns() == [("sorted", "分数")]
+    version = ctx.indexes.version
+    pt.tool_filter(df, [{"col": "分数", "op": "lt", "value": 50}], ctx=ctx)
+    assert ctx.indexes.version == version  # 第二次直接用
+
+    cache.account("h")
+    assert cache.stats()["bytes"] > before
+    cache.pop("h")
+    assert cache.stats()["bytes"] == 0
+
+
+def test_filters_are_pushed_below_sort_and_group_keys():
+    df = _frame()
+    on_key = {"where": [{"col": "班级", "op": "in", "value": ["一班", "二班"]}]}
+    on_value = {"where": [{"col": "分数", "op": "gt", "value": 60}]}
+    plans = [
+        [ToolCall("sort_time", {"by": "日期"}), ToolCall("filter", on_value), ToolCall("head", {"n": 10})],
+        [
+            ToolCall("groupby_agg", {"group_by": "班级", "value_cols": ["分数"]}),
+            ToolCall("filter", on_key),
+            ToolCall("head", {"n": 10}),
+        ],
+    ]
+    for plan in plans:
+        steps = optimize(plan, list(df.columns))
+        assert steps[0].name == "filter" and steps[0].notes[0].startswith("pushdown")
+        reg = build_default_registry()
+        pushed = execute(reg, df, steps, _ctx(df))[-1][1].value
+        plain = df
+        for c in plan:
+            plain = reg.invoke(c.name, plain, c.args, None).value
+        # 行号标签可以不同（预览 / artifact 都不带行号）
+        pd.testing.assert_frame_equal(pushed.reset_index(drop=True), plain.reset_index(drop=True))
+
+    # 按聚合值过滤 / top-k 之后过滤：顺序不能换
+    kept = [ToolCall("groupby_agg", {"group_by": "班级", "value_cols": ["分数"]}), ToolCall("filter", on_value)]
+    assert [s.name for s in optimize(kept, list(df.columns))] == ["groupby_agg", "filter"]
+    kept = [ToolCall("sort", {"by": "分数", "limit": 5}), ToolCall("filter", on_key)]
+    assert [s.name for s in optimize(kept, list(df.columns))] == ["sort", "filter"]
+
+
+def test_planner_extracts_predicates():
+    df = _frame()
+    schema = infer_schema(df)
+    plan = plan_tools(df, "十三班分数80分以上的平均分数", schema, indexes=IndexCatalog())
+    assert plan[0] == ToolCall(
+        "filter",
+        {"where": [{"col": "分数", "op": "ge", "value": 80}, {"col": "班级", "op": "eq", "value": "十三班"}]},
+    )
+    assert plan[1].name == "column_stats"
+    assert plan_tools(df, "金额超过2,000", schema)[0].args["where"] == [{"col": "金额", "op": "gt", "value": 2000}]
+    assert plan_tools(df, "随便看看", schema)[0].name == "profile"
+
+
+def test_steps_after_filter_keep_cleaned_numbers():
+    df = pd.DataFrame(
+        {
+            "班级": ["一班", "二班", "一班", "一班", "二班"],
+            "科目": ["语文", "语文", "数学", "语文", "数学"],
+            "销售额": ["1,200", "300", "5,600", "950", "80"],
+        }
+    )
+    schema = infer_schema(df)
+    reg = build_default_registry()
+
+    def run(question):
+        plan = plan_tools(df, question, schema, indexes=IndexCatalog())
+        assert plan[0].name == "filter"
+        steps = optimize(plan, list(df.columns))
+        ctx = ToolContext(source_df=df, schema=schema, indexes=IndexCatalog())
+        return [out.value for _, out in execute(reg, df, steps, ctx)][-1]
+
+    sums = run("一班按科目的销售额总和")
+    assert dict(zip(sums["科目"], sums["销售额"])) == {"语文": 2150.0, "数学": 5600.0}
+
+    # 过滤之后的 top-k 按数值排，不按字符串（"950" > "5,600"）
+    top = run("一班销售额最高的是哪个")
+    assert top["销售额"].tolist() == ["5,600"]
+
+
+def test_planner_builds_no_index_and_filter_builds_only_the_matched_column():
+    df = _frame().assign(科目=lambda d: np.resize(["语文", "数学", "英语"], len(d)))
+    schema = infer_schema(df)
+    indexes = IndexCatalog()
+    plan = plan_tools(df, "三班的数学分数前3名", schema, indexes=indexes)
+    assert plan[0].args["where"] == [
+        {"col": "班级", "op": "eq", "value": "三班"},
+        {"col": "科目", "op": "eq", "value": "数学"},
+    ]
+    assert indexes.indexed_columns() == []
+
+    ctx = ToolContext(source_df=df, schema=schema, indexes=indexes)
+    execute(build_default_registry(), df, optimize(plan, list(df.columns)), ctx)
+    assert sorted(indexes.indexed_columns()) == [("hash", "班级"), ("hash", "科目")]
+    # 建过之后规划直接用索引里的取值，结果不变
+    assert plan_tools(df, "三班的数学分数前3名", schema, indexes=indexes) == plan
+
+    # 科目也是分类列，但问题里没提到它的取值：不建
+    indexes = IndexCatalog()
+    plan = plan_tools(df, "三班的分数前3名", schema, indexes=indexes)
+    execute(build_default_registry(), df, optimize(plan, list(df.columns)), ToolContext(source_df=df, schema=schema, indexes=indexes))
+    assert indexes.indexed_columns() == [("hash", "班级")]
+
+
+def test_value_filters_need_a_cue_or_a_whole_word():
+    n = 60
+    df = pd.DataFrame(
+        {
+            "姓名": [f"员工{i}" for i in range(n)],
+            "月份": np.resize(["1月", "2月", "3月"], n),
+            "状态": np.resize(["完成", "未完成", "进行中"], n),
+            "班级": np.resize(["一班", "二班", "十三班"], n),
+            "任务完成率": np.linspace(0, 1, n),
+        }
+    )
+    schema = infer_schema(df)
+    # “完成”只是别的词的一部分：不筛
+    assert [c.name for c in plan_tools(df, "完成率最高的是谁", schema)] == ["top_k"]
+    assert [c.name for c in plan_tools(df, "按月份统计完成情况", schema)] == ["groupby_agg", "head"]
+
+    done = {"col": "状态", "op": "eq", "value": "完成"}
+    assert plan_tools(df, "只看完成的任务完成率平均", schema)[0].args["where"] == [done]
+    assert plan_tools(df, "状态是完成的有多少", schema)[0].args["where"] == [done]
+    assert plan_tools(df, "十三班完成的任务完成率平均", schema)[0].args["where"] == [
+        done,
+        {"col": "班级", "op": "eq", "value": "十三班"},
+    ]
+    # 总和之类的计划过滤后不再多挂一个 head
+    plan = plan_tools(df, "只看一班和二班的任务完成率总和", schema)
+    assert [c.name for c in plan] == ["filter", "profile", "sum_numeric"]
+    assert plan[0].args["where"] == [{"col": "班级", "op": "in", "value": ["一班", "二班"]}]
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from app.services.planner import plan_tools
+from app.services.schema_catalog import infer_schema
+from app.services.tools import pandas_tools as pt
+from app.services.tools.registry import ToolContext
+
+
+def _frame():
+    return pd.DataFrame(
+        {
+            "地区": ["华东", "华北", "华东", "华南", "华北", "华南"],
+            "渠道": ["线上", "线上", "线下", "线上", "线下", "线下"],
+            "销售额": [10.0, 20.0, 30.0, np.nan, 5.0, np.nan],
+            "订单数": ["1,200", "3", "4", "2", None, "7"],
+        }
+    )
+
+
+def test_groupby_agg_multi_key_multi_agg_in_one_table():
+    df = _frame()
+    ctx = ToolContext(source_df=df, schema=infer_schema(df))
+    out = pt.tool_groupby_agg(
+        df, ["地区", "渠道"], ["销售额", "订单数"], ["sum", "mean", "count", "nunique"], ctx=ctx
+    ).value
+    assert list(out.columns[:2]) == ["地区", "渠道"]
+    assert "销售额_sum" in out and "订单数_nunique" in out
+
+    row = out[(out["地区"] == "华东") & (out["渠道"] == "线上")].iloc[0]
+    assert row["销售额_sum"] == 10.0 and row["订单数_sum"] == 1200.0  # 千分位清洗后再加
+    # 华南 的销售额全缺：min_count 语义，是缺失不是 0；count 看原始值
+    south = out[out["地区"] == "华南"]
+    assert south["销售额_sum"].isna().all() and (south["销售额_count"] == 0).all()
+
+
+def test_legacy_groupby_tools_delegate_to_groupby_agg():
+    df = _frame()
+    s = pt.tool_groupby_sum(df, "地区", ["销售额"]).value
+    assert list(s.columns) == ["地区", "销售额"]
+    assert s["销售额"].iloc[:2].tolist() == [40.0, 25.0] and np.isnan(s["销售额"].iloc[2])
+
+    # 以前文本数字列会被 numeric_only 丢掉，现在先清洗（影子列）再求均值
+    ctx = ToolContext(source_df=df, schema=infer_schema(df))
+    m = pt.tool_groupby_mean(df, "渠道", ["订单数"], ctx=ctx).value
+    assert m.set_index("渠道")["订单数"].to_dict() == {"线上": (1200 + 3 + 2) / 3, "线下": (4 + 7) / 2}
+
+
+def test_planner_requests_groupby_agg_for_grouped_questions():
+    df = _frame()
+    plan = plan_tools(df, "每个地区的平均销售额")
+    assert plan[0].name == "groupby_agg"
+    assert plan[0].args == {"group_by": "地区", "value_cols": ["销售额"], "aggs": ["mean"]}
+    assert plan_tools(df, "销售额 的趋势")[0].name != "groupby_agg"
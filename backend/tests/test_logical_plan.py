@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from app.services.planner import ToolCall, plan_tools
+from app.services.schema_catalog import infer_schema
+from app.services.tools.default_registry import build_default_registry
+from app.services.tools.logical_plan import LogicalStep, execute, optimize
+from app.services.tools.registry import ToolContext
+
+
+def _frame(n=500):
+    rng = np.random.default_rng(3)
+    sales = rng.integers(0, 50, n).astype(float)
+    sales[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame(
+        {
+            "month": rng.choice(["Jan", "Feb", "Mar", "Apr", "May", "Jun"], n),
+            "region": rng.choice(["华东", "华北", "华南"], n),
+            "sales": sales,
+            "qty": rng.integers(0, 9, n),
+            "note": [f"n{i}" for i in range(n)],
+        }
+    )
+
+
+def _run(df, steps):
+    reg = build_default_registry()
+    ctx = ToolContext(source_df=df, schema=infer_schema(df))
+    return [(s.name, r.kind, r.preview, r.value) for s, r in execute(reg, df, steps, ctx)]
+
+
+def test_optimized_plan_gives_identical_results():
+    df = _frame()
+    plans = [
+        plan_tools(df, "sales 的趋势"),
+        plan_tools(df, "sales 总和"),
+        [ToolCall("sort_time", {"by": "month"}), ToolCall("head", {"n": 5})],
+        [ToolCall("groupby_sum", {"group_col": "region", "value_cols": ["sales"]}), ToolCall("head", {"n": 2})],
+        [ToolCall("chart_line", {"x_col": "month", "y_cols": ["qty"], "max_points": 30}), ToolCall("head", {"n": 3})],
+    ]
+    for plan in plans:
+        naive = [LogicalStep(name=c.name, args=dict(c.args)) for c in plan]
+        fast = optimize(plan, list(df.columns))
+        for a, b in zip(_run(df, naive), _run(df, fast)):
+            assert a[:3] == b[:3]
+            if a[1] == "chart":
+                assert a[3] == b[3]
+
+
+def test_optimizer_fuses_sort_head_and_pushes_projection():
+    df = _frame()
+    steps = optimize(
+        [
+            ToolCall("groupby_sum", {"group_col": "month", "value_cols": ["sales"]}),
+            ToolCall("sort_time", {"by": "month"}),
+            ToolCall("chart_line", {"x_col": "month", "y_cols": ["sales"], "max_points": 200, "downsample": "head"}),
+            ToolCall("head", {"n": 20}),
+        ],
+        list(df.columns),
+    )
+    assert steps[0].project == ["month", "sales"]
+    assert steps[1].limit == 200 and "top_k(k=200)" in steps[1].notes
+    assert steps[2].project is None  # groupby 之后的新表列名执行前不知道，不投影
+
+    # 默认 LTTB 降采样要看整条序列：排序不能截成 top-k
+    lttb = optimize(
+        [ToolCall("sort_time", {"by": "month"}), ToolCall("chart_line", {"x_col": "month", "y_cols": ["sales"]})],
+        list(df.columns),
+    )
+    assert lttb[0].limit is None
+
+    short = optimize([ToolCall("sort_time", {"by": "month"}), ToolCall("head", {"n": 5})], list(df.columns))
+    assert short[0].limit == 15  # 预览要打 15 行
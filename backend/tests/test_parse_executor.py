@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+import pytest
+
+from app.core.config import get_settings
+from app.services.parse_executor import load_upload, shutdown_parse_executor
+from app.services.schema_catalog import infer_schema
+from app.services.sidecar import pa
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", ["process", "thread", "inline"])
+async def test_load_upload_matches_read_excel(tmp_path, kind):
+    os.environ["PARSE_EXECUTOR"] = kind
+    os.environ["PARSE_WORKERS"] = "1"
+    get_settings.cache_clear()
+
+    src = tmp_path / "demo.xlsx"
+    pd.DataFrame({"month": ["Jan", "Feb"], "sales": [10, None]}).to_excel(src, index=False, engine="openpyxl")
+
+    try:
+        loaded = await load_upload(src, use_sidecar=False)
+        df, profile = loaded.df, loaded.profile
+    finally:
+        shutdown_parse_executor()
+        os.environ.pop("PARSE_EXECUTOR", None)
+        os.environ.pop("PARSE_WORKERS", None)
+
+    pd.testing.assert_frame_equal(df, pd.read_excel(src))
+    assert profile["rows"] == 2
+    assert profile["columns"] == ["month", "sales"]
+    # schema / 列聚合在执行器里算好带回来，和在这边现算一样
+    assert loaded.schema.to_dict() == infer_schema(df).to_dict()
+    assert loaded.stats.aggregates["sales"].sum == 10.0
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(pa is None, reason="pyarrow not installed")
+@pytest.mark.parametrize("kind", ["process", "thread", "inline"])
+async def test_schema_from_sidecar_is_computed_in_executor(tmp_path, kind):
+    os.environ["PARSE_EXECUTOR"] = kind
+    os.environ["PARSE_WORKERS"] = "1"
+    get_settings.cache_clear()
+
+    src = tmp_path / "demo.xlsx"
+    pd.DataFrame({"region": ["东", "西", "南"], "amount": ["1,200", "95", None]}).to_excel(
+        src, index=False, engine="openpyxl"
+    )
+    try:
+        await load_upload(src, use_sidecar=True)  # 解析 + 写旁路文件
+        loaded = await load_upload(src, use_sidecar=True)  # 从旁路文件回填
+    finally:
+        shutdown_parse_executor()
+        os.environ.pop("PARSE_EXECUTOR", None)
+        os.environ.pop("PARSE_WORKERS", None)
+        get_settings.cache_clear()
+
+    want = infer_schema(loaded.df)
+    assert loaded.schema.to_dict() == want.to_dict()
+    # 影子列和父进程这份 df 按 index 对齐
+    pd.testing.assert_series_equal(loaded.schema.numeric["amount"], want.numeric["amount"])
+    assert loaded.stats.aggregates["amount"].sum == 1295.0
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from app.services.planner import _numeric_cols, plan_tools
+from app.services.schema_catalog import infer_schema
+from app.services.tools import pandas_tools as pt
+from app.services.tools.registry import ToolContext
+
+
+def _frame():
+    return pd.DataFrame(
+        {
+            "月份": ["Mar", "Jan", np.nan, "Feb", "Jan", "Mar"],
+            "日期": ["2024-03-01", "2024-01-02", "2024-02-03", "bad", "2024-01-05", "2024-03-06"],
+            "完成率": ["95%", "80%", np.nan, "70%", "60%", "50%"],
+            "销售额": ["1,200", "800", "1,000", "950", np.nan, "1,100"],
+            "分数": [90, 80, 70, 60, 50, 40],
+            "班级": ["一班", "二班", "一班", "二班", "一班", "二班"],
+            "备注": ["a", "b", "c", "d", "e", np.nan],
+            "空列": [np.nan] * 6,
+        }
+    )
+
+
+def test_infer_schema_classifies_columns():
+    cat = infer_schema(_frame())
+    assert cat.to_dict() == {
+        "月份": "month",
+        "日期": "datetime",
+        "完成率": "percent",
+        "销售额": "thousands",
+        "分数": "numeric",
+        "班级": "categorical",
+        "备注": "text",
+        "空列": "empty",
+    }
+    assert cat.numeric["销售额"].tolist()[:2] == [1200.0, 800.0]
+    assert set(cat.time) == {"月份", "日期"}
+
+
+def test_planner_numeric_cols_same_with_catalog():
+    df = _frame()
+    cat = infer_schema(df)
+    assert _numeric_cols(df, cat) == _numeric_cols(df)
+    for q in ["销售额总和", "完成率趋势", "最大分数"]:
+        assert plan_tools(df, q, cat) == plan_tools(df, q)
+
+
+def test_sort_time_with_catalog_matches_recompute():
+    df = _frame()
+    ctx = ToolContext(source_df=df, schema=infer_schema(df))
+    for col in ["月份", "日期", "班级"]:
+        a = pt.tool_sort_time(df, col)
+        b = pt.tool_sort_time(df, col, ctx=ctx)
+        pd.testing.assert_frame_equal(a.value, b.value)
+
+
+def test_groupby_sum_uses_clean_shadow_columns():
+    df = _frame()
+    ctx = ToolContext(source_df=df, schema=infer_schema(df))
+    out = pt.tool_groupby_sum(df, "班级", ["销售额"], ctx=ctx).value
+    assert out.set_index("班级")["销售额"].to_dict() == {"一班": 2200.0, "二班": 2850.0}
+
+
+def test_sort_time_on_derived_table_uses_cached_lookup(monkeypatch):
+    df = _frame()
+    ctx = ToolContext(source_df=df, schema=infer_schema(df))
+    assert set(ctx.schema.time_lookup) == {"月份", "日期"}
+
+    grouped = pt.tool_groupby_agg(df, "月份", ["分数"], ["sum"], ctx=ctx).value
+    want = pt.tool_sort_time(grouped, "月份").value
+
+    # 有查找表就不该再解析
+    def boom(*a, **kw):
+        raise AssertionError("re-parsed")
+
+    monkeypatch.setattr(pt, "time_key", boom)
+    got = pt.tool_sort_time(grouped, "月份", ctx=ctx).value
+    pd.testing.assert_frame_equal(got, want)
+    assert got["月份"].tolist() == ["Jan", "Feb", "Mar"]
@@ -0,0 +1,55 @@
+import asyncio
+import os
+
+import pandas as pd
+import pytest
+
+from app.core.config import get_settings
+from app.services import excel_service
+from app.services.excel_service import ExcelService, excel_cache
+
+
+@pytest.fixture
+def thread_executor(tmp_path):
+    os.environ["DATA_DIR"] = str(tmp_path)
+    os.environ["PARSE_EXECUTOR"] = "thread"
+    get_settings.cache_clear()
+    excel_cache.clear()
+    yield
+    os.environ.pop("PARSE_EXECUTOR", None)
+    get_settings.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load(tmp_path, monkeypatch, thread_executor):
+    src = tmp_path / "demo.xlsx"
+    pd.DataFrame({"month": ["Jan", "Feb"], "sales": [10, 20]}).to_excel(src, index=False, engine="openpyxl")
+
+    calls = 0
+    real_load = excel_service.load_upload
+
+    async def counting_load(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return await real_load(*args, **kwargs)
+
+    monkeypatch.setattr(excel_service, "load_upload", counting_load)
+
+    items = await asyncio.gather(*[ExcelService._load_shared("k", src) for _ in range(5)])
+    assert calls == 1
+    assert all(it is items[0] for it in items)
+    assert excel_cache.get("k") is items[0]
+    assert not excel_service._inflight_loads
+
+
+@pytest.mark.asyncio
+async def test_load_failure_propagates_to_all_waiters(tmp_path, thread_executor):
+    src = tmp_path / "broken.xlsx"
+    src.write_bytes(b"not a workbook")
+
+    results = await asyncio.gather(
+        *[ExcelService._load_shared("bad", src) for _ in range(3)], return_exceptions=True
+    )
+    assert all(isinstance(r, Exception) for r in results)
+    assert "bad" not in excel_cache
+    assert not excel_service._inflight_loads
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from app.services.planner import plan_tools
+from app.services.schema_catalog import infer_schema
+from app.services.stats_catalog import StatsCatalog, _hll_distinct
+from app.services.tools import pandas_tools as pt
+from app.services.tools.registry import ToolContext
+
+
+def _frame(n=500):
+    rng = np.random.default_rng(7)
+    return pd.DataFrame(
+        {
+            "销售额": np.where(rng.random(n) < 0.2, np.nan, rng.random(n) * 1000),
+            "数量": rng.integers(-5, 50, n),
+            "达标": rng.random(n) < 0.5,
+            "地区": rng.choice(["华东", "华北", "华南"], n),
+            "金额": [f"{v:,}" for v in rng.integers(100, 5000, n)],
+        }
+    )
+
+
+def test_catalog_matches_pandas_reductions():
+    df = _frame()
+    stats = StatsCatalog.build(df, infer_schema(df))
+    num = ["销售额", "数量", "达标"]
+    for st in ["sum", "mean", "max", "min"]:
+        want = getattr(df[num], st)(numeric_only=True).to_dict()
+        assert str(stats.native_series(num, st).to_dict()) == str(want)
+
+    a = stats.aggregates
+    assert (a["销售额"].count, a["销售额"].null_count) == (df["销售额"].count(), df["销售额"].isna().sum())
+    assert a["地区"].distinct == 3 and not a["地区"].numeric
+    # 字符串数值列用影子列，但不冒充原生数值列
+    assert a["金额"].from_text and a["金额"].sum == df["金额"].str.replace(",", "").astype(float).sum()
+    assert "金额" not in stats.native_series(["金额", "数量"], "sum")
+
+
+def test_hll_estimate_is_close():
+    hashes = pd.util.hash_array(np.arange(200_000))
+    assert abs(_hll_distinct(hashes) - 200_000) / 200_000 < 0.05
+
+
+def test_column_stats_reads_catalog_on_source_only():
+    df = _frame()
+    schema = infer_schema(df)
+    ctx = ToolContext(source_df=df, schema=schema, stats=StatsCatalog.build(df, schema))
+
+    text = pt.tool_column_stats(df, ["销售额", "金额"], ["count", "mean", "max"], ctx=ctx).value
+    assert text.splitlines()[0] == f"- 销售额: count={df['销售额'].count()}, mean={df['销售额'].mean()}, max={df['销售额'].max()}"
+    assert text.splitlines()[1].startswith("- 金额: count=500, mean=")
+
+    # 目录是原始 df 的；派生表现算
+    part = df.head(10)
+    assert pt.tool_column_stats(part, ["数量"], ["max"], ctx=ctx).value == f"- 数量: max={part['数量'].max()}"
+    assert pt.tool_sum_numeric(df, ["数量"], ctx=ctx).value == pt.tool_sum_numeric(df, ["数量"]).value
+    assert "ERROR" in pt.tool_column_stats(df, ["销售额"], ["median"], ctx=ctx).value
+
+    call = plan_tools(df, "平均销售额")[0]
+    assert call.name == "column_stats" and call.args["cols"][0] == "销售额"
+
+    # 只问极值：规划成 column_stats，在原始表上直接读目录
+    call = plan_tools(df, "销售额最大是多少", infer_schema(df))[0]
+    assert call.name == "column_stats" and call.args["stats"] == ["max"]
+    out = pt.tool_column_stats(df, call.args["cols"][:1], call.args["stats"], ctx=ctx).value
+    assert out == f"- 销售额: max={df['销售额'].max()}"
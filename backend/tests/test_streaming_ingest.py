@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from app.services.excel_ingest import IngestLimitError, IngestLimits, read_workbook
+
+
+def _write(path):
+    df = pd.DataFrame(
+        {
+            "学生姓名": ["张三", "李四", None, "王五", "赵六"],
+            "分数": [95, None, 88, 76, 60],
+            "通过": [True, False, None, True, True],
+            "日期": pd.to_datetime(["2024-01-01", None, "2024-01-03", "2024-01-04", "2024-01-05"]),
+        }
+    )
+    df.to_excel(path, index=False, engine="openpyxl")
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 50_000])
+def test_streaming_reader_matches_read_excel(tmp_path, chunk_rows):
+    src = tmp_path / "demo.xlsx"
+    _write(src)
+
+    got = read_workbook(src, IngestLimits(chunk_rows=chunk_rows))
+    pd.testing.assert_frame_equal(got, pd.read_excel(src))
+
+
+def test_streaming_reader_aborts_on_row_and_cell_limits(tmp_path):
+    src = tmp_path / "demo.xlsx"
+    _write(src)
+
+    with pytest.raises(IngestLimitError):
+        read_workbook(src, IngestLimits(max_rows=3))
+    with pytest.raises(IngestLimitError):
+        read_workbook(src, IngestLimits(max_cells=10))
+    with pytest.raises(IngestLimitError):
+        read_workbook(src, IngestLimits(max_unzipped_bytes=1024))
+
+    assert len(read_workbook(src, IngestLimits(max_rows=5))) == 5
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 3])
+def test_chunks_with_different_types_reinfer_from_raw_cells(tmp_path, chunk_rows):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["编号", "数量", "备注"])
+    # 编号是文本单元格：前几块单独看像数字，合起来 read_excel 会保留 "001"
+    ws.append(["001", 1, 5])
+    ws.append(["002", None, 2.5])
+    ws.append(["1,234", 3, "x"])
+    ws.append([None, 4, None])
+    src = tmp_path / "codes.xlsx"
+    wb.save(src)
+
+    got = read_workbook(src, IngestLimits(chunk_rows=chunk_rows))
+    want = pd.read_excel(src)
+    pd.testing.assert_frame_equal(got, want)
+    assert got["编号"].tolist()[:3] == ["001", "002", "1,234"]
@@ -61,7 +61,7 @@ async def test_tool_agent_trend_has_multisteps(tmp_path):
         debug = (msgs[-1].extra or {}).get("debug") or {}
         trace = debug.get("tool_trace") or []
         tools = [t["tool"] for t in trace]
-        # 趋势计划：groupby_sum -> sort -> head
-        assert "groupby_sum" in tools
+        # 趋势计划：groupby_agg -> sort -> head
+        assert "groupby_agg" in tools
         assert "sort_time" in tools
         assert "head" in tools
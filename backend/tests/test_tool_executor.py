@@ -0,0 +1,72 @@
+import asyncio
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from app.core.config import get_settings
+from app.services.planner import ToolCall
+from app.services.tool_executor import ToolRunner, shutdown_tool_executor
+from app.services.tools.default_registry import build_default_registry
+from app.services.tools.logical_plan import execute, execute_async, optimize
+from app.services.tools.registry import ToolContext, ToolResult
+
+
+@pytest.fixture(autouse=True)
+def _thread_executor():
+    os.environ["TOOL_EXECUTOR"] = "thread"
+    get_settings.cache_clear()
+    yield
+    shutdown_tool_executor()
+    os.environ.pop("TOOL_EXECUTOR", None)
+    get_settings.cache_clear()
+
+
+def _slow(df, seconds=0.5):
+    time.sleep(seconds)
+    return ToolResult(kind="table", value=df, preview="slow done")
+
+
+@pytest.mark.asyncio
+async def test_slow_tool_times_out_without_blocking_the_loop():
+    df = pd.DataFrame({"month": ["Jan", "Feb"], "sales": [1.0, 2.0]})
+    reg = build_default_registry()
+    reg.register("slow", _slow, timeout_s=0.1)
+    calls = [ToolCall("slow", {}), ToolCall("sum_numeric", {"cols": ["sales"]})]
+    runner = ToolRunner(reg, request_timeout_s=5)
+
+    ticks = 0
+
+    async def heartbeat():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    hb = asyncio.create_task(heartbeat())
+    out = await execute_async(reg, df, optimize(calls, list(df.columns)), runner)
+    hb.cancel()
+
+    assert ticks >= 5  # 工具在线程池里睡，事件循环照常转
+    assert out[0][1].value.startswith("ERROR: tool timed out") and runner.timed_out
+    assert out[1][1].preview == "skipped (timeout)"
+
+
+@pytest.mark.asyncio
+async def test_async_execution_matches_sync_and_respects_request_deadline():
+    df = pd.DataFrame({"region": ["a", "b", "a"], "sales": [1.0, 2.0, 3.0]})
+    reg = build_default_registry()
+    calls = [ToolCall("groupby_sum", {"group_col": "region", "value_cols": ["sales"]}), ToolCall("head", {"n": 5})]
+
+    ctx = ToolContext(source_df=df)
+    fast = await execute_async(reg, df, optimize(calls, list(df.columns)), ToolRunner(reg, ctx), ctx)
+    ctx = ToolContext(source_df=df)
+    sync = execute(reg, df, optimize(calls, list(df.columns)), ctx)
+    assert [r.preview for _, r in fast] == [r.preview for _, r in sync]
+
+    reg.register("slow", lambda d: _slow(d, 0.3))
+    runner = ToolRunner(reg, timeout_s=10, request_timeout_s=0.4)
+    out = await execute_async(reg, df, optimize([ToolCall("slow", {})] * 3, list(df.columns)), runner)
+    # 前一个跑完还剩 0.1s，第二个被整条链的截止时间卡住，第三个跳过
+    assert [r.preview for _, r in out] == ["slow done", "tool timeout", "skipped (timeout)"]
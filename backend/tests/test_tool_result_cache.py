@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.planner import ToolCall
+from app.services.schema_catalog import infer_schema
+from app.services.tools.default_registry import build_default_registry
+from app.services.tools.logical_plan import execute, optimize
+from app.services.tools.registry import ToolContext, ToolResult
+from app.services.tools.result_cache import ToolResultCache
+
+
+def _frame():
+    return pd.DataFrame(
+        {
+            "region": ["华东", "华北", "华东", "华南"] * 25,
+            "sales": np.arange(100, dtype=float),
+            "qty": np.arange(100) % 7,
+        }
+    )
+
+
+def _run(df, calls, cache):
+    reg = build_default_registry()
+    ctx = ToolContext(source_df=df, schema=infer_schema(df), fingerprint="h1")
+    return execute(reg, df, optimize(calls, list(df.columns)), ctx, cache=cache)
+
+
+def test_shared_prefix_is_served_from_cache_with_lineage():
+    df = _frame()
+    cache = ToolResultCache(lambda: 64 * 1024 * 1024)
+    groupby = ToolCall("groupby_sum", {"group_col": "region", "value_cols": ["sales"]})
+
+    first = _run(df, [groupby, ToolCall("sort_time", {"by": "region"}), ToolCall("head", {"n": 2})], cache)
+    second = _run(df, [groupby, ToolCall("sort_time", {"by": "region"}), ToolCall("head", {"n": 2})], cache)
+    assert [r.preview for _, r in first] == [r.preview for _, r in second]
+    assert "cached" in second[0][0].notes and "cached" in second[1][0].notes
+    assert "cached" not in second[2][0].notes  # head 注册时关掉了缓存
+
+    # 同样的 sort_time 参数，但输入是原表而不是 groupby 的结果：血缘不同，不能串
+    direct = _run(df, [ToolCall("sort_time", {"by": "region"})], cache)
+    assert "cached" not in direct[0][0].notes
+    assert list(direct[0][1].value.columns) == ["region", "sales", "qty"]
+
+
+def test_cached_tables_are_read_only_and_budget_evicts():
+    cache = ToolResultCache(lambda: 4000)
+    t = pd.DataFrame({"a": np.arange(100, dtype=np.int64)})  # 约 900 字节
+    cache.put(("h", "x", "{}", "src"), ToolResult(kind="table", value=t, preview="t"))
+    t.loc[0, "a"] = -1  # 缓存的是独立拷贝
+    got = cache.get(("h", "x", "{}", "src")).value
+    assert got["a"].iloc[0] == 0
+    with pytest.raises(ValueError):
+        got["a"].to_numpy()[0] = 5
+    got["b"] = 1  # 浅拷贝上加列不影响缓存
+    assert list(cache.get(("h", "x", "{}", "src")).value.columns) == ["a"]
+
+    for i in range(10):
+        cache.put(("h", "x", str(i), "src"), ToolResult(kind="table", value=t, preview="t"))
+    st = cache.stats()
+    assert st["bytes"] <= 4000 and st["evictions"] > 0
+    assert cache.get(("h", "x", "{}", "src")) is None
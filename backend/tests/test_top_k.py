@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from app.services.planner import ToolCall, plan_tools
+from app.services.schema_catalog import infer_schema
+from app.services.tools import pandas_tools as pt
+from app.services.tools.registry import ToolContext
+
+
+def test_top_k_matches_stable_sort_with_ties_and_nan():
+    rng = np.random.default_rng(7)
+    n = 400
+    score = rng.integers(0, 20, n).astype(float)  # 大量并列
+    score[rng.random(n) < 0.2] = np.nan
+    df = pd.DataFrame({"name": [f"s{i}" for i in range(n)], "score": score, "rank": rng.integers(0, 5, n)})
+
+    for col in ("score", "rank"):
+        for ascending in (False, True):
+            for k in (1, 3, 50, n - 5, n + 10):
+                got = pt.tool_top_k(df, col, k=k, ascending=ascending).value
+                want = df.sort_values(col, ascending=ascending, kind="stable", na_position="last").head(k)
+                pd.testing.assert_frame_equal(got, want)
+
+
+def test_top_k_uses_cleaned_numbers_and_falls_back_to_text():
+    df = pd.DataFrame({"name": ["a", "b", "c", "d"], "sales": ["1,200", "95", None, "3,000"]})
+    ctx = ToolContext(source_df=df, schema=infer_schema(df))
+    assert pt.tool_top_k(df, "sales", k=2, ctx=ctx).value["name"].tolist() == ["d", "a"]
+    # 纯文本列：按原值比
+    assert pt.tool_top_k(df, "name", k=1).value["name"].tolist() == ["d"]
+
+
+def test_planner_uses_top_k_for_extreme_and_rank_questions():
+    df = pd.DataFrame({"姓名": ["张三", "李四"], "分数": [90, 80]})
+    assert plan_tools(df, "分数最高的是谁")[0].args == {"by": "分数", "k": 1, "ascending": False}
+    assert plan_tools(df, "分数前3名")[0].args == {"by": "分数", "k": 3, "ascending": False}
+    assert plan_tools(df, "分数最低的是哪个")[0].args["ascending"] is True
+    # 只问极值本身：读统计目录，不排序
+    assert plan_tools(df, "分数最低是多少")[0] == ToolCall("column_stats", {"cols": ["分数"], "stats": ["min"]})
+    assert plan_tools(df, "最大分数")[0].args["stats"] == ["max"]
+    assert plan_tools(df, "平均分数")[0].name == "column_stats"
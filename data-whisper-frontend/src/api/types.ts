@@ -20,11 +20,25 @@ export interface ChartSpecLine {
   series: { name: string; values: (number | null)[] }[];
 }
 
-export interface Artifact {
+export interface ChartArtifact {
   kind: "chart";
   spec: ChartSpecLine; 
 }
 
+// 列式表格：data[i] 是第 i 列的值；encoding 为 "arrow" 时没有 data，arrow 是 base64 的 Arrow IPC stream
+export interface TableArtifact {
+  kind: "table";
+  columns: string[];
+  dtypes: string[];
+  rows: number;
+  total_rows: number;
+  encoding: "json" | "arrow";
+  data?: any[][];
+  arrow?: string;
+}
+
+export type Artifact = ChartArtifact | TableArtifact;
+
 export interface ChatMessage {
   id: string;
   role: "user" | "assistant";